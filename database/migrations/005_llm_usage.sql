@@ -0,0 +1,95 @@
+-- LLM Usage Ledger
+-- One row per LLM request made by the orchestrator, for capacity and cost analysis
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  task_id UUID REFERENCES tasks(id) ON DELETE CASCADE,
+  phase TEXT,
+  iteration INTEGER,
+  model TEXT NOT NULL,
+
+  -- Tokens
+  prompt_tokens INTEGER NOT NULL DEFAULT 0,
+  completion_tokens INTEGER NOT NULL DEFAULT 0,
+  cached_tokens INTEGER NOT NULL DEFAULT 0,
+  total_tokens INTEGER NOT NULL DEFAULT 0,
+
+  -- Performance
+  latency_ms INTEGER,
+  finish_reason TEXT,
+  cost_usd DECIMAL(12,6) DEFAULT 0.000000,
+
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create indexes for rollup queries
+CREATE INDEX IF NOT EXISTS idx_llm_usage_task ON llm_usage(task_id, phase);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_model_created ON llm_usage(model, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created ON llm_usage(created_at DESC);
+
+-- Per-task, per-phase rollup
+CREATE OR REPLACE VIEW llm_usage_task_rollup AS
+SELECT
+  task_id,
+  phase,
+  COUNT(*) as requests,
+  SUM(prompt_tokens) as prompt_tokens,
+  SUM(completion_tokens) as completion_tokens,
+  SUM(cached_tokens) as cached_tokens,
+  SUM(total_tokens) as total_tokens,
+  MAX(prompt_tokens) as max_prompt_tokens,
+  MAX(iteration) as iterations,
+  ROUND(AVG(latency_ms)) as avg_latency_ms,
+  SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) as truncated_responses,
+  SUM(cost_usd) as cost_usd
+FROM llm_usage
+GROUP BY task_id, phase;
+
+-- Per-model daily rollup
+CREATE OR REPLACE VIEW llm_usage_model_rollup AS
+SELECT
+  model,
+  DATE_TRUNC('day', created_at) as day,
+  COUNT(*) as requests,
+  SUM(prompt_tokens) as prompt_tokens,
+  SUM(completion_tokens) as completion_tokens,
+  SUM(cached_tokens) as cached_tokens,
+  SUM(total_tokens) as total_tokens,
+  ROUND(AVG(latency_ms)) as avg_latency_ms,
+  PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms) as p95_latency_ms,
+  SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) as truncated_responses,
+  SUM(cost_usd) as cost_usd
+FROM llm_usage
+GROUP BY model, DATE_TRUNC('day', created_at);
+
+-- Per-task totals joined with the task outcome
+CREATE OR REPLACE VIEW llm_usage_task_totals AS
+SELECT
+  u.task_id,
+  t.status,
+  COUNT(*) as requests,
+  SUM(u.total_tokens) as total_tokens,
+  SUM(u.cost_usd) as cost_usd
+FROM llm_usage u
+JOIN tasks t ON t.id = u.task_id
+GROUP BY u.task_id, t.status;
+
+-- Average cost per successful task
+CREATE OR REPLACE VIEW llm_usage_success_cost AS
+SELECT
+  COUNT(*) as completed_tasks,
+  ROUND(AVG(total_tokens)) as avg_tokens_per_task,
+  AVG(cost_usd) as avg_cost_per_task
+FROM llm_usage_task_totals
+WHERE status = 'completed';
+
+ALTER TABLE llm_usage ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can do everything on llm_usage" ON llm_usage
+  FOR ALL USING (auth.role() = 'service_role');
+
+-- Comments for documentation
+COMMENT ON TABLE llm_usage IS 'Per-request LLM usage ledger (tokens, latency, cost) by task, phase and iteration';
+COMMENT ON VIEW llm_usage_task_rollup IS 'LLM usage per task and phase';
+COMMENT ON VIEW llm_usage_model_rollup IS 'LLM usage per model and day';
+COMMENT ON VIEW llm_usage_success_cost IS 'Average LLM tokens and cost per completed task';
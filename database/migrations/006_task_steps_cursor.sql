@@ -0,0 +1,9 @@
+-- Task Step Cursor Pagination
+-- Serves get_task_steps(task_id, since, limit): rows of one task in (created_at, id) order
+
+CREATE INDEX IF NOT EXISTS idx_task_steps_task_created_id ON task_steps(task_id, created_at, id);
+
+-- Superseded by the composite index above
+DROP INDEX IF EXISTS idx_task_steps_task_id;
+
+COMMENT ON INDEX idx_task_steps_task_created_id IS 'Keyset pagination of task steps by (created_at, id) within a task';
@@ -0,0 +1,12 @@
+-- Per-User Task Listing
+-- Serves get_tasks(user_id, status, before, limit): a user's tasks newest first,
+-- paged by a (created_at, id) keyset cursor
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS user_id TEXT NOT NULL DEFAULT 'default';
+
+CREATE INDEX IF NOT EXISTS idx_tasks_user_created_id ON tasks(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created_id ON tasks(user_id, status, created_at DESC, id DESC);
+
+COMMENT ON COLUMN tasks.user_id IS 'Owner of the task; "default" for tasks created without one';
+COMMENT ON INDEX idx_tasks_user_created_id IS 'Keyset pagination of a user''s tasks by (created_at, id)';
+COMMENT ON INDEX idx_tasks_user_status_created_id IS 'Keyset pagination of a user''s tasks filtered by status';
@@ -0,0 +1,201 @@
+-- Per-Task Summaries
+-- One row per task, kept current by triggers as steps and LLM usage are inserted,
+-- so dashboards read counters instead of aggregating task_steps
+
+CREATE TABLE IF NOT EXISTS task_summaries (
+  task_id UUID PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+
+  -- Steps
+  step_count INTEGER NOT NULL DEFAULT 0,
+  tool_calls INTEGER NOT NULL DEFAULT 0,
+  tool_errors INTEGER NOT NULL DEFAULT 0,
+  last_phase TEXT,
+  last_step_type TEXT,
+  last_activity_at TIMESTAMP WITH TIME ZONE,
+
+  -- LLM usage
+  iteration INTEGER,
+  llm_requests INTEGER NOT NULL DEFAULT 0,
+  total_tokens BIGINT NOT NULL DEFAULT 0,
+  cost_usd DECIMAL(12,6) NOT NULL DEFAULT 0,
+
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Statement-level triggers: a batch insert from the step writer or usage
+-- ledger updates each task's summary row once, not once per row
+
+CREATE OR REPLACE FUNCTION summarize_task_steps()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO task_summaries AS s (
+    task_id, step_count, tool_calls, tool_errors,
+    last_phase, last_step_type, last_activity_at, updated_at
+  )
+  SELECT
+    totals.task_id,
+    totals.step_count,
+    totals.tool_calls,
+    totals.tool_errors,
+    latest.phase,
+    latest.type,
+    latest.created_at,
+    NOW()
+  FROM (
+    SELECT
+      task_id,
+      COUNT(*) as step_count,
+      COUNT(*) FILTER (WHERE type = 'TOOL_CALL') as tool_calls,
+      COUNT(*) FILTER (WHERE type = 'TOOL_ERROR') as tool_errors
+    FROM new_steps
+    GROUP BY task_id
+  ) totals
+  JOIN (
+    SELECT DISTINCT ON (task_id) task_id, phase, type, created_at
+    FROM new_steps
+    ORDER BY task_id, created_at DESC, id DESC
+  ) latest USING (task_id)
+  ON CONFLICT (task_id) DO UPDATE SET
+    step_count = s.step_count + EXCLUDED.step_count,
+    tool_calls = s.tool_calls + EXCLUDED.tool_calls,
+    tool_errors = s.tool_errors + EXCLUDED.tool_errors,
+    last_phase = CASE WHEN s.last_activity_at IS NULL OR EXCLUDED.last_activity_at >= s.last_activity_at
+      THEN EXCLUDED.last_phase ELSE s.last_phase END,
+    last_step_type = CASE WHEN s.last_activity_at IS NULL OR EXCLUDED.last_activity_at >= s.last_activity_at
+      THEN EXCLUDED.last_step_type ELSE s.last_step_type END,
+    last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at),
+    updated_at = NOW();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS task_steps_summary ON task_steps;
+CREATE TRIGGER task_steps_summary
+  AFTER INSERT ON task_steps
+  REFERENCING NEW TABLE AS new_steps
+  FOR EACH STATEMENT EXECUTE FUNCTION summarize_task_steps();
+
+CREATE OR REPLACE FUNCTION summarize_llm_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO task_summaries AS s (task_id, iteration, llm_requests, total_tokens, cost_usd, updated_at)
+  SELECT
+    totals.task_id,
+    latest.iteration,
+    totals.llm_requests,
+    totals.total_tokens,
+    totals.cost_usd,
+    NOW()
+  FROM (
+    SELECT
+      task_id,
+      COUNT(*) as llm_requests,
+      SUM(total_tokens) as total_tokens,
+      SUM(cost_usd) as cost_usd
+    FROM new_usage
+    WHERE task_id IS NOT NULL
+    GROUP BY task_id
+  ) totals
+  JOIN (
+    SELECT DISTINCT ON (task_id) task_id, iteration
+    FROM new_usage
+    WHERE task_id IS NOT NULL
+    ORDER BY task_id, created_at DESC
+  ) latest USING (task_id)
+  ON CONFLICT (task_id) DO UPDATE SET
+    iteration = EXCLUDED.iteration,
+    llm_requests = s.llm_requests + EXCLUDED.llm_requests,
+    total_tokens = s.total_tokens + EXCLUDED.total_tokens,
+    cost_usd = s.cost_usd + EXCLUDED.cost_usd,
+    updated_at = NOW();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS llm_usage_summary ON llm_usage;
+CREATE TRIGGER llm_usage_summary
+  AFTER INSERT ON llm_usage
+  REFERENCING NEW TABLE AS new_usage
+  FOR EACH STATEMENT EXECUTE FUNCTION summarize_llm_usage();
+
+-- Backfill tasks that already have steps or usage
+INSERT INTO task_summaries (
+  task_id, step_count, tool_calls, tool_errors,
+  last_phase, last_step_type, last_activity_at,
+  iteration, llm_requests, total_tokens, cost_usd
+)
+SELECT
+  t.id,
+  COALESCE(steps.step_count, 0),
+  COALESCE(steps.tool_calls, 0),
+  COALESCE(steps.tool_errors, 0),
+  latest.phase,
+  latest.type,
+  latest.created_at,
+  last_usage.iteration,
+  COALESCE(usage.llm_requests, 0),
+  COALESCE(usage.total_tokens, 0),
+  COALESCE(usage.cost_usd, 0)
+FROM tasks t
+LEFT JOIN (
+  SELECT
+    task_id,
+    COUNT(*) as step_count,
+    COUNT(*) FILTER (WHERE type = 'TOOL_CALL') as tool_calls,
+    COUNT(*) FILTER (WHERE type = 'TOOL_ERROR') as tool_errors
+  FROM task_steps
+  GROUP BY task_id
+) steps ON steps.task_id = t.id
+LEFT JOIN (
+  SELECT DISTINCT ON (task_id) task_id, phase, type, created_at
+  FROM task_steps
+  ORDER BY task_id, created_at DESC, id DESC
+) latest ON latest.task_id = t.id
+LEFT JOIN (
+  SELECT task_id, COUNT(*) as llm_requests, SUM(total_tokens) as total_tokens, SUM(cost_usd) as cost_usd
+  FROM llm_usage
+  GROUP BY task_id
+) usage ON usage.task_id = t.id
+LEFT JOIN (
+  SELECT DISTINCT ON (task_id) task_id, iteration
+  FROM llm_usage
+  ORDER BY task_id, created_at DESC
+) last_usage ON last_usage.task_id = t.id
+WHERE steps.task_id IS NOT NULL OR usage.task_id IS NOT NULL
+ON CONFLICT (task_id) DO NOTHING;
+
+-- Tasks with their summaries, for list views (paged like tasks via
+-- idx_tasks_user_created_id)
+CREATE OR REPLACE VIEW task_dashboard AS
+SELECT
+  t.id,
+  t.user_id,
+  t.title,
+  t.description,
+  t.status,
+  t.phase,
+  t.model,
+  t.created_at,
+  t.updated_at,
+  t.completed_at,
+  t.error_message,
+  COALESCE(s.step_count, 0) as step_count,
+  COALESCE(s.tool_calls, 0) as tool_calls,
+  COALESCE(s.tool_errors, 0) as tool_errors,
+  s.last_phase,
+  s.last_step_type,
+  s.last_activity_at,
+  s.iteration,
+  COALESCE(s.llm_requests, 0) as llm_requests,
+  COALESCE(s.total_tokens, 0) as total_tokens,
+  COALESCE(s.cost_usd, 0) as cost_usd
+FROM tasks t
+LEFT JOIN task_summaries s ON s.task_id = t.id;
+
+ALTER TABLE task_summaries ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can do everything on task_summaries" ON task_summaries
+  FOR ALL USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE task_summaries IS 'Per-task step and LLM usage counters maintained by insert triggers';
+COMMENT ON VIEW task_dashboard IS 'Tasks joined with their summaries for dashboard list views';
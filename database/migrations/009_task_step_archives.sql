@@ -0,0 +1,56 @@
+-- Task Step Retention
+-- Steps of long-finished tasks are moved out of task_steps into zstd-compressed
+-- JSON Lines archives in the blob store; this table indexes them so
+-- get_task_steps can still read archived history
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS steps_archived_at TIMESTAMP WITH TIME ZONE;
+
+CREATE TABLE IF NOT EXISTS task_step_archives (
+  task_id UUID PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+  blob_digest TEXT NOT NULL,
+  step_count INTEGER NOT NULL,
+  bytes BIGINT NOT NULL,
+  first_step_at TIMESTAMP WITH TIME ZONE,
+  last_step_at TIMESTAMP WITH TIME ZONE,
+  archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Finds finished tasks still holding steps without scanning archived ones
+CREATE INDEX IF NOT EXISTS idx_tasks_unarchived_updated ON tasks(updated_at)
+  WHERE steps_archived_at IS NULL AND status IN ('completed', 'error');
+
+-- Recreate the dashboard view with the new task column
+CREATE OR REPLACE VIEW task_dashboard AS
+SELECT
+  t.id,
+  t.user_id,
+  t.title,
+  t.description,
+  t.status,
+  t.phase,
+  t.model,
+  t.created_at,
+  t.updated_at,
+  t.completed_at,
+  t.error_message,
+  COALESCE(s.step_count, 0) as step_count,
+  COALESCE(s.tool_calls, 0) as tool_calls,
+  COALESCE(s.tool_errors, 0) as tool_errors,
+  s.last_phase,
+  s.last_step_type,
+  s.last_activity_at,
+  s.iteration,
+  COALESCE(s.llm_requests, 0) as llm_requests,
+  COALESCE(s.total_tokens, 0) as total_tokens,
+  COALESCE(s.cost_usd, 0) as cost_usd,
+  t.steps_archived_at
+FROM tasks t
+LEFT JOIN task_summaries s ON s.task_id = t.id;
+
+ALTER TABLE task_step_archives ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can do everything on task_step_archives" ON task_step_archives
+  FOR ALL USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE task_step_archives IS 'Blob store location of archived task steps (one JSON Lines archive per task)';
+COMMENT ON COLUMN tasks.steps_archived_at IS 'When the task''s steps were moved to task_step_archives';
@@ -0,0 +1,14 @@
+-- Analytics Export
+-- analytics_export.py reads whole tables in keyset chunks ordered by
+-- (created_at, id), or (updated_at, id) for tasks, resuming from a watermark
+
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_id ON tasks(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_task_steps_created_id ON task_steps(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created_id ON artifacts(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created_id ON llm_usage(created_at, id);
+
+-- Superseded by idx_task_steps_created_id where schema.sql created it
+DROP INDEX IF EXISTS idx_task_steps_created_at;
+
+COMMENT ON INDEX idx_tasks_updated_id IS 'Incremental analytics export of tasks changed since the watermark';
+COMMENT ON INDEX idx_task_steps_created_id IS 'Incremental analytics export of task steps';
@@ -0,0 +1,7 @@
+-- Knowledge Content Hashes
+-- Ingestion skips chunks whose content hash (metadata->>'content_hash') is
+-- already in the table, so the check is made against the database itself
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_content_hash ON knowledge ((metadata->>'content_hash'));
+
+COMMENT ON INDEX idx_knowledge_content_hash IS 'Dedupe of knowledge chunks on ingestion';
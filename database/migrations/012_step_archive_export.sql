@@ -0,0 +1,5 @@
+-- Step Archive Export
+-- analytics_export.py exports the steps of archives made since its last run
+-- (archived steps are no longer in task_steps)
+
+CREATE INDEX IF NOT EXISTS idx_task_step_archives_archived ON task_step_archives(archived_at, task_id);
@@ -0,0 +1,324 @@
+"""
+Incremental columnar (Parquet / Arrow IPC) export of tasks, steps, artifacts and LLM usage.
+"""
+import argparse
+import glob
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from config import Config
+from database import EXPORT_TABLES, get_database_client, encode_step_cursor, read_archived_steps
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - only needed for exports
+    pa = None
+    pq = None
+
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    """Arrow schema of each exported table; JSON columns are exported as JSON text."""
+    timestamp = pa.timestamp("us", tz="UTC")
+    return {
+        "tasks": pa.schema([
+            ("id", pa.string()),
+            ("user_id", pa.string()),
+            ("title", pa.string()),
+            ("description", pa.string()),
+            ("status", pa.string()),
+            ("phase", pa.string()),
+            ("model", pa.string()),
+            ("created_at", timestamp),
+            ("updated_at", timestamp),
+            ("completed_at", timestamp),
+            ("error_message", pa.string()),
+            ("steps_archived_at", timestamp),
+        ]),
+        "task_steps": pa.schema([
+            ("id", pa.string()),
+            ("task_id", pa.string()),
+            ("phase", pa.string()),
+            ("type", pa.string()),
+            ("content", pa.string()),
+            ("metadata", pa.string()),
+            ("created_at", timestamp),
+        ]),
+        "artifacts": pa.schema([
+            ("id", pa.string()),
+            ("task_id", pa.string()),
+            ("type", pa.string()),
+            ("name", pa.string()),
+            ("url", pa.string()),
+            ("path", pa.string()),
+            ("metadata", pa.string()),
+            ("created_at", timestamp),
+        ]),
+        "llm_usage": pa.schema([
+            ("id", pa.string()),
+            ("task_id", pa.string()),
+            ("phase", pa.string()),
+            ("iteration", pa.int32()),
+            ("model", pa.string()),
+            ("prompt_tokens", pa.int64()),
+            ("completion_tokens", pa.int64()),
+            ("cached_tokens", pa.int64()),
+            ("total_tokens", pa.int64()),
+            ("latency_ms", pa.int64()),
+            ("finish_reason", pa.string()),
+            ("cost_usd", pa.float64()),
+            ("created_at", timestamp),
+        ]),
+    }
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO timestamp; naive values (SQLite backend) are UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _to_arrow_row(row: Dict[str, Any], schema: "pa.Schema") -> Dict[str, Any]:
+    """Convert a database row to Arrow-compatible values."""
+    converted = {}
+    for field in schema:
+        value = row.get(field.name)
+        if pa.types.is_timestamp(field.type):
+            value = _parse_timestamp(value)
+        elif field.name == "metadata" and value is not None and not isinstance(value, str):
+            value = json.dumps(value, default=str)
+        elif pa.types.is_floating(field.type) and value is not None:
+            value = float(value)
+        converted[field.name] = value
+    return converted
+
+
+class AnalyticsExporter:
+    """
+    Streams tables into day-partitioned Parquet or Arrow IPC files.
+    
+    Each table is read in keyset chunks of (order column, id) (see
+    EXPORT_TABLES) and written as
+    `<output>/<table>/date=YYYY-MM-DD/part-<run>.<ext>`, one file per day
+    touched per run. A watermark per table in `<output>/_watermarks.json`
+    records the last exported row, so the next run exports only newer rows
+    (and, for tasks, rows updated since). Files are written under a
+    temporary name and renamed when complete, and a watermark only advances
+    after its files are in place, so an interrupted run is simply repeated.
+    
+    Rows younger than ANALYTICS_EXPORT_LAG seconds are left for the next run
+    so steps still buffered by a StepWriter spool are not skipped.
+    
+    Steps moved out of task_steps by the retention job (step_archive.py)
+    are read back from their archives: each run also visits archives made
+    since the previous one (watermark "task_step_archives") and exports
+    their steps after the task_steps watermark the run started from, i.e.
+    the ones not already exported from the table. A task archived while an
+    export is running may have a few steps exported twice; step ids are
+    unique, so readers can drop the repeats.
+    """
+    
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        file_format: str = "parquet",
+        db_client=None,
+        chunk_size: Optional[int] = None
+    ):
+        """
+        Args:
+            output_dir: Export root (ANALYTICS_EXPORT_PATH by default)
+            file_format: "parquet" or "arrow" (Arrow IPC file)
+            db_client: Database client (get_database_client() by default)
+            chunk_size: Rows read per request
+        """
+        if pa is None:
+            raise RuntimeError("Analytics export requires pyarrow")
+        if file_format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown export format: {file_format}")
+        self.output_dir = output_dir or Config.ANALYTICS_EXPORT_PATH
+        self.file_format = file_format
+        self.db_client = db_client or get_database_client()
+        self.chunk_size = chunk_size or Config.ANALYTICS_EXPORT_CHUNK_SIZE
+        self.schemas = _schemas()
+        self.watermark_path = os.path.join(self.output_dir, "_watermarks.json")
+    
+    # Watermarks
+    
+    def load_watermarks(self) -> Dict[str, str]:
+        """Cursor of the last exported row per table."""
+        if not os.path.exists(self.watermark_path):
+            return {}
+        with open(self.watermark_path) as handle:
+            return json.load(handle)
+    
+    def _save_watermark(self, table: str, cursor: str):
+        watermarks = self.load_watermarks()
+        watermarks[table] = cursor
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.watermark_path + ".tmp"
+        with open(temp_path, "w") as handle:
+            json.dump(watermarks, handle, indent=2)
+        os.replace(temp_path, self.watermark_path)
+    
+    # Writing
+    
+    def _open_writer(self, path: str, schema: "pa.Schema"):
+        """Columnar writer for one partition file (zstd-compressed)."""
+        if self.file_format == "parquet":
+            return pq.ParquetWriter(path, schema, compression="zstd")
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        return pa.ipc.new_file(pa.OSFile(path, "wb"), schema, options=options)
+    
+    def export_table(self, table: str, run_id: str, until: Optional[str] = None) -> int:
+        """
+        Export one table's rows after its watermark.
+        
+        Args:
+            table: One of EXPORT_TABLES
+            run_id: Name shared by this run's files
+            until: Only rows whose order column is before this timestamp
+        
+        Returns:
+            Number of rows exported
+        """
+        schema = self.schemas[table]
+        order_column = EXPORT_TABLES[table]
+        extension = "parquet" if self.file_format == "parquet" else "arrow"
+        cursor = self.load_watermarks().get(table)
+        
+        # Leftovers of an interrupted run
+        for stale in glob.glob(os.path.join(self.output_dir, table, "*", "*.tmp")):
+            os.remove(stale)
+        
+        writers: Dict[str, Any] = {}
+        
+        def write(rows: List[Dict[str, Any]]):
+            by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for row in rows:
+                by_day.setdefault(str(row[order_column])[:10], []).append(_to_arrow_row(row, schema))
+            for day, day_rows in by_day.items():
+                if day not in writers:
+                    directory = os.path.join(self.output_dir, table, f"date={day}")
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f"part-{run_id}.{extension}")
+                    if os.path.exists(path):
+                        # Replacing it would drop rows already behind the watermark
+                        raise FileExistsError(f"Partition file {path} already exists")
+                    writers[day] = (path, self._open_writer(path + ".tmp", schema))
+                writers[day][1].write_table(pa.Table.from_pylist(day_rows, schema=schema))
+        
+        start_cursor = cursor
+        exported = 0
+        archive_cursor = None
+        try:
+            while True:
+                rows = self.db_client.get_rows_after(
+                    table, schema.names, after=cursor, until=until, limit=self.chunk_size
+                )
+                if not rows:
+                    break
+                
+                write(rows)
+                exported += len(rows)
+                last = rows[-1]
+                cursor = encode_step_cursor({"created_at": last[order_column], "id": last["id"]})
+                if len(rows) < self.chunk_size:
+                    break
+            
+            if table == "task_steps":
+                archived, archive_cursor = self._export_archived_steps(write, start_cursor, until)
+                exported += archived
+        except Exception:
+            for path, writer in writers.values():
+                writer.close()
+                os.remove(path + ".tmp")
+            raise
+        
+        for path, writer in writers.values():
+            writer.close()
+            os.replace(path + ".tmp", path)
+        if cursor != start_cursor:
+            self._save_watermark(table, cursor)
+        if archive_cursor:
+            self._save_watermark("task_step_archives", archive_cursor)
+        logger.info(f"Exported {exported} {table} rows to {len(writers)} partitions")
+        return exported
+    
+    def _export_archived_steps(self, write, steps_cursor: Optional[str], until: Optional[str]):
+        """
+        Export steps of archives made since the last run that were not exported from task_steps.
+        
+        Args:
+            write: Writes a list of step rows to this run's partitions
+            steps_cursor: task_steps watermark at the start of this run; archived
+                steps after it never passed through the table export
+            until: Only archives made before this timestamp
+        
+        Returns:
+            (steps exported, new archive watermark or None if unchanged)
+        """
+        columns = self.schemas["task_steps"].names
+        cursor = self.load_watermarks().get("task_step_archives")
+        start_cursor = cursor
+        exported = 0
+        while True:
+            archives = self.db_client.get_step_archives_after(after=cursor, until=until, limit=100)
+            for archive in archives:
+                since = steps_cursor
+                while True:
+                    steps = read_archived_steps(
+                        archive["blob_digest"], since=since, limit=self.chunk_size, fields=columns
+                    )
+                    if steps:
+                        write(steps)
+                        exported += len(steps)
+                    if len(steps) < self.chunk_size:
+                        break
+                    since = encode_step_cursor(steps[-1])
+            if archives:
+                last = archives[-1]
+                cursor = encode_step_cursor({"created_at": last["archived_at"], "id": last["task_id"]})
+            if len(archives) < 100:
+                break
+        return exported, (cursor if cursor != start_cursor else None)
+    
+    def run(self, tables: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Export every table (or the given ones) incrementally.
+        
+        Returns:
+            Rows exported per table
+        """
+        # Unique per run, so runs never write the same partition file
+        run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        until = (datetime.utcnow() - timedelta(seconds=Config.ANALYTICS_EXPORT_LAG)).isoformat()
+        return {
+            table: self.export_table(table, run_id, until=until)
+            for table in (tables or list(EXPORT_TABLES))
+        }
+
+
+def main():
+    """Run one incremental export (e.g. from cron)."""
+    parser = argparse.ArgumentParser(description="Export tasks, steps, artifacts and LLM usage to Parquet/Arrow")
+    parser.add_argument("--output", default=None, help="Export directory (ANALYTICS_EXPORT_PATH)")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--tables", nargs="*", choices=list(EXPORT_TABLES), default=None)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    counts = AnalyticsExporter(output_dir=args.output, file_format=args.format).run(args.tables)
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Async Supabase (PostgREST) client for Morgus with a shared connection pool.
+"""
+import asyncio
+import functools
+from typing import Any, Dict, List, Optional
+import httpx
+from config import Config
+from database import (
+    step_columns,
+    task_columns,
+    after_cursor_filter,
+    before_cursor_filter,
+    read_archived_steps,
+    merge_steps,
+    new_task_cache,
+    changed_task_id
+)
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseClient:
+    """
+    Async counterpart of DatabaseClient.
+    
+    Talks to PostgREST over one pooled httpx.AsyncClient with keep-alive, so
+    concurrent requests reuse a bounded set of connections instead of each
+    caller paying its own connection setup. Writes whose result the caller
+    ignores are sent with `Prefer: return=minimal`.
+    """
+    
+    def __init__(self):
+        self.base_url = f"{Config.SUPABASE_URL.rstrip('/')}/rest/v1"
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "apikey": Config.SUPABASE_SERVICE_KEY,
+                "Authorization": f"Bearer {Config.SUPABASE_SERVICE_KEY}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(
+                max_connections=Config.DB_POOL_SIZE,
+                max_keepalive_connections=Config.DB_POOL_SIZE,
+                keepalive_expiry=Config.DB_POOL_KEEPALIVE
+            ),
+            timeout=Config.DB_TIMEOUT
+        )
+        # Task rows by id; kept fresh by update_task and change notifications
+        self.task_cache = new_task_cache()
+    
+    async def close(self):
+        """Close pooled connections."""
+        await self.client.aclose()
+    
+    async def _select(
+        self,
+        table: str,
+        params: Dict[str, str],
+        columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        """GET rows from a table or view with PostgREST filter params."""
+        response = await self.client.get(f"/{table}", params={"select": columns, **params})
+        response.raise_for_status()
+        return response.json()
+    
+    async def _insert(
+        self,
+        table: str,
+        data: Any,
+        returning: bool = True,
+        on_conflict: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        POST rows to a table.
+        
+        Args:
+            table: Table name
+            data: Row dict or list of row dicts
+            returning: Return the stored rows; False sends return=minimal
+            on_conflict: Conflict column; duplicates are ignored
+        """
+        prefer = ["return=representation" if returning else "return=minimal"]
+        params = {}
+        if on_conflict:
+            prefer.append("resolution=ignore-duplicates")
+            params["on_conflict"] = on_conflict
+        response = await self.client.post(
+            f"/{table}",
+            json=data,
+            params=params,
+            headers={"Prefer": ",".join(prefer)}
+        )
+        response.raise_for_status()
+        return response.json() if returning else []
+    
+    # Task operations
+    
+    async def create_task(
+        self,
+        title: str,
+        description: str,
+        model: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create a new task."""
+        try:
+            data = {
+                "user_id": user_id or "default",
+                "title": title,
+                "description": description,
+                "status": "pending",
+                "phase": "RESEARCH",
+                "model": model or Config.DEFAULT_MODEL,
+                "created_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.utcnow().isoformat()
+            }
+            
+            rows = await self._insert("tasks", data)
+            task = rows[0] if rows else None
+            if task:
+                self.task_cache.put(task["id"], task)
+            return task
+        
+        except Exception as e:
+            logger.error(f"Failed to create task: {e}")
+            raise
+    
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task by ID (served from the task cache when fresh)."""
+        hit, task = self.task_cache.get(task_id)
+        if hit:
+            return dict(task) if task else None
+        
+        try:
+            rows = await self._select("tasks", {"id": f"eq.{task_id}"})
+            task = rows[0] if rows else None
+            if task:
+                self.task_cache.put(task_id, task)
+            else:
+                self.task_cache.put_missing(task_id)
+            return dict(task) if task else None
+        except Exception as e:
+            logger.error(f"Failed to get task {task_id}: {e}")
+            return None
+    
+    async def update_task(
+        self,
+        task_id: str,
+        updates: Dict[str, Any],
+        returning: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update a task.
+        
+        Args:
+            task_id: Task ID
+            updates: Dict of fields to update
+            returning: Return the updated row (False skips it)
+        
+        Returns:
+            Updated task record, or None when returning is False
+        """
+        try:
+            updates["updated_at"] = datetime.utcnow().isoformat()
+            self.task_cache.invalidate(task_id)
+            response = await self.client.patch(
+                "/tasks",
+                json=updates,
+                params={"id": f"eq.{task_id}"},
+                headers={"Prefer": "return=representation" if returning else "return=minimal"}
+            )
+            response.raise_for_status()
+            if not returning:
+                return None
+            rows = response.json()
+            task = rows[0] if rows else None
+            if task:
+                self.task_cache.put(task_id, task)
+            return task
+        except Exception as e:
+            logger.error(f"Failed to update task {task_id}: {e}")
+            raise
+    
+    def handle_task_change(self, payload: Dict[str, Any]):
+        """Invalidate the cached row of a task changed elsewhere (change notification)."""
+        task_id = changed_task_id(payload)
+        if task_id:
+            self.task_cache.invalidate(task_id)
+    
+    async def get_pending_tasks(self) -> List[Dict[str, Any]]:
+        """Get all pending tasks."""
+        try:
+            return await self._select("tasks", {"status": "eq.pending"})
+        except Exception as e:
+            logger.error(f"Failed to get pending tasks: {e}")
+            return []
+    
+    async def get_tasks(
+        self,
+        user_id: str,
+        status: Optional[List[str]] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        summary: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        List a user's tasks, newest first, one keyset page at a time.
+        
+        With summary, rows come from task_dashboard and include the task's
+        summary counters.
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        columns = task_columns(fields, summary)
+        params = {
+            "user_id": f"eq.{user_id}",
+            "order": "created_at.desc,id.desc",
+            "limit": str(limit)
+        }
+        if status:
+            params["status"] = f"in.({','.join(status)})"
+        if before:
+            params["or"] = f"({before_cursor_filter(before)})"
+        try:
+            return await self._select("task_dashboard" if summary else "tasks", params, columns)
+        except Exception as e:
+            logger.error(f"Failed to list tasks for {user_id}: {e}")
+            return []
+    
+    async def get_task_summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's summary counters, or None before it has any steps."""
+        try:
+            rows = await self._select("task_summaries", {"task_id": f"eq.{task_id}"})
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get summary for {task_id}: {e}")
+            return None
+    
+    # Task step operations
+    
+    async def add_task_step(
+        self,
+        task_id: str,
+        phase: str,
+        step_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """Add a step to a task's execution log (nothing is returned)."""
+        try:
+            await self._insert("task_steps", {
+                "task_id": task_id,
+                "phase": phase,
+                "type": step_type,
+                "content": content,
+                "metadata": metadata or {},
+                "created_at": datetime.utcnow().isoformat()
+            }, returning=False)
+        except Exception as e:
+            logger.error(f"Failed to add task step: {e}")
+            raise
+    
+    async def add_task_steps_batch(self, steps: List[Dict[str, Any]]) -> int:
+        """Insert a batch of task steps with client ids, skipping ones already stored."""
+        if not steps:
+            return 0
+        
+        try:
+            await self._insert("task_steps", steps, returning=False, on_conflict="id")
+            return len(steps)
+        except Exception as e:
+            logger.error(f"Failed to add {len(steps)} task steps: {e}")
+            raise
+    
+    async def get_task_steps(
+        self,
+        task_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get steps for a task in (created_at, id) order.
+        
+        Args:
+            task_id: Task ID
+            since: Cursor from encode_step_cursor; only later steps are returned
+            limit: Maximum steps to return (all when None)
+            fields: Columns to return (id and created_at are always included)
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        columns = step_columns(fields)
+        params = {"task_id": f"eq.{task_id}", "order": "created_at.asc,id.asc"}
+        if since:
+            params["or"] = f"({after_cursor_filter(since)})"
+        if limit:
+            params["limit"] = str(limit)
+        try:
+            steps = await self._select("task_steps", params, columns)
+            
+            # Archived history comes from the blob store (see step_archive.py)
+            task = await self.get_task(task_id)
+            archive = await self.get_step_archive(task_id) if task and task.get("steps_archived_at") else None
+            if archive:
+                archived = await asyncio.to_thread(read_archived_steps, archive["blob_digest"], since, limit, fields)
+                steps = merge_steps(archived, steps, limit)
+            return steps
+        except Exception as e:
+            logger.error(f"Failed to get task steps for {task_id}: {e}")
+            return []
+    
+    async def get_step_archive(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's step archive record, if its steps were archived."""
+        try:
+            rows = await self._select("task_step_archives", {"task_id": f"eq.{task_id}"})
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get step archive for {task_id}: {e}")
+            return None
+    
+    # Artifact operations
+    
+    async def add_artifact(
+        self,
+        task_id: str,
+        artifact_type: str,
+        name: str,
+        url: Optional[str] = None,
+        path: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Add an artifact (output) for a task."""
+        try:
+            rows = await self._insert("artifacts", {
+                "task_id": task_id,
+                "type": artifact_type,
+                "name": name,
+                "url": url,
+                "path": path,
+                "metadata": metadata or {},
+                "created_at": datetime.utcnow().isoformat()
+            })
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to add artifact: {e}")
+            raise
+    
+    async def get_task_artifacts(self, task_id: str) -> List[Dict[str, Any]]:
+        """Get all artifacts for a task."""
+        try:
+            return await self._select("artifacts", {"task_id": f"eq.{task_id}"})
+        except Exception as e:
+            logger.error(f"Failed to get artifacts for {task_id}: {e}")
+            return []
+    
+    # LLM usage operations
+    
+    async def add_llm_usage_batch(self, records: List[Dict[str, Any]]) -> int:
+        """Insert a batch of LLM usage records in one request."""
+        if not records:
+            return 0
+        
+        try:
+            await self._insert("llm_usage", records, returning=False)
+            return len(records)
+        except Exception as e:
+            logger.error(f"Failed to add LLM usage records: {e}")
+            raise
+    
+    async def get_task_usage(self, task_id: str) -> List[Dict[str, Any]]:
+        """Get per-phase LLM usage rollups for a task."""
+        try:
+            return await self._select("llm_usage_task_rollup", {"task_id": f"eq.{task_id}"})
+        except Exception as e:
+            logger.error(f"Failed to get LLM usage for {task_id}: {e}")
+            return []
+    
+    async def get_model_usage(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get per-model daily LLM usage rollups, most recent day first."""
+        try:
+            params = {"order": "day.desc"}
+            if since:
+                params["day"] = f"gte.{since}"
+            return await self._select("llm_usage_model_rollup", params)
+        except Exception as e:
+            logger.error(f"Failed to get model usage: {e}")
+            return []
+    
+    async def get_cost_per_successful_task(self) -> Optional[Dict[str, Any]]:
+        """Get average LLM tokens and cost per completed task."""
+        try:
+            rows = await self._select("llm_usage_success_cost", {})
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get cost per successful task: {e}")
+            return None
+
+
+class ThreadedAsyncDatabaseClient:
+    """
+    Async facade over a synchronous client, running each call in a worker thread.
+    
+    Used for the SQLite backend, whose calls are local and short, so there is
+    no connection pool to share.
+    """
+    
+    def __init__(self, sync_client):
+        self.sync_client = sync_client
+    
+    def __getattr__(self, name: str):
+        method = getattr(self.sync_client, name)
+        
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+    
+    def handle_task_change(self, payload: Dict[str, Any]):
+        """Forward a change notification (synchronous, like AsyncDatabaseClient's)."""
+        self.sync_client.handle_task_change(payload)
+    
+    async def close(self):
+        """Nothing to close; the sync client is shared."""
+
+
+_async_client = None
+
+
+def get_async_database_client():
+    """
+    Get the shared async client, creating it on first use.
+    
+    httpx.AsyncClient is bound to the event loop it first runs on, so the
+    shared client is meant for one loop per process (e.g. the API server).
+    With DATABASE_BACKEND "sqlite" this wraps the shared SQLite client.
+    """
+    global _async_client
+    if _async_client is None:
+        if Config.DATABASE_BACKEND == "sqlite":
+            from database import get_database_client
+            _async_client = ThreadedAsyncDatabaseClient(get_database_client())
+        else:
+            _async_client = AsyncDatabaseClient()
+    return _async_client
+
+
+async def close_async_database_client():
+    """Close the shared async client, if one was created."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
@@ -0,0 +1,256 @@
+"""
+Content-addressed, zstd-compressed blob store for large step payloads.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from typing import Any, Dict, Optional
+import zstandard
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def blob_digest(data: bytes) -> str:
+    """SHA-256 of the uncompressed bytes; the blob's address."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore:
+    """Blobs as files under a directory, sharded by the first two hex digits."""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.zst")
+    
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+    
+    def write(self, digest: str, compressed: bytes):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique name and rename, so readers never see a partial blob
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(compressed)
+        os.replace(temp_path, path)
+    
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3BlobStore:
+    """Blobs as objects in an S3-compatible bucket (AWS S3, R2, MinIO)."""
+    
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        # boto3 is only needed for this backend
+        import boto3
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+    
+    def _key(self, digest: str) -> str:
+        name = f"{digest[:2]}/{digest}.zst"
+        return f"{self.prefix}/{name}" if self.prefix else name
+    
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+    
+    def write(self, digest: str, compressed: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=compressed)
+    
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+            return response["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+
+class BlobStore:
+    """
+    Stores payloads once by content hash, compressed with zstd.
+    
+    Identical payloads (the same file read twice, the same error output)
+    map to one blob, so storing is idempotent and costs nothing after the
+    first time within a process.
+    """
+    
+    def __init__(self, backend, level: Optional[int] = None):
+        """
+        Args:
+            backend: LocalBlobStore or S3BlobStore
+            level: zstd compression level
+        """
+        self.backend = backend
+        self.level = level or Config.BLOB_COMPRESSION_LEVEL
+        self._known: set = set()
+        self._lock = threading.Lock()
+        # zstd (de)compressor objects are not thread-safe; keep one per thread
+        self._local = threading.local()
+    
+    def _codecs(self):
+        """This thread's (compressor, decompressor)."""
+        if not hasattr(self._local, "codecs"):
+            self._local.codecs = (zstandard.ZstdCompressor(level=self.level), zstandard.ZstdDecompressor())
+        return self._local.codecs
+    
+    def put(self, data: bytes) -> str:
+        """
+        Store bytes, skipping the write when the blob already exists.
+        
+        Returns:
+            The blob digest
+        """
+        digest = blob_digest(data)
+        with self._lock:
+            if digest in self._known:
+                return digest
+        
+        if not self.backend.exists(digest):
+            self.backend.write(digest, self._codecs()[0].compress(data))
+        with self._lock:
+            self._known.add(digest)
+        return digest
+    
+    def get(self, digest: str) -> Optional[bytes]:
+        """
+        Get a blob's bytes, or None if it is not stored.
+        
+        Raises:
+            ValueError: If digest is not a SHA-256 hex digest
+        """
+        if not _DIGEST_RE.fullmatch(digest):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        compressed = self.backend.read(digest)
+        if compressed is None:
+            return None
+        return self._codecs()[1].decompress(compressed)
+    
+    def put_text(self, text: str) -> str:
+        """Store UTF-8 text; returns the digest."""
+        return self.put(text.encode("utf-8"))
+    
+    def get_text(self, digest: str) -> Optional[str]:
+        """Get a blob stored with put_text."""
+        data = self.get(digest)
+        return data.decode("utf-8") if data is not None else None
+
+
+def offload_step_payload(
+    row: Dict[str, Any],
+    store: Optional[BlobStore],
+    inline_limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Move a step's oversized content and arguments into the blob store.
+    
+    Content longer than inline_limit is cut to a preview and the full text
+    is referenced by metadata['content_blob']. Likewise, TOOL_CALL arguments
+    whose JSON exceeds the limit are replaced by metadata['arguments_blob']
+    plus a short 'arguments_preview'. Rows are modified in place. Without a
+    store, or when storing fails, the payload is only truncated.
+    
+    Returns:
+        The row
+    """
+    inline_limit = inline_limit or Config.BLOB_INLINE_LIMIT
+    metadata = row.setdefault("metadata", {})
+    
+    content = row.get("content") or ""
+    if len(content) > inline_limit:
+        try:
+            if store:
+                metadata["content_blob"] = {"digest": store.put_text(content), "size": len(content)}
+        except Exception as e:
+            logger.warning(f"Failed to store step content blob, truncating: {e}")
+        row["content"] = content[:inline_limit]
+    
+    arguments = metadata.get("arguments")
+    if arguments is not None:
+        encoded = json.dumps(arguments, default=str)
+        if len(encoded) > inline_limit:
+            try:
+                if store:
+                    metadata["arguments_blob"] = {"digest": store.put_text(encoded), "size": len(encoded)}
+            except Exception as e:
+                logger.warning(f"Failed to store step arguments blob, truncating: {e}")
+            del metadata["arguments"]
+            metadata["arguments_preview"] = encoded[:inline_limit]
+    return row
+
+
+def inline_step_payload(row: Dict[str, Any], store: Optional[BlobStore]) -> Dict[str, Any]:
+    """
+    Reverse offload_step_payload: restore full content and arguments from the store.
+    
+    Used where a step leaves this deployment (e.g. bulk export), since blob
+    references are only meaningful next to their store. References whose
+    blob is missing are left in place. Rows are modified in place.
+    
+    Returns:
+        The row
+    """
+    metadata = row.get("metadata") or {}
+    if store is None:
+        return row
+    
+    content_blob = metadata.get("content_blob")
+    if content_blob:
+        content = store.get_text(content_blob["digest"])
+        if content is not None:
+            row["content"] = content
+            del metadata["content_blob"]
+    
+    arguments_blob = metadata.get("arguments_blob")
+    if arguments_blob:
+        encoded = store.get_text(arguments_blob["digest"])
+        if encoded is not None:
+            metadata["arguments"] = json.loads(encoded)
+            del metadata["arguments_blob"]
+            metadata.pop("arguments_preview", None)
+    return row
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> Optional[BlobStore]:
+    """
+    Get the process-wide blob store selected by BLOB_STORE_BACKEND.
+    
+    "local" (default) stores under BLOB_STORE_PATH, "s3" in an S3-compatible
+    bucket; "none" disables the store (None is returned).
+    """
+    global _store
+    if Config.BLOB_STORE_BACKEND == "none":
+        return None
+    with _store_lock:
+        if _store is None:
+            if Config.BLOB_STORE_BACKEND == "s3":
+                backend = S3BlobStore(
+                    bucket=Config.BLOB_STORE_BUCKET,
+                    prefix=Config.BLOB_STORE_PREFIX,
+                    endpoint_url=Config.BLOB_STORE_ENDPOINT
+                )
+            else:
+                backend = LocalBlobStore(Config.BLOB_STORE_PATH)
+            _store = BlobStore(backend)
+        return _store
@@ -0,0 +1,82 @@
+"""
+Small thread-safe TTL + LRU cache for database rows.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+# Stored for keys known not to exist
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after a TTL.
+    
+    Lookups of keys that were not found can be cached too (negative caching),
+    with their own, usually shorter, TTL.
+    """
+    
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float = 0.0):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl: Seconds an entry stays valid
+            negative_ttl: Seconds a "not found" stays valid (0 disables)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Any]]:
+        """
+        Look up a key.
+        
+        Returns:
+            (hit, value); value is None for a cached "not found"
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+            return True, None if value is _MISSING else value
+    
+    def put(self, key: Hashable, value: Any):
+        """Cache a value."""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._store(key, value, self.ttl)
+    
+    def put_missing(self, key: Hashable):
+        """Cache that a key does not exist."""
+        if self.negative_ttl <= 0 or self.max_entries <= 0:
+            return
+        self._store(key, _MISSING, self.negative_ttl)
+    
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, key: Hashable):
+        """Drop a key."""
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,230 @@
+"""
+Record-and-replay LLM backend for offline, deterministic runs.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tolerance levels for matching a request to a recorded interaction, strictest first
+MATCH_EXACT = "exact"        # identical request (model, sampling params, messages, tools)
+MATCH_MESSAGES = "messages"  # identical messages and tools, any model or max_tokens
+MATCH_SEQUENCE = "sequence"  # otherwise the next unused interaction in recorded order
+MATCH_LEVELS = [MATCH_EXACT, MATCH_MESSAGES, MATCH_SEQUENCE]
+
+
+def _hash(payload: Any) -> str:
+    """Stable hash of a JSON-serializable value."""
+    data = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def request_hashes(kwargs: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Hashes identifying a chat completion request at each match level.
+    
+    The messages hash leaves out everything the router may choose differently
+    between runs (model, temperature, max_tokens), so a replay still matches
+    when routing statistics send a request to another model.
+    """
+    return {
+        MATCH_EXACT: _hash(kwargs),
+        MATCH_MESSAGES: _hash({
+            "messages": kwargs.get("messages"),
+            "tools": kwargs.get("tools"),
+            "response_format": kwargs.get("response_format")
+        })
+    }
+
+
+def _parse_response(data: Dict[str, Any]) -> Any:
+    """Rebuild an OpenAI ChatCompletion from its recorded dict."""
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(data)
+
+
+class CassetteRecorder:
+    """
+    Endpoint pool wrapper that appends every request and response to a cassette.
+    
+    The cassette is a JSON Lines file with one interaction per line, written as
+    soon as the response arrives so an interrupted run keeps what it recorded.
+    """
+    
+    def __init__(self, pool: Any, path: str):
+        """
+        Args:
+            pool: EndpointPool that sends the live requests
+            path: Cassette file to append to
+        """
+        self.pool = pool
+        self.path = path
+        self._sequence = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    
+    def chat_completion(self, kwargs: Dict[str, Any], estimated_tokens: int = 0):
+        """Send a request through the live pool and record the interaction."""
+        started = time.monotonic()
+        response = self.pool.chat_completion(kwargs, estimated_tokens=estimated_tokens)
+        latency = time.monotonic() - started
+        
+        with self._lock:
+            entry = {
+                "sequence": self._sequence,
+                "hashes": request_hashes(kwargs),
+                "request": kwargs,
+                "response": response.model_dump(mode="json"),
+                "latency": latency
+            }
+            self._sequence += 1
+            with open(self.path, "a") as handle:
+                handle.write(json.dumps(entry, default=str) + "\n")
+        
+        return response
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """Status of the wrapped pool's endpoints."""
+        return self.pool.status()
+
+
+class CassettePlayer:
+    """
+    Endpoint pool stand-in that answers requests from a recorded cassette.
+    
+    Each recorded interaction is used at most once. A request is matched at the
+    strictest level that finds an unused interaction, down to the configured
+    tolerance; among equal matches the earliest recorded wins, so repeated
+    identical requests replay in their original order.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        match: Optional[str] = None,
+        latency_scale: Optional[float] = None
+    ):
+        """
+        Args:
+            path: Cassette file to replay
+            match: Loosest match level allowed (exact, messages or sequence)
+            latency_scale: Multiplier for recorded latencies; 1.0 replays the
+                original timing, 0 answers immediately
+        """
+        self.path = path
+        self.match = match or Config.LLM_CASSETTE_MATCH
+        if self.match not in MATCH_LEVELS:
+            raise ValueError(f"Unknown cassette match level: {self.match}")
+        self.latency_scale = Config.LLM_REPLAY_LATENCY_SCALE if latency_scale is None else latency_scale
+        self.entries = self._load(path)
+        self._used = [False] * len(self.entries)
+        self._lock = threading.Lock()
+        self.misses = 0
+        self.matches = {level: 0 for level in MATCH_LEVELS}
+    
+    @staticmethod
+    def _load(path: str) -> List[Dict[str, Any]]:
+        """Read a cassette file."""
+        if not os.path.exists(path):
+            raise ValueError(f"Cassette not found: {path}")
+        
+        entries = []
+        with open(path) as handle:
+            for line in handle:
+                if line.strip():
+                    entries.append(json.loads(line))
+        entries.sort(key=lambda entry: entry.get("sequence", 0))
+        logger.info(f"Loaded {len(entries)} recorded LLM interactions from {path}")
+        return entries
+    
+    def _find(self, hashes: Dict[str, str]) -> Optional[int]:
+        """Index of the best unused interaction for a request, marking it used."""
+        allowed = MATCH_LEVELS[:MATCH_LEVELS.index(self.match) + 1]
+        for level in allowed:
+            for index, entry in enumerate(self.entries):
+                if self._used[index]:
+                    continue
+                if level == MATCH_SEQUENCE or entry["hashes"].get(level) == hashes[level]:
+                    self._used[index] = True
+                    self.matches[level] += 1
+                    if level != MATCH_EXACT:
+                        logger.debug(f"Cassette request matched at {level} level (entry {index})")
+                    return index
+        return None
+    
+    def chat_completion(self, kwargs: Dict[str, Any], estimated_tokens: int = 0):
+        """
+        Answer a request from the cassette.
+        
+        Raises:
+            ValueError: If no unused recorded interaction matches
+        """
+        hashes = request_hashes(kwargs)
+        with self._lock:
+            index = self._find(hashes)
+            if index is None:
+                self.misses += 1
+        
+        if index is None:
+            raise ValueError(
+                f"No recorded interaction matches request {hashes[MATCH_EXACT][:12]} "
+                f"(match level {self.match}, cassette {self.path})"
+            )
+        
+        entry = self.entries[index]
+        delay = entry.get("latency", 0.0) * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+        return _parse_response(entry["response"])
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """Replay progress in the shape of an endpoint status list."""
+        with self._lock:
+            return [{
+                "name": "cassette",
+                "path": self.path,
+                "match": self.match,
+                "latency_scale": self.latency_scale,
+                "interactions": len(self.entries),
+                "replayed": sum(self._used),
+                "matches": dict(self.matches),
+                "misses": self.misses
+            }]
+
+
+_backend: Optional[Any] = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend() -> Any:
+    """
+    Get the process-wide LLM backend selected by LLM_BACKEND.
+    
+    "live" sends requests through the endpoint pool, "record" does the same
+    and writes them to LLM_CASSETTE_PATH, and "replay" answers them from that
+    cassette without touching the network.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            mode = Config.LLM_BACKEND
+            if mode == "replay":
+                _backend = CassettePlayer(Config.LLM_CASSETTE_PATH)
+            else:
+                # Imported here so replay never builds clients or health checks
+                from endpoints import get_endpoint_pool
+                pool = get_endpoint_pool()
+                if mode == "record":
+                    _backend = CassetteRecorder(pool, Config.LLM_CASSETTE_PATH)
+                    logger.info(f"Recording LLM interactions to {Config.LLM_CASSETTE_PATH}")
+                elif mode == "live":
+                    _backend = pool
+                else:
+                    raise ValueError(f"Unknown LLM_BACKEND: {mode}")
+        return _backend
@@ -0,0 +1,130 @@
+"""
+Condensation of long fetched web pages with a cheap model.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAP_PROMPT = """You extract information from part of a web page for a research assistant.
+Write concise notes with every fact, figure, code snippet, API detail and URL from the excerpt that is relevant to the question. Keep exact names and values. If nothing in the excerpt is relevant, reply with "Nothing relevant."
+
+Question: {question}"""
+
+REDUCE_PROMPT = """You merge notes taken from consecutive parts of one web page.
+Combine them into a single concise digest that answers the question as far as the page allows. Remove repetition, keep exact names, values and code, and say plainly if the page does not answer the question.
+
+Question: {question}"""
+
+
+class PageCondenser:
+    """
+    Map-reduce condensation of fetched pages against the task's question.
+    
+    The full text of every condensed page stays in memory under a short
+    handle, so the conversation only carries the digest and the model can
+    read the original with read_page when the digest is not enough.
+    """
+    
+    def __init__(self, router, model: Optional[str] = None):
+        """
+        Args:
+            router: ModelRouter used for the condensation requests
+            model: Model to use (defaults to CONDENSE_MODEL, CASCADE_MODEL,
+                then the router's default model)
+        """
+        self.router = router
+        self.model = model or Config.CONDENSE_MODEL or Config.CASCADE_MODEL or router.default_model
+        self.question = ""
+        self.pages: Dict[str, str] = {}
+        # Where each stored page came from (e.g. its URL)
+        self.sources: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def reset(self, question: str = ""):
+        """Start a new task: set its question and drop stored pages."""
+        with self._lock:
+            self.question = question
+            self.pages = {}
+            self.sources = {}
+    
+    def store(self, text: str, source: Optional[str] = None) -> str:
+        """Keep a page's full text and return its handle."""
+        handle = "page-" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            self.pages[handle] = text
+            if source:
+                self.sources[handle] = source
+        return handle
+    
+    def get_page(self, handle: str) -> Optional[str]:
+        """Full text stored under a handle."""
+        with self._lock:
+            return self.pages.get(handle)
+    
+    def _split(self, text: str) -> List[str]:
+        """Split text into chunks of about CONDENSE_CHUNK_CHARS on line boundaries."""
+        chunks = []
+        current: List[str] = []
+        size = 0
+        for line in text.splitlines():
+            if current and size + len(line) > Config.CONDENSE_CHUNK_CHARS:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            # Hard-wrap single lines longer than a chunk
+            while len(line) > Config.CONDENSE_CHUNK_CHARS:
+                chunks.append(line[:Config.CONDENSE_CHUNK_CHARS])
+                line = line[Config.CONDENSE_CHUNK_CHARS:]
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+    
+    def _complete(self, instructions: str, content: str) -> str:
+        """Single condensation request."""
+        response = self.router.chat_completion(
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": content}
+            ],
+            model=self.model,
+            temperature=0,
+            max_tokens=Config.CONDENSE_MAX_TOKENS
+        )
+        return (response.get("content") or "").strip()
+    
+    def condense(self, text: str, question: Optional[str] = None) -> str:
+        """
+        Condense a page against a question.
+        
+        Chunks are summarized in parallel (map), then the partial notes are
+        merged into one digest (reduce) unless a single chunk was enough.
+        
+        Args:
+            text: Full page text
+            question: What the agent wants from the page; defaults to the
+                task's question
+        
+        Returns:
+            Digest text
+        """
+        question = question or self.question or "Summarize the page."
+        map_prompt = MAP_PROMPT.format(question=question)
+        chunks = self._split(text)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(Config.TOOL_MAX_PARALLEL, len(chunks)))) as executor:
+            notes = list(executor.map(lambda chunk: self._complete(map_prompt, chunk), chunks))
+        
+        notes = [note for note in notes if note and note != "Nothing relevant."]
+        if not notes:
+            return "Nothing on this page is relevant to the question."
+        if len(notes) == 1:
+            return notes[0]
+        
+        merged = "\n\n".join(f"Notes from part {i + 1}:\n{note}" for i, note in enumerate(notes))
+        return self._complete(REDUCE_PROMPT.format(question=question), merged)
@@ -1,6 +1,7 @@
 """
 Configuration management for Morgus orchestrator.
 """
+import json
 import os
 from typing import Optional
 from dotenv import load_dotenv
@@ -17,12 +18,119 @@ class Config:
     CODE_MODEL: str = os.getenv("CODE_MODEL", "gpt-4")  # Can be specialized later
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "4096"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
+    # Size max_tokens per phase/tool from observed output lengths (MAX_TOKENS until enough data)
+    ADAPTIVE_MAX_TOKENS: bool = os.getenv("ADAPTIVE_MAX_TOKENS", "true").lower() == "true"
+    MIN_MAX_TOKENS: int = int(os.getenv("MIN_MAX_TOKENS", "512"))
+    MAX_OUTPUT_TOKENS: int = int(os.getenv("MAX_OUTPUT_TOKENS", "16384"))
+    MAX_TOKENS_HEADROOM: float = float(os.getenv("MAX_TOKENS_HEADROOM", "1.25"))
+    # Continue responses cut off at max_tokens (finish_reason == "length")
+    AUTO_CONTINUE: bool = os.getenv("AUTO_CONTINUE", "true").lower() == "true"
+    MAX_CONTINUATIONS: int = int(os.getenv("MAX_CONTINUATIONS", "2"))
+    
+    # Optional pool of OpenAI-compatible endpoints as a JSON list of objects with
+    # name, api_key, base_url, organization, weight, models, azure_endpoint,
+    # api_version, deployments, rpm_limit and tpm_limit; empty means a single
+    # endpoint using OPENAI_API_KEY
+    LLM_ENDPOINTS: list = json.loads(os.getenv("LLM_ENDPOINTS", "[]"))
+    LLM_ENDPOINT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_ENDPOINT_FAILURE_THRESHOLD", "3"))
+    LLM_ENDPOINT_COOLDOWN: float = float(os.getenv("LLM_ENDPOINT_COOLDOWN", "30"))  # seconds
+    LLM_HEALTH_CHECK_INTERVAL: float = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "60"))  # seconds, 0 disables
+    
+    # Client-side rate limiting per endpoint; per-endpoint rpm_limit/tpm_limit
+    # (or x-ratelimit-limit-* headers) override these defaults, 0 disables
+    RATE_LIMIT_RPM: int = int(os.getenv("RATE_LIMIT_RPM", "0"))
+    RATE_LIMIT_TPM: int = int(os.getenv("RATE_LIMIT_TPM", "0"))
+    RATE_LIMIT_HEADROOM: float = float(os.getenv("RATE_LIMIT_HEADROOM", "0.9"))
+    RATE_LIMIT_BURST_SECONDS: float = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))
+    # Directory for bucket state shared across processes on one host (optional)
+    RATE_LIMIT_SHARED_DIR: str = os.getenv("RATE_LIMIT_SHARED_DIR", "")
+    
+    # LLM backend: live, record (live + write LLM_CASSETTE_PATH) or replay
+    # (answer from LLM_CASSETTE_PATH offline)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "live").lower()
+    LLM_CASSETTE_PATH: str = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm.jsonl")
+    # Loosest replay match: exact, messages (ignore model/sampling) or sequence
+    LLM_CASSETTE_MATCH: str = os.getenv("LLM_CASSETTE_MATCH", "messages")
+    # Multiplier for recorded latencies on replay (1.0 original, 0 instant)
+    LLM_REPLAY_LATENCY_SCALE: float = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+    
+    # Coalesce concurrent identical requests at or below this temperature
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    SINGLE_FLIGHT_MAX_TEMPERATURE: float = float(os.getenv("SINGLE_FLIGHT_MAX_TEMPERATURE", "0.0"))
+    
+    # Re-derive unparseable tool arguments with a structured-output request
+    TOOL_ARGS_STRUCTURED_REPAIR: bool = os.getenv("TOOL_ARGS_STRUCTURED_REPAIR", "true").lower() == "true"
+    
+    # Model Routing Configuration
+    # Candidate models considered by the router (comma-separated); empty means
+    # DEFAULT_MODEL and CODE_MODEL only
+    ROUTING_MODELS: list = [m.strip() for m in os.getenv("ROUTING_MODELS", "").split(",") if m.strip()]
+    # Optional per-phase candidate lists, e.g. {"BUILD": ["gpt-4o", "gpt-4"]}
+    ROUTING_PHASE_MODELS: dict = json.loads(os.getenv("ROUTING_PHASE_MODELS", "{}"))
+    ROUTING_LATENCY_WEIGHT: float = float(os.getenv("ROUTING_LATENCY_WEIGHT", "0.5"))
+    ROUTING_COST_WEIGHT: float = float(os.getenv("ROUTING_COST_WEIGHT", "0.5"))
+    ROUTING_MAX_P95_LATENCY: float = float(os.getenv("ROUTING_MAX_P95_LATENCY", "90"))  # seconds
+    ROUTING_MAX_ERROR_RATE: float = float(os.getenv("ROUTING_MAX_ERROR_RATE", "0.25"))
+    ROUTING_MIN_SAMPLES: int = int(os.getenv("ROUTING_MIN_SAMPLES", "5"))
+    ROUTING_DEGRADED_COOLDOWN: float = float(os.getenv("ROUTING_DEGRADED_COOLDOWN", "120"))  # seconds
+    ROUTING_STATS_WINDOW: int = int(os.getenv("ROUTING_STATS_WINDOW", "200"))
+    # Cascade routing: try CASCADE_MODEL first in CASCADE_PHASES, escalate on failure
+    CASCADE_MODEL: str = os.getenv("CASCADE_MODEL", "")
+    CASCADE_PHASES: list = [p.strip() for p in os.getenv("CASCADE_PHASES", "RESEARCH,PLAN,FINALIZE").split(",") if p.strip()]
+    # Unproductive turns in a phase after which requests skip the cheap model
+    CASCADE_STAGNATION_TURNS: int = int(os.getenv("CASCADE_STAGNATION_TURNS", "1"))
+    CASCADE_LOW_CONFIDENCE_MARKERS: list = [
+        "i'm not sure", "i am not sure", "i'm unsure", "i am unsure",
+        "i don't know", "i do not know", "i cannot determine",
+        "unclear how to proceed", "not confident"
+    ]
+    # USD per 1K tokens as [prompt, completion], merged over the built-in table
+    MODEL_PRICING: dict = json.loads(os.getenv("MODEL_PRICING", "{}"))
+    # Context window sizes in tokens, merged over the built-in table
+    MODEL_CONTEXT_WINDOWS: dict = json.loads(os.getenv("MODEL_CONTEXT_WINDOWS", "{}"))
+    
+    # Storage backend: "supabase" or "sqlite" (local file in WAL mode, no credentials)
+    DATABASE_BACKEND: str = os.getenv("DATABASE_BACKEND", "supabase")
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "data/morgus.db")
     
     # Supabase Configuration
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     
+    # Async PostgREST connection pool (shared per process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_KEEPALIVE: float = float(os.getenv("DB_POOL_KEEPALIVE", "30"))  # seconds
+    DB_TIMEOUT: float = float(os.getenv("DB_TIMEOUT", "10"))  # seconds
+    
+    # Task row cache (per DatabaseClient); a tasks-table webhook to
+    # /hooks/task-changes invalidates entries changed by other processes
+    TASK_CACHE_SIZE: int = int(os.getenv("TASK_CACHE_SIZE", "1024"))
+    TASK_CACHE_TTL: float = float(os.getenv("TASK_CACHE_TTL", "5"))  # seconds, 0 disables
+    TASK_CACHE_NEGATIVE_TTL: float = float(os.getenv("TASK_CACHE_NEGATIVE_TTL", "2"))  # seconds
+    TASK_WEBHOOK_SECRET: str = os.getenv("TASK_WEBHOOK_SECRET", "")
+    
+    # Knowledge search: "local" (in-process IVF index) or "pgvector" (match_knowledge RPC)
+    KNOWLEDGE_SEARCH_BACKEND: str = os.getenv("KNOWLEDGE_SEARCH_BACKEND", "local").lower()
+    KNOWLEDGE_MATCH_THRESHOLD: float = float(os.getenv("KNOWLEDGE_MATCH_THRESHOLD", "0.7"))
+    VECTOR_INDEX_PATH: str = os.getenv("VECTOR_INDEX_PATH", "data/knowledge_index")
+    VECTOR_INDEX_LISTS: int = int(os.getenv("VECTOR_INDEX_LISTS", "0"))  # 0 = sqrt(size)
+    VECTOR_INDEX_PROBES: int = int(os.getenv("VECTOR_INDEX_PROBES", "8"))
+    VECTOR_INDEX_TRAIN_MIN: int = int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "1024"))
+    VECTOR_INDEX_LOG_LIMIT: int = int(os.getenv("VECTOR_INDEX_LOG_LIMIT", "1000"))
+    
+    # Knowledge ingestion: chunking, embeddings ("openai" or the offline "hash"
+    # stand-in) and the content-hash cache
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.jsonl")
+    KNOWLEDGE_CHUNK_CHARS: int = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "2000"))
+    KNOWLEDGE_CHUNK_OVERLAP: int = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "200"))
+    # Store pages fetched during RESEARCH in the knowledge base (needs CONDENSE_FETCHED_PAGES)
+    KNOWLEDGE_INGEST_RESEARCH: bool = os.getenv("KNOWLEDGE_INGEST_RESEARCH", "false").lower() == "true"
+    
     # Cloudflare Configuration
     CLOUDFLARE_API_TOKEN: str = os.getenv("CLOUDFLARE_API_TOKEN", "")
     CLOUDFLARE_ACCOUNT_ID: str = os.getenv("CLOUDFLARE_ACCOUNT_ID", "")
@@ -69,6 +177,50 @@ class Config:
         "stackoverflow.com", "developer.mozilla.org"
     ]
     
+    # Per-tool phase overrides, e.g. {"shell_exec": ["BUILD", "EXECUTE"]}; tools
+    # not listed keep their built-in phase tags
+    TOOL_PHASES: dict = json.loads(os.getenv("TOOL_PHASES", "{}"))
+    # Read-only tool calls from one response run concurrently up to this limit
+    TOOL_MAX_PARALLEL: int = int(os.getenv("TOOL_MAX_PARALLEL", "4"))
+    
+    # Condense fetched pages longer than CONDENSE_MIN_CHARS with a cheap model
+    # (CONDENSE_MODEL, else CASCADE_MODEL, else DEFAULT_MODEL)
+    CONDENSE_FETCHED_PAGES: bool = os.getenv("CONDENSE_FETCHED_PAGES", "false").lower() == "true"
+    CONDENSE_MODEL: str = os.getenv("CONDENSE_MODEL", "")
+    CONDENSE_MIN_CHARS: int = int(os.getenv("CONDENSE_MIN_CHARS", "3000"))
+    CONDENSE_CHUNK_CHARS: int = int(os.getenv("CONDENSE_CHUNK_CHARS", "12000"))
+    CONDENSE_MAX_TOKENS: int = int(os.getenv("CONDENSE_MAX_TOKENS", "600"))
+    
+    # Write-behind task step logging; the spool holds steps the database did
+    # not accept and is replayed in order. Each process spools to its own
+    # <path>.<pid>-<id>.jsonl and adopts files left by stopped processes
+    STEP_WRITER_BATCH_SIZE: int = int(os.getenv("STEP_WRITER_BATCH_SIZE", "50"))
+    STEP_WRITER_FLUSH_INTERVAL: float = float(os.getenv("STEP_WRITER_FLUSH_INTERVAL", "2"))  # seconds
+    STEP_WRITER_SPOOL_PATH: str = os.getenv("STEP_WRITER_SPOOL_PATH", "spool/task_steps.jsonl")
+    
+    # Blob store for oversized step content and tool arguments:
+    # "local" (BLOB_STORE_PATH), "s3" (S3-compatible bucket, needs boto3) or "none"
+    BLOB_STORE_BACKEND: str = os.getenv("BLOB_STORE_BACKEND", "local")
+    BLOB_STORE_PATH: str = os.getenv("BLOB_STORE_PATH", "data/blobs")
+    BLOB_STORE_BUCKET: str = os.getenv("BLOB_STORE_BUCKET", "")
+    BLOB_STORE_PREFIX: str = os.getenv("BLOB_STORE_PREFIX", "step-blobs")
+    BLOB_STORE_ENDPOINT: str = os.getenv("BLOB_STORE_ENDPOINT", "")
+    BLOB_INLINE_LIMIT: int = int(os.getenv("BLOB_INLINE_LIMIT", "1000"))  # characters kept in the row
+    BLOB_COMPRESSION_LEVEL: int = int(os.getenv("BLOB_COMPRESSION_LEVEL", "3"))
+    
+    # Step retention: steps of tasks finished more than this many days ago are
+    # moved to compressed archives in the blob store (0 disables the service job)
+    STEP_ARCHIVE_AFTER_DAYS: float = float(os.getenv("STEP_ARCHIVE_AFTER_DAYS", "0"))
+    STEP_ARCHIVE_INTERVAL: float = float(os.getenv("STEP_ARCHIVE_INTERVAL", "3600"))  # seconds
+    
+    # Analytics export: day-partitioned Parquet/Arrow files written by analytics_export.py
+    ANALYTICS_EXPORT_PATH: str = os.getenv("ANALYTICS_EXPORT_PATH", "data/analytics")
+    ANALYTICS_EXPORT_CHUNK_SIZE: int = int(os.getenv("ANALYTICS_EXPORT_CHUNK_SIZE", "5000"))  # rows per read
+    ANALYTICS_EXPORT_LAG: float = float(os.getenv("ANALYTICS_EXPORT_LAG", "600"))  # seconds; skip rows newer than this
+    
+    # Usage ledger: LLM usage records buffered per batch insert
+    USAGE_LEDGER_BATCH_SIZE: int = int(os.getenv("USAGE_LEDGER_BATCH_SIZE", "20"))
+    
     # Task Configuration
     MAX_ITERATIONS: int = int(os.getenv("MAX_ITERATIONS", "50"))
     MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", "3"))
@@ -80,10 +232,16 @@ class Config:
     def validate(cls) -> bool:
         """Validate required configuration."""
         required = [
-            ("OPENAI_API_KEY", cls.OPENAI_API_KEY),
-            ("SUPABASE_URL", cls.SUPABASE_URL),
-            ("SUPABASE_SERVICE_KEY", cls.SUPABASE_SERVICE_KEY),
+            # Replay answers from a cassette and needs no credentials
+            ("OPENAI_API_KEY", cls.OPENAI_API_KEY or cls.LLM_ENDPOINTS or cls.LLM_BACKEND == "replay"),
         ]
+        if cls.DATABASE_BACKEND == "supabase":
+            required += [
+                ("SUPABASE_URL", cls.SUPABASE_URL),
+                ("SUPABASE_SERVICE_KEY", cls.SUPABASE_SERVICE_KEY),
+            ]
+        elif cls.DATABASE_BACKEND != "sqlite":
+            raise ValueError(f"Unknown DATABASE_BACKEND: {cls.DATABASE_BACKEND}")
         
         missing = [name for name, value in required if not value]
         
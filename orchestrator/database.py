@@ -1,14 +1,192 @@
 """
 Supabase database client for Morgus.
 """
-from typing import Any, Dict, List, Optional
+import base64
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 from supabase import create_client, Client
+from postgrest.types import CountMethod, ReturnMethod
 from config import Config
+from vector_index import get_vector_index
+from cache import TTLCache
+from blob_store import get_blob_store
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Columns a task step projection may select
+TASK_STEP_COLUMNS = ["id", "task_id", "phase", "type", "content", "metadata", "created_at"]
+
+# Columns a task listing projection may select
+TASK_LIST_COLUMNS = [
+    "id", "user_id", "title", "description", "status", "phase", "model",
+    "created_at", "updated_at", "completed_at", "error_message", "steps_archived_at"
+]
+
+# Per-task counters from task_summaries, selectable in summary listings
+TASK_SUMMARY_COLUMNS = [
+    "step_count", "tool_calls", "tool_errors", "last_phase", "last_step_type",
+    "last_activity_at", "iteration", "llm_requests", "total_tokens", "cost_usd"
+]
+
+
+def encode_step_cursor(row: Dict[str, Any]) -> str:
+    """
+    Opaque cursor for a row's (created_at, id) position.
+    
+    Used for task steps (read oldest first) and task listings (newest first).
+    """
+    raw = f"{row['created_at']}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_step_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode a cursor into (created_at, id).
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return created_at, row_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _projection(fields: Optional[List[str]], allowed: List[str], kind: str) -> str:
+    """PostgREST select list; the cursor columns (created_at, id) are always included."""
+    if not fields:
+        return "*"
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {kind} fields: {', '.join(unknown)}")
+    columns = list(dict.fromkeys(["id", "created_at"] + list(fields)))
+    return ",".join(columns)
+
+
+def step_columns(fields: Optional[List[str]] = None) -> str:
+    """
+    PostgREST select list for a step projection.
+    
+    Raises:
+        ValueError: On an unknown column
+    """
+    return _projection(fields, TASK_STEP_COLUMNS, "task step")
+
+
+def task_columns(fields: Optional[List[str]] = None, summary: bool = False) -> str:
+    """
+    PostgREST select list for a task listing projection.
+    
+    Args:
+        fields: Requested columns
+        summary: Also allow task_summaries columns (task_dashboard listings)
+    
+    Raises:
+        ValueError: On an unknown column
+    """
+    allowed = TASK_LIST_COLUMNS + TASK_SUMMARY_COLUMNS if summary else TASK_LIST_COLUMNS
+    return _projection(fields, allowed, "task")
+
+
+def new_task_cache() -> TTLCache:
+    """Task row cache configured from TASK_CACHE_* settings."""
+    return TTLCache(
+        max_entries=Config.TASK_CACHE_SIZE,
+        ttl=Config.TASK_CACHE_TTL,
+        negative_ttl=Config.TASK_CACHE_NEGATIVE_TTL
+    )
+
+
+def changed_task_id(payload: Dict[str, Any]) -> Optional[str]:
+    """Task id from a database change notification (Supabase webhook/Realtime payload)."""
+    if payload.get("table") not in (None, "tasks"):
+        return None
+    record = payload.get("record") or payload.get("old_record") or {}
+    return record.get("id")
+
+
+def after_cursor_filter(cursor: str, column: str = "created_at", id_column: str = "id") -> str:
+    """Conditions of a PostgREST or-filter selecting rows strictly after a cursor on (column, id)."""
+    position, row_id = decode_step_cursor(cursor)
+    # Quoted, since timestamps may contain reserved characters
+    return f'{column}.gt."{position}",and({column}.eq."{position}",{id_column}.gt."{row_id}")'
+
+
+# Tables readable in bulk by get_rows_after, with the column they are paged
+# by: append-only tables by creation, tasks by last update so changes are seen
+EXPORT_TABLES = {
+    "tasks": "updated_at",
+    "task_steps": "created_at",
+    "artifacts": "created_at",
+    "llm_usage": "created_at"
+}
+
+# Parsed step archives by blob digest; archives are immutable
+_archive_cache = TTLCache(max_entries=32, ttl=600)
+
+
+def read_archived_steps(
+    digest: str,
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    missing_ok: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Steps from a task's archive (see step_archive.py), paged like get_task_steps.
+    
+    Raises:
+        ValueError: On a malformed cursor or unknown field
+        LookupError: If the archive is missing from the blob store and not missing_ok
+    """
+    columns = step_columns(fields)
+    position = decode_step_cursor(since) if since else None
+    
+    hit, rows = _archive_cache.get(digest)
+    if not hit:
+        store = get_blob_store()
+        text = store.get_text(digest) if store else None
+        if text is None:
+            if not missing_ok:
+                raise LookupError(f"Step archive {digest} is missing from the blob store")
+            logger.error(f"Step archive {digest} is missing from the blob store")
+            return []
+        rows = [json.loads(line) for line in text.splitlines() if line]
+        _archive_cache.put(digest, rows)
+    
+    selected = []
+    for row in rows:
+        if position and (row["created_at"], row["id"]) <= position:
+            continue
+        selected.append(row if columns == "*" else {column: row.get(column) for column in columns.split(",")})
+        if limit and len(selected) >= limit:
+            break
+    return selected
+
+
+def merge_steps(
+    archived: List[Dict[str, Any]],
+    hot: List[Dict[str, Any]],
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Combine archived and table steps in (created_at, id) order, dropping duplicates."""
+    if not archived:
+        return hot
+    by_id = {row["id"]: row for row in archived}
+    by_id.update((row["id"], row) for row in hot)
+    rows = sorted(by_id.values(), key=lambda row: (row["created_at"], row["id"]))
+    return rows[:limit] if limit else rows
+
+
+def before_cursor_filter(cursor: str) -> str:
+    """Conditions of a PostgREST or-filter selecting rows strictly before a cursor."""
+    created_at, row_id = decode_step_cursor(cursor)
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+
 
 class DatabaseClient:
     """Client for interacting with Supabase database."""
@@ -18,6 +196,10 @@ class DatabaseClient:
             Config.SUPABASE_URL,
             Config.SUPABASE_SERVICE_KEY
         )
+        # Task rows by id; kept fresh by update_task and change notifications
+        self.task_cache = new_task_cache()
+        self._vector_index_checked = False
+        self._vector_index_lock = threading.Lock()
     
     # Task operations
     
@@ -25,7 +207,8 @@ class DatabaseClient:
         self,
         title: str,
         description: str,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Create a new task.
@@ -34,12 +217,14 @@ class DatabaseClient:
             title: Task title
             description: Task description/goal
             model: Model to use (optional)
+            user_id: Owner of the task ("default" when not given)
             
         Returns:
             Created task record
         """
         try:
             data = {
+                "user_id": user_id or "default",
                 "title": title,
                 "description": description,
                 "status": "pending",
@@ -50,17 +235,59 @@ class DatabaseClient:
             }
             
             response = self.client.table("tasks").insert(data).execute()
-            return response.data[0] if response.data else None
+            task = response.data[0] if response.data else None
+            if task:
+                self.task_cache.put(task["id"], task)
+            return task
         
         except Exception as e:
             logger.error(f"Failed to create task: {e}")
             raise
     
+    def add_tasks_batch(self, tasks: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of complete task rows in one request (bulk import).
+        
+        Rows carry their own ids; tasks already stored are skipped rather
+        than overwritten.
+        
+        Args:
+            tasks: Task rows (id, user_id, title, description, status, ...)
+        
+        Returns:
+            Number of tasks inserted
+        """
+        if not tasks:
+            return 0
+        
+        try:
+            response = self.client.table("tasks").upsert(
+                tasks,
+                on_conflict="id",
+                ignore_duplicates=True,
+                count=CountMethod.exact,
+                returning=ReturnMethod.minimal
+            ).execute()
+            return len(tasks) if response.count is None else response.count
+        
+        except Exception as e:
+            logger.error(f"Failed to add {len(tasks)} tasks: {e}")
+            raise
+    
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Get a task by ID."""
+        """Get a task by ID (served from the task cache when fresh)."""
+        hit, task = self.task_cache.get(task_id)
+        if hit:
+            return dict(task) if task else None
+        
         try:
             response = self.client.table("tasks").select("*").eq("id", task_id).execute()
-            return response.data[0] if response.data else None
+            task = response.data[0] if response.data else None
+            if task:
+                self.task_cache.put(task_id, task)
+            else:
+                self.task_cache.put_missing(task_id)
+            return dict(task) if task else None
         except Exception as e:
             logger.error(f"Failed to get task {task_id}: {e}")
             return None
@@ -82,12 +309,22 @@ class DatabaseClient:
         """
         try:
             updates["updated_at"] = datetime.utcnow().isoformat()
+            self.task_cache.invalidate(task_id)
             response = self.client.table("tasks").update(updates).eq("id", task_id).execute()
-            return response.data[0] if response.data else None
+            task = response.data[0] if response.data else None
+            if task:
+                self.task_cache.put(task_id, task)
+            return task
         except Exception as e:
             logger.error(f"Failed to update task {task_id}: {e}")
             raise
     
+    def handle_task_change(self, payload: Dict[str, Any]):
+        """Invalidate the cached row of a task changed elsewhere (change notification)."""
+        task_id = changed_task_id(payload)
+        if task_id:
+            self.task_cache.invalidate(task_id)
+    
     def get_pending_tasks(self) -> List[Dict[str, Any]]:
         """Get all pending tasks."""
         try:
@@ -97,6 +334,68 @@ class DatabaseClient:
             logger.error(f"Failed to get pending tasks: {e}")
             return []
     
+    def get_tasks(
+        self,
+        user_id: str,
+        status: Optional[List[str]] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        summary: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        List a user's tasks, newest first, one keyset page at a time.
+        
+        Args:
+            user_id: Task owner
+            status: Only tasks with one of these statuses
+            limit: Page size
+            before: Cursor (encode_step_cursor of the last task of the
+                previous page); only older tasks are returned
+            fields: Columns to return (id and created_at are always included)
+            summary: Include each task's summary counters (task_dashboard)
+        
+        Returns:
+            List of task records
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        columns = task_columns(fields, summary)
+        older = before_cursor_filter(before) if before else None
+        table = "task_dashboard" if summary else "tasks"
+        try:
+            query = self.client.table(table).select(columns).eq("user_id", user_id)
+            if status:
+                query = query.in_("status", status)
+            if older:
+                query = query.or_(older)
+            response = (
+                query.order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Failed to list tasks for {user_id}: {e}")
+            return []
+    
+    def get_task_summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a task's summary counters (step and tool counts, last activity,
+        current iteration, token and cost totals).
+        
+        Returns:
+            The task_summaries row, or None before the task has any steps
+        """
+        try:
+            response = self.client.table("task_summaries").select("*").eq("task_id", task_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Failed to get summary for {task_id}: {e}")
+            return None
+    
     # Task step operations
     
     def add_task_step(
@@ -137,21 +436,222 @@ class DatabaseClient:
             logger.error(f"Failed to add task step: {e}")
             raise
     
-    def get_task_steps(self, task_id: str) -> List[Dict[str, Any]]:
-        """Get all steps for a task."""
+    def add_task_steps_batch(self, steps: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of task steps in one request.
+        
+        Steps carry client-generated ids; rows already stored (e.g. from a
+        retried batch) are skipped rather than duplicated.
+        
+        Args:
+            steps: Step rows (id, task_id, phase, type, content, metadata, created_at)
+        
+        Returns:
+            Number of steps inserted
+        """
+        if not steps:
+            return 0
+        
         try:
-            response = (
+            response = self.client.table("task_steps").upsert(
+                steps,
+                on_conflict="id",
+                ignore_duplicates=True,
+                count=CountMethod.exact,
+                returning=ReturnMethod.minimal
+            ).execute()
+            return len(steps) if response.count is None else response.count
+        
+        except Exception as e:
+            logger.error(f"Failed to add {len(steps)} task steps: {e}")
+            raise
+    
+    def get_task_steps(
+        self,
+        task_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get steps for a task in (created_at, id) order.
+        
+        Steps of archived tasks are read from their archive, so callers see
+        the same history before and after retention runs.
+        
+        Args:
+            task_id: Task ID
+            since: Cursor from encode_step_cursor; only later steps are returned
+            limit: Maximum steps to return (all when None)
+            fields: Columns to return (id and created_at are always included)
+        
+        Returns:
+            List of step records
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        columns = step_columns(fields)
+        after = after_cursor_filter(since) if since else None
+        try:
+            query = (
                 self.client.table("task_steps")
-                .select("*")
+                .select(columns)
                 .eq("task_id", task_id)
-                .order("created_at")
+            )
+            if after:
+                query = query.or_(after)
+            query = query.order("created_at").order("id")
+            if limit:
+                query = query.limit(limit)
+            response = query.execute()
+            steps = response.data or []
+            
+            task = self.get_task(task_id)
+            archive = self.get_step_archive(task_id) if task and task.get("steps_archived_at") else None
+            if archive:
+                archived = read_archived_steps(archive["blob_digest"], since, limit, fields)
+                steps = merge_steps(archived, steps, limit)
+            return steps
+        except Exception as e:
+            logger.error(f"Failed to get task steps for {task_id}: {e}")
+            return []
+    
+    # Step archive operations
+    
+    def get_steps_to_archive(
+        self,
+        task_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a task's steps for the retention job, in (created_at, id) order.
+        
+        Unlike get_task_steps, errors are raised rather than read as "no
+        steps", and an earlier archive of the task (left by an interrupted
+        run) is merged in even though the task is not marked archived yet.
+        
+        Raises:
+            ValueError: On a malformed cursor
+            LookupError: If the earlier archive is missing from the blob store
+        """
+        try:
+            query = self.client.table("task_steps").select(step_columns()).eq("task_id", task_id)
+            if since:
+                query = query.or_(after_cursor_filter(since))
+            query = query.order("created_at").order("id")
+            if limit:
+                query = query.limit(limit)
+            steps = query.execute().data or []
+            
+            archive = self.client.table("task_step_archives").select("blob_digest").eq("task_id", task_id).execute()
+            if archive.data:
+                archived = read_archived_steps(archive.data[0]["blob_digest"], since, limit, missing_ok=False)
+                steps = merge_steps(archived, steps, limit)
+            return steps
+        except Exception as e:
+            logger.error(f"Failed to read steps to archive for {task_id}: {e}")
+            raise
+    
+    def get_tasks_to_archive(self, finished_before: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get finished tasks last updated before a time whose steps are still in task_steps.
+        
+        Args:
+            finished_before: ISO timestamp
+            limit: Maximum tasks
+        
+        Returns:
+            Task records (id, status, updated_at), oldest first
+        """
+        try:
+            response = (
+                self.client.table("tasks")
+                .select("id,status,updated_at")
+                .in_("status", ["completed", "error"])
+                .is_("steps_archived_at", "null")
+                .lt("updated_at", finished_before)
+                .order("updated_at")
+                .limit(limit)
                 .execute()
             )
             return response.data or []
         except Exception as e:
-            logger.error(f"Failed to get task steps for {task_id}: {e}")
+            logger.error(f"Failed to get tasks to archive: {e}")
             return []
     
+    def add_step_archive(self, archive: Dict[str, Any]):
+        """
+        Record where a task's steps were archived (replacing an earlier record).
+        
+        Args:
+            archive: task_id, blob_digest, step_count, bytes, first_step_at,
+                last_step_at and archived_at
+        """
+        try:
+            self.client.table("task_step_archives").upsert(
+                archive,
+                on_conflict="task_id",
+                returning=ReturnMethod.minimal
+            ).execute()
+        except Exception as e:
+            logger.error(f"Failed to record step archive for {archive.get('task_id')}: {e}")
+            raise
+    
+    def get_step_archive(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's step archive record, if its steps were archived."""
+        try:
+            response = self.client.table("task_step_archives").select("*").eq("task_id", task_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Failed to get step archive for {task_id}: {e}")
+            return None
+    
+    def get_step_archives_after(
+        self,
+        after: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Step archive records in (archived_at, task_id) order, for bulk export.
+        
+        Args:
+            after: Cursor of (archived_at, task_id) (see encode_step_cursor);
+                only later archives are returned
+            until: Only archives made before this timestamp
+            limit: Maximum records
+        
+        Raises:
+            ValueError: On a malformed cursor
+        """
+        query = self.client.table("task_step_archives").select("task_id,blob_digest,archived_at")
+        if after:
+            query = query.or_(after_cursor_filter(after, "archived_at", "task_id"))
+        if until:
+            query = query.lt("archived_at", until)
+        response = query.order("archived_at").order("task_id").limit(limit).execute()
+        return response.data or []
+    
+    def delete_task_steps(self, task_id: str, through: Optional[str] = None):
+        """
+        Delete a task's rows from task_steps (after they were archived).
+        
+        Args:
+            task_id: Task ID
+            through: Cursor of the last step to delete; later steps are kept
+        """
+        try:
+            query = self.client.table("task_steps").delete(returning=ReturnMethod.minimal).eq("task_id", task_id)
+            if through:
+                created_at, step_id = decode_step_cursor(through)
+                query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lte."{step_id}")')
+            query.execute()
+        except Exception as e:
+            logger.error(f"Failed to delete task steps for {task_id}: {e}")
+            raise
+    
     # Artifact operations
     
     def add_artifact(
@@ -209,6 +709,73 @@ class DatabaseClient:
             logger.error(f"Failed to get artifacts for {task_id}: {e}")
             return []
     
+    # LLM usage operations
+    
+    def add_llm_usage_batch(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of LLM usage records in one request.
+        
+        Args:
+            records: Usage records (task_id, phase, iteration, model, token
+                counts, latency_ms, finish_reason, cost_usd, created_at)
+        
+        Returns:
+            Number of records inserted
+        """
+        if not records:
+            return 0
+        
+        try:
+            self.client.table("llm_usage").insert(records, returning=ReturnMethod.minimal).execute()
+            return len(records)
+        
+        except Exception as e:
+            logger.error(f"Failed to add LLM usage records: {e}")
+            raise
+    
+    def get_task_usage(self, task_id: str) -> List[Dict[str, Any]]:
+        """Get per-phase LLM usage rollups for a task."""
+        try:
+            response = (
+                self.client.table("llm_usage_task_rollup")
+                .select("*")
+                .eq("task_id", task_id)
+                .execute()
+            )
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Failed to get LLM usage for {task_id}: {e}")
+            return []
+    
+    def get_model_usage(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get per-model daily LLM usage rollups.
+        
+        Args:
+            since: Optional ISO date; only days on or after it are returned
+        
+        Returns:
+            List of rollup rows, most recent day first
+        """
+        try:
+            query = self.client.table("llm_usage_model_rollup").select("*")
+            if since:
+                query = query.gte("day", since)
+            response = query.order("day", desc=True).execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Failed to get model usage: {e}")
+            return []
+    
+    def get_cost_per_successful_task(self) -> Optional[Dict[str, Any]]:
+        """Get average LLM tokens and cost per completed task."""
+        try:
+            response = self.client.table("llm_usage_success_cost").select("*").execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Failed to get cost per successful task: {e}")
+            return None
+    
     # Knowledge base operations (for future vector memory)
     
     def store_knowledge(
@@ -237,38 +804,224 @@ class DatabaseClient:
             }
             
             response = self.client.table("knowledge").insert(data).execute()
-            return response.data[0] if response.data else None
+            row = response.data[0] if response.data else None
+            if row:
+                get_vector_index().add([{**data, "id": row["id"]}])
+            return row
         
         except Exception as e:
             logger.error(f"Failed to store knowledge: {e}")
             raise
     
+    def store_knowledge_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Store many knowledge rows in one insert.
+        
+        Args:
+            rows: Rows with client-generated id, content, embedding, metadata
+                and created_at
+        
+        Returns:
+            Number of rows stored
+        """
+        if not rows:
+            return 0
+        
+        try:
+            self.client.table("knowledge").insert(rows, returning=ReturnMethod.minimal).execute()
+            get_vector_index().add(rows)
+            return len(rows)
+        
+        except Exception as e:
+            logger.error(f"Failed to store {len(rows)} knowledge rows: {e}")
+            raise
+    
+    def get_knowledge_hashes(self, hashes: List[str]) -> set:
+        """
+        Which of these chunk content hashes (metadata.content_hash) are already stored.
+        
+        Args:
+            hashes: Content hashes (see embeddings.content_hash)
+        
+        Returns:
+            The subset present in the knowledge table
+        """
+        found = set()
+        # Keep the IN filter's URL short
+        for start in range(0, len(hashes), 100):
+            response = (
+                self.client.table("knowledge")
+                .select("metadata->>content_hash")
+                .in_("metadata->>content_hash", hashes[start:start + 100])
+                .execute()
+            )
+            found.update(row["content_hash"] for row in response.data or [])
+        return found
+    
     def search_knowledge(
         self,
         query_embedding: List[float],
-        limit: int = 5
+        limit: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        threshold: Optional[float] = None
     ) -> List[Dict[str, Any]]:
         """
         Search knowledge base using vector similarity.
         
+        Uses the local vector index, or the match_knowledge pgvector function
+        when KNOWLEDGE_SEARCH_BACKEND is "pgvector".
+        
         Args:
             query_embedding: Query vector
             limit: Maximum results to return
+            metadata_filter: Equality filter on metadata keys
+            threshold: Minimum cosine similarity (KNOWLEDGE_MATCH_THRESHOLD)
             
         Returns:
-            List of matching knowledge records
+            List of matching knowledge records (id, content, similarity, metadata)
         """
-        # This would use pgvector similarity search
-        # For now, placeholder implementation
+        threshold = Config.KNOWLEDGE_MATCH_THRESHOLD if threshold is None else threshold
         try:
-            # TODO: Implement vector similarity search with pgvector
-            # response = self.client.rpc('match_knowledge', {
-            #     'query_embedding': query_embedding,
-            #     'match_threshold': 0.7,
-            #     'match_count': limit
-            # }).execute()
-            # return response.data or []
-            return []
+            if Config.KNOWLEDGE_SEARCH_BACKEND == "pgvector":
+                # The RPC cannot filter metadata; over-fetch and filter here
+                response = self.client.rpc("match_knowledge", {
+                    "query_embedding": query_embedding,
+                    "match_threshold": threshold,
+                    "match_count": limit * 4 if metadata_filter else limit
+                }).execute()
+                rows = response.data or []
+                if metadata_filter:
+                    rows = [
+                        row for row in rows
+                        if all(
+                            (row.get("metadata") or {}).get(key) == value
+                            for key, value in metadata_filter.items()
+                        )
+                    ]
+                return rows[:limit]
+            
+            self._ensure_vector_index()
+            return get_vector_index().search(
+                query_embedding,
+                limit=limit,
+                metadata_filter=metadata_filter,
+                threshold=threshold
+            )
         except Exception as e:
             logger.error(f"Failed to search knowledge: {e}")
             return []
+    
+    def _ensure_vector_index(self):
+        """
+        On the first local search, rebuild the index if it holds fewer rows than the table.
+        
+        Covers a new host, a deleted index and rows stored by other processes
+        while this one was not running.
+        """
+        with self._vector_index_lock:
+            if self._vector_index_checked:
+                return
+            response = self.client.table("knowledge").select("id", count=CountMethod.exact).limit(1).execute()
+            stored = response.count or 0
+            if len(get_vector_index()) < stored:
+                logger.info(f"Vector index holds {len(get_vector_index())} of {stored} knowledge rows; rebuilding")
+                self.rebuild_vector_index()
+            self._vector_index_checked = True
+    
+    def rebuild_vector_index(self, page_size: int = 500) -> int:
+        """
+        Load every knowledge row into the local vector index.
+        
+        Needed once for rows stored before the index existed, or by another
+        process; later store_knowledge calls keep the index current.
+        
+        Returns:
+            Number of rows indexed
+        """
+        index = get_vector_index()
+        indexed = 0
+        last_id = None
+        while True:
+            query = self.client.table("knowledge").select("id,content,embedding,metadata").order("id")
+            if last_id:
+                query = query.gt("id", last_id)
+            rows = query.limit(page_size).execute().data or []
+            if not rows:
+                break
+            for row in rows:
+                # PostgREST returns pgvector columns as text
+                if isinstance(row["embedding"], str):
+                    row["embedding"] = json.loads(row["embedding"])
+            index.add([row for row in rows if row["embedding"]])
+            indexed += len(rows)
+            last_id = rows[-1]["id"]
+        if len(index) >= Config.VECTOR_INDEX_TRAIN_MIN:
+            index.train()
+        else:
+            index.save()
+        logger.info(f"Rebuilt vector index with {indexed} knowledge rows")
+        return indexed
+
+    # Bulk export operations
+    
+    def get_rows_after(
+        self,
+        table: str,
+        columns: List[str],
+        after: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 5000
+    ) -> List[Dict[str, Any]]:
+        """
+        Read one keyset chunk of a table for bulk export.
+        
+        Rows are ordered by (EXPORT_TABLES[table], id); pass the cursor of the
+        last row (its order column as created_at, see encode_step_cursor) as
+        `after` for the next chunk.
+        
+        Args:
+            table: One of EXPORT_TABLES
+            columns: Columns to select
+            after: Cursor; only later rows are returned
+            until: Only rows whose order column is before this timestamp
+            limit: Chunk size
+        
+        Raises:
+            ValueError: On a table not in EXPORT_TABLES or a malformed cursor
+        """
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Table {table} cannot be exported")
+        column = EXPORT_TABLES[table]
+        query = self.client.table(table).select(",".join(columns))
+        if after:
+            query = query.or_(after_cursor_filter(after, column))
+        if until:
+            query = query.lt(column, until)
+        response = query.order(column).order("id").limit(limit).execute()
+        return response.data or []
+
+
+_client: Optional[DatabaseClient] = None
+_client_lock = threading.Lock()
+
+
+def get_database_client():
+    """
+    Get the process-wide database client for DATABASE_BACKEND, creating it on first use.
+    
+    Sharing one client shares its HTTP connection pool, so every component in
+    the process reuses the same keep-alive connections to PostgREST.
+    
+    Returns:
+        DatabaseClient, or SQLiteDatabaseClient when DATABASE_BACKEND is "sqlite"
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if Config.DATABASE_BACKEND == "sqlite":
+                # Imported here: sqlite_database imports helpers from this module
+                from sqlite_database import SQLiteDatabaseClient
+                _client = SQLiteDatabaseClient()
+            else:
+                _client = DatabaseClient()
+        return _client
@@ -0,0 +1,294 @@
+"""
+Knowledge ingestion: chunking, embedding with a content-hash cache, bulk insert.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def content_hash(text: str) -> str:
+    """Hash identifying a chunk's content, insensitive to surrounding whitespace."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def chunk_text(
+    text: str,
+    chunk_chars: Optional[int] = None,
+    overlap: Optional[int] = None
+) -> List[str]:
+    """
+    Split text into chunks of about chunk_chars, preferring paragraph breaks.
+    
+    Paragraphs are packed together up to the chunk size; a paragraph longer
+    than a chunk is cut into windows that overlap by `overlap` characters so
+    no sentence is lost at a boundary.
+    """
+    chunk_chars = chunk_chars or Config.KNOWLEDGE_CHUNK_CHARS
+    overlap = Config.KNOWLEDGE_CHUNK_OVERLAP if overlap is None else overlap
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    
+    chunks: List[str] = []
+    current = ""
+    for paragraph in paragraphs:
+        if len(paragraph) > chunk_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            step = max(1, chunk_chars - overlap)
+            for start in range(0, len(paragraph), step):
+                chunks.append(paragraph[start:start + chunk_chars])
+                if start + chunk_chars >= len(paragraph):
+                    break
+        elif current and len(current) + len(paragraph) + 2 > chunk_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class OpenAIEmbedder:
+    """Embeds texts through the OpenAI embeddings API, one request per batch."""
+    
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or Config.EMBEDDING_MODEL
+        # Identifies the vector space in the embedding cache
+        self.cache_key = f"openai:{self.model}:{Config.EMBEDDING_DIMENSIONS}"
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in one request."""
+        # Imported here so the hash embedder works without API clients
+        from endpoints import get_endpoint_pool
+        pool = get_endpoint_pool()
+        endpoint = pool.acquire(self.model)
+        try:
+            response = endpoint.client.embeddings.create(
+                model=endpoint.deployment_for(self.model),
+                input=texts
+            )
+            endpoint.record_success()
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception:
+            endpoint.record_failure()
+            raise
+        finally:
+            pool.release(endpoint)
+
+
+class HashEmbedder:
+    """
+    Deterministic, offline stand-in embedder for tests and replay runs.
+    
+    Feature-hashes words into a fixed-size vector, so texts sharing words
+    are similar; no semantics beyond that.
+    """
+    
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or Config.EMBEDDING_DIMENSIONS
+        self.cache_key = f"hash:{self.dimensions}"
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dimensions, dtype=np.float32)
+            for word in _WORD_RE.findall(text.lower()):
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = np.linalg.norm(vector)
+            vectors.append((vector / norm if norm else vector).tolist())
+        return vectors
+
+
+def get_embedder():
+    """Embedder selected by EMBEDDING_BACKEND ("openai" or "hash")."""
+    if Config.EMBEDDING_BACKEND == "hash":
+        return HashEmbedder()
+    return OpenAIEmbedder()
+
+
+class EmbeddingCache:
+    """
+    Local cache of embeddings by embedder (model and dimensions) and content hash.
+    
+    Backed by an append-only JSON Lines file so embeddings survive restarts
+    and re-embedding the same text costs no API calls. Vectors are stored
+    as base64 float32 ("vector") and held as float32 arrays; entries with
+    a JSON float list ("embedding") are still read. Vectors of another
+    model never match, so switching models re-embeds. Entries written
+    before the model was recorded are ignored.
+    
+    The file is read once per process (see get_embedding_cache).
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.EMBEDDING_CACHE_PATH
+        self.embeddings: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """Read the cache file."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "model" not in entry:
+                    continue
+                if "vector" in entry:
+                    vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+                elif "embedding" in entry:
+                    vector = np.asarray(entry["embedding"], dtype=np.float32)
+                else:
+                    continue
+                self.embeddings[(entry["model"], entry["hash"])] = vector
+    
+    def _append(self, entries: List[Dict[str, Any]]):
+        """Persist cache entries."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as handle:
+            for entry in entries:
+                handle.write(json.dumps(entry) + "\n")
+    
+    def get(self, model: str, digest: str) -> Optional[List[float]]:
+        """Cached embedding of a chunk by an embedder (its cache_key), or None."""
+        vector = self.embeddings.get((model, digest))
+        return None if vector is None else vector.tolist()
+    
+    def contains(self, model: str, digest: str) -> bool:
+        """Whether an embedder's embedding of a chunk is cached."""
+        return (model, digest) in self.embeddings
+    
+    def put_embeddings(self, model: str, embeddings: Dict[str, List[float]]):
+        """Cache an embedder's embeddings by content hash."""
+        vectors = {h: np.asarray(e, dtype=np.float32) for h, e in embeddings.items()}
+        with self._lock:
+            self.embeddings.update({(model, h): v for h, v in vectors.items()})
+            self._append([
+                {"model": model, "hash": h, "vector": base64.b64encode(v.tobytes()).decode("ascii")}
+                for h, v in vectors.items()
+            ])
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide embedding cache, loading it from disk on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+class KnowledgeIngester:
+    """
+    Turns documents into knowledge rows with one embedding request and one
+    insert per batch of new chunks.
+    
+    Chunks are deduplicated against the knowledge table itself (by
+    metadata.content_hash), so a fresh or different database is filled
+    even when the embeddings are cached.
+    """
+    
+    def __init__(
+        self,
+        db_client,
+        embedder=None,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: Optional[int] = None
+    ):
+        """
+        Args:
+            db_client: DatabaseClient used for bulk inserts
+            embedder: Object with embed(texts) -> vectors and a cache_key naming
+                its model (get_embedder() by default)
+            cache: Embedding cache (get_embedding_cache() by default)
+            batch_size: Chunks per embedding request and insert
+        """
+        self.db_client = db_client
+        self.embedder = embedder or get_embedder()
+        self.cache = cache or get_embedding_cache()
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+    
+    def ingest(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Chunk, dedupe, embed and store documents.
+        
+        Args:
+            documents: Dicts with 'content' and optional 'metadata'; each
+                chunk inherits its document's metadata
+        
+        Returns:
+            Number of new chunks stored
+        """
+        pending: Dict[str, Dict[str, Any]] = {}
+        for document in documents:
+            chunks = chunk_text(document["content"])
+            for position, chunk in enumerate(chunks):
+                digest = content_hash(chunk)
+                if digest in pending:
+                    continue
+                pending[digest] = {
+                    "content": chunk,
+                    "metadata": {**(document.get("metadata") or {}), "chunk": position, "content_hash": digest}
+                }
+        
+        if not pending:
+            return 0
+        
+        stored = 0
+        model = self.embedder.cache_key
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            existing = self.db_client.get_knowledge_hashes([digest for digest, _ in batch])
+            batch = [(digest, item) for digest, item in batch if digest not in existing]
+            if not batch:
+                continue
+            
+            missing = [
+                (digest, item["content"]) for digest, item in batch
+                if not self.cache.contains(model, digest)
+            ]
+            if missing:
+                vectors = self.embedder.embed([content for _, content in missing])
+                self.cache.put_embeddings(model, {digest: vector for (digest, _), vector in zip(missing, vectors)})
+            
+            now = datetime.utcnow().isoformat()
+            rows = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "content": item["content"],
+                    "embedding": self.cache.get(model, digest),
+                    "metadata": item["metadata"],
+                    "created_at": now
+                }
+                for digest, item in batch
+            ]
+            self.db_client.store_knowledge_batch(rows)
+            stored += len(rows)
+        
+        logger.info(f"Ingested {stored} new knowledge chunks")
+        return stored
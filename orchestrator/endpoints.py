@@ -0,0 +1,346 @@
+"""
+Pool of OpenAI-compatible endpoints with load balancing and health tracking.
+"""
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from openai import OpenAI, AzureOpenAI
+from config import Config
+from rate_limiter import get_rate_limiter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an OpenAI rate-limit reset header ("1s", "6m0s", "20ms") into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        amount = float(amount)
+        total += {"ms": amount / 1000, "s": amount, "m": amount * 60, "h": amount * 3600}[unit]
+    return total
+
+
+class Endpoint:
+    """A single OpenAI-compatible endpoint: an API key/org, an Azure resource or a self-hosted server."""
+    
+    def __init__(
+        self,
+        name: str,
+        api_key: str = "",
+        base_url: Optional[str] = None,
+        organization: Optional[str] = None,
+        weight: float = 1.0,
+        models: Optional[List[str]] = None,
+        azure_endpoint: Optional[str] = None,
+        api_version: Optional[str] = None,
+        deployments: Optional[Dict[str, str]] = None,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None
+    ):
+        """
+        Args:
+            name: Unique endpoint name used in logs and status output
+            api_key: API key for the endpoint
+            base_url: Base URL for self-hosted or proxy servers
+            organization: Optional OpenAI organization
+            weight: Relative capacity used for balancing
+            models: Models served by this endpoint (None means any)
+            azure_endpoint: Azure OpenAI resource URL; enables Azure mode
+            api_version: Azure API version
+            deployments: Azure model -> deployment name mapping
+            rpm_limit: Requests-per-minute limit of the key, if known
+            tpm_limit: Tokens-per-minute limit of the key, if known
+        """
+        self.name = name
+        self.weight = max(weight, 0.01)
+        self.models = models
+        self.deployments = deployments or {}
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        
+        if azure_endpoint:
+            self.client = AzureOpenAI(
+                api_key=api_key,
+                azure_endpoint=azure_endpoint,
+                api_version=api_version or "2024-06-01"
+            )
+        else:
+            self.client = OpenAI(api_key=api_key, base_url=base_url, organization=organization)
+        
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.rate_limited_until = 0.0
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+    
+    def serves(self, model: str) -> bool:
+        """Whether this endpoint can serve a model."""
+        return self.models is None or model in self.models or model in self.deployments
+    
+    def deployment_for(self, model: str) -> str:
+        """Model (or Azure deployment) name to send for a requested model."""
+        return self.deployments.get(model, model)
+    
+    def is_available(self, now: float) -> bool:
+        """Whether the endpoint is healthy and not rate limited."""
+        return now >= self.unhealthy_until and now >= self.rate_limited_until
+    
+    def has_capacity(self, estimated_tokens: int, now: float) -> bool:
+        """Whether the last reported rate-limit budget can absorb a request."""
+        if self.remaining_requests is not None and self.remaining_requests <= 0 and now < self.requests_reset_at:
+            return False
+        if self.remaining_tokens is not None and self.remaining_tokens < estimated_tokens and now < self.tokens_reset_at:
+            return False
+        return True
+    
+    def update_rate_limits(self, headers: Any):
+        """Update rate-limit tracking from x-ratelimit-* response headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self.remaining_requests = int(remaining_requests)
+            self.requests_reset_at = now + (_parse_reset(headers.get("x-ratelimit-reset-requests")) or 0)
+        
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.remaining_tokens = int(remaining_tokens)
+            self.tokens_reset_at = now + (_parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0)
+        
+        limit_requests = headers.get("x-ratelimit-limit-requests")
+        if limit_requests is not None:
+            self.rpm_limit = int(limit_requests)
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        if limit_tokens is not None:
+            self.tpm_limit = int(limit_tokens)
+    
+    def mark_rate_limited(self, retry_after: Optional[float] = None):
+        """Take the endpoint out of rotation until its rate limit resets."""
+        delay = retry_after or max(self.tokens_reset_at, self.requests_reset_at) - time.monotonic()
+        delay = delay if delay and delay > 0 else Config.LLM_ENDPOINT_COOLDOWN
+        self.rate_limited_until = time.monotonic() + delay
+        logger.warning(f"Endpoint {self.name} rate limited for {delay:.1f}s")
+    
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= Config.LLM_ENDPOINT_FAILURE_THRESHOLD:
+            self.unhealthy_until = time.monotonic() + Config.LLM_ENDPOINT_COOLDOWN
+            logger.warning(
+                f"Endpoint {self.name} marked unhealthy after "
+                f"{self.consecutive_failures} consecutive failures"
+            )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Status snapshot for logging or API responses."""
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "healthy": now >= self.unhealthy_until,
+            "rate_limited": now < self.rate_limited_until,
+            "consecutive_failures": self.consecutive_failures,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "rpm_limit": self.rpm_limit,
+            "tpm_limit": self.tpm_limit
+        }
+
+
+class EndpointPool:
+    """Weighted least-outstanding-requests balancing across endpoints."""
+    
+    def __init__(self, endpoints: List[Endpoint]):
+        if not endpoints:
+            raise ValueError("EndpointPool requires at least one endpoint")
+        self.endpoints = endpoints
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+    
+    @classmethod
+    def from_config(cls) -> "EndpointPool":
+        """
+        Build a pool from LLM_ENDPOINTS, falling back to a single OpenAI endpoint
+        using OPENAI_API_KEY.
+        """
+        if not Config.LLM_ENDPOINTS:
+            return cls([Endpoint(name="openai", api_key=Config.OPENAI_API_KEY)])
+        
+        endpoints = []
+        for index, spec in enumerate(Config.LLM_ENDPOINTS):
+            spec = dict(spec)
+            endpoints.append(Endpoint(name=spec.pop("name", f"endpoint-{index}"), **spec))
+        return cls(endpoints)
+    
+    def acquire(self, model: str, estimated_tokens: int = 0, exclude: Optional[List[str]] = None) -> Endpoint:
+        """
+        Pick an endpoint for a request and count it as outstanding.
+        
+        Endpoints that serve the model, are healthy, not rate limited and have
+        reported budget for the request are preferred; among those the one with
+        the lowest (outstanding + 1) / weight wins.
+        
+        Args:
+            model: Requested model
+            estimated_tokens: Estimated prompt + completion tokens
+            exclude: Endpoint names already tried for this request
+        
+        Returns:
+            Selected endpoint
+        """
+        exclude = exclude or []
+        now = time.monotonic()
+        
+        with self._lock:
+            serving = [e for e in self.endpoints if e.serves(model) and e.name not in exclude]
+            if not serving:
+                raise ValueError(f"No endpoint available for model {model}")
+            
+            available = [e for e in serving if e.is_available(now)]
+            with_capacity = [e for e in available if e.has_capacity(estimated_tokens, now)]
+            candidates = with_capacity or available
+            if not candidates:
+                # Everything is down or limited; use whichever recovers first
+                candidates = [min(serving, key=lambda e: max(e.unhealthy_until, e.rate_limited_until))]
+            
+            endpoint = min(candidates, key=lambda e: (e.outstanding + 1) / e.weight)
+            endpoint.outstanding += 1
+            return endpoint
+    
+    def release(self, endpoint: Endpoint):
+        """Stop counting a request as outstanding on an endpoint."""
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+    
+    def chat_completion(self, kwargs: Dict[str, Any], estimated_tokens: int = 0):
+        """
+        Send a chat completion through the pool, failing over between endpoints.
+        
+        Args:
+            kwargs: Arguments for chat.completions.create
+            estimated_tokens: Estimated prompt + completion tokens
+        
+        Returns:
+            Parsed OpenAI ChatCompletion response
+        """
+        model = kwargs["model"]
+        tried: List[str] = []
+        last_error: Optional[Exception] = None
+        
+        for _ in range(len(self.endpoints)):
+            try:
+                endpoint = self.acquire(model, estimated_tokens, exclude=tried)
+            except ValueError:
+                break
+            tried.append(endpoint.name)
+            limiter = get_rate_limiter(endpoint.name, endpoint.rpm_limit, endpoint.tpm_limit)
+            
+            try:
+                # Wait for this endpoint's RPM/TPM budget before sending
+                limiter.acquire(estimated_tokens)
+                raw = endpoint.client.chat.completions.with_raw_response.create(
+                    **{**kwargs, "model": endpoint.deployment_for(model)}
+                )
+                endpoint.update_rate_limits(raw.headers)
+                limiter.update_limits(endpoint.rpm_limit, endpoint.tpm_limit)
+                endpoint.record_success()
+                response = raw.parse()
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    limiter.reconcile(estimated_tokens, usage.total_tokens)
+                return response
+            
+            except Exception as e:
+                last_error = e
+                status = getattr(e, "status_code", None)
+                response = getattr(e, "response", None)
+                headers = getattr(response, "headers", None)
+                endpoint.update_rate_limits(headers)
+                
+                if status == 429:
+                    retry_after = headers.get("retry-after") if headers else None
+                    endpoint.mark_rate_limited(float(retry_after) if retry_after else None)
+                    limiter.pause(endpoint.rate_limited_until - time.monotonic())
+                elif status is not None and status < 500:
+                    # Client errors are not the endpoint's fault; don't fail over
+                    raise
+                else:
+                    endpoint.record_failure()
+                logger.warning(f"Endpoint {endpoint.name} failed: {e}")
+            
+            finally:
+                self.release(endpoint)
+        
+        raise last_error or ValueError(f"No endpoint available for model {model}")
+    
+    def check_health(self) -> Dict[str, bool]:
+        """
+        Actively probe every endpoint with a models listing.
+        
+        Returns:
+            Dict of endpoint name -> healthy
+        """
+        results = {}
+        for endpoint in self.endpoints:
+            try:
+                endpoint.client.models.list()
+                endpoint.record_success()
+                results[endpoint.name] = True
+            except Exception as e:
+                logger.warning(f"Health check failed for endpoint {endpoint.name}: {e}")
+                endpoint.record_failure()
+                results[endpoint.name] = False
+        return results
+    
+    def start_health_checks(self, interval: Optional[float] = None):
+        """Run check_health periodically in a daemon thread."""
+        interval = interval if interval is not None else Config.LLM_HEALTH_CHECK_INTERVAL
+        if interval <= 0 or self._health_thread is not None:
+            return
+        
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.check_health()
+        
+        self._health_thread = threading.Thread(target=loop, name="llm-endpoint-health", daemon=True)
+        self._health_thread.start()
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """Status snapshot of every endpoint."""
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
+
+
+_pool: Optional[EndpointPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_endpoint_pool() -> EndpointPool:
+    """Get the process-wide endpoint pool, creating it from config on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EndpointPool.from_config()
+            _pool.start_health_checks()
+        return _pool
@@ -0,0 +1,152 @@
+"""
+Tolerant JSON parsing for model-generated tool call arguments.
+"""
+import json
+import re
+from typing import Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*(?:```\s*)?$", re.DOTALL)
+
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _strip_fences(text: str) -> str:
+    """Remove a surrounding markdown code fence."""
+    match = _FENCE_RE.match(text)
+    return match.group(1) if match else text
+
+
+def _escape_control_chars(text: str) -> str:
+    """Escape raw newlines, carriage returns and tabs inside string literals."""
+    out = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char in _ESCAPES:
+                out.append(_ESCAPES[char])
+                continue
+            elif ord(char) < 0x20:
+                out.append(f"\\u{ord(char):04x}")
+                continue
+        elif char == '"':
+            in_string = True
+        out.append(char)
+    return "".join(out)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """Drop commas that directly precede a closing bracket, outside strings."""
+    out = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            # Walk back over whitespace to a dangling comma
+            index = len(out) - 1
+            while index >= 0 and out[index].isspace():
+                index -= 1
+            if index >= 0 and out[index] == ",":
+                del out[index]
+        out.append(char)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """Close an unterminated string and any open objects or arrays."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    
+    if in_string:
+        if escaped:
+            text = text[:-1]
+        text += '"'
+    
+    if not stack:
+        return text
+    
+    text = text.rstrip()
+    # A dangling comma, or a key without a value, can't be completed sensibly
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text = re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:$', "", text)
+    
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str, allow_truncated: bool = True) -> Any:
+    """
+    Parse JSON, repairing common defects in model output.
+    
+    Handles markdown code fences, unescaped control characters (raw newlines
+    and tabs) inside strings, trailing commas, and output truncated in the
+    middle of a string, object or array.
+    
+    Args:
+        text: JSON text, possibly malformed
+        allow_truncated: Whether to close truncated output; disable when the
+            truncation means content was lost (e.g. finish_reason == "length")
+    
+    Returns:
+        Parsed value
+    
+    Raises:
+        ValueError: If the text cannot be repaired
+    """
+    if text is None or not text.strip():
+        return {}
+    
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    
+    steps = [_escape_control_chars, _remove_trailing_commas]
+    if allow_truncated:
+        steps += [_close_truncated, _remove_trailing_commas]
+    
+    candidate = _strip_fences(text.strip())
+    for step in steps:
+        candidate = step(candidate)
+        try:
+            value = json.loads(candidate)
+            logger.info("Repaired malformed JSON tool arguments")
+            return value
+        except json.JSONDecodeError:
+            continue
+    
+    raise ValueError(f"Could not repair JSON: {text[:200]}")
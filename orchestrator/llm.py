@@ -1,40 +1,176 @@
 """
 LLM integration and model router for Morgus.
 """
+import hashlib
 import json
-from typing import Any, Dict, List, Optional, Union
-from openai import OpenAI
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 from config import Config
+from cassette import get_llm_backend
+from json_repair import repair_json
+from singleflight import SingleFlight
+from model_stats import get_stats_tracker, estimate_cost, get_context_window
+from tokens import estimate_prompt_tokens
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Follow-up turn used to resume text output cut off by max_tokens
+CONTINUE_PROMPT = "Your previous reply was cut off. Continue exactly where you stopped, without repeating anything."
+
+# Shared by every router so identical requests from concurrent tasks coalesce
+_single_flight = SingleFlight()
+
 
 class ModelRouter:
     """Routes LLM requests to appropriate models based on task type."""
     
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        # Endpoint pool, or a cassette recorder/player (LLM_BACKEND)
+        self.pool = get_llm_backend()
         self.default_model = Config.DEFAULT_MODEL
         self.code_model = Config.CODE_MODEL
+        self.stats = get_stats_tracker()
+        # USD spent per (phase, model) since the phase last reported its outcome
+        self._phase_costs: Dict[str, Dict[str, float]] = {}
+        # Called with a usage record for every upstream request this router makes
+        self.usage_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    
+    def _preferred_model(self, phase: str) -> str:
+        """Static phase rule used as the baseline and when no statistics exist."""
+        # For BUILD phase with heavy coding, use specialized model if available
+        if phase == "BUILD" and self.code_model != self.default_model:
+            return self.code_model
+        
+        # Default to general model for all other phases
+        return self.default_model
+    
+    def get_candidate_models(self, phase: str) -> List[str]:
+        """Get the models the router may choose from for a phase."""
+        candidates = Config.ROUTING_PHASE_MODELS.get(phase) or Config.ROUTING_MODELS
+        preferred = self._preferred_model(phase)
+        candidates = list(candidates) if candidates else [preferred]
+        if preferred not in candidates:
+            candidates.insert(0, preferred)
+        return candidates
     
-    def select_model(self, phase: str, task_type: Optional[str] = None) -> str:
+    def select_model(
+        self,
+        phase: str,
+        task_type: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
         """
-        Select appropriate model based on phase and task type.
+        Select appropriate model based on phase, request size and live statistics.
+        
+        Candidates that cannot fit the request in their context window or that
+        are degraded (error rate or p95 latency over the configured objectives)
+        are skipped. The rest are scored on predicted latency and cost using the
+        configured weights; without enough samples the static phase rule wins.
         
         Args:
             phase: Current task phase (RESEARCH, PLAN, BUILD, EXECUTE, FINALIZE)
             task_type: Optional task type hint
-            
+            prompt_tokens: Estimated prompt size of the request
+            max_tokens: Requested completion budget
+        
         Returns:
             Model identifier string
         """
-        # For BUILD phase with heavy coding, use specialized model if available
-        if phase == "BUILD" and self.code_model != self.default_model:
-            return self.code_model
+        preferred = self._preferred_model(phase)
+        candidates = self.get_candidate_models(phase)
+        prompt_tokens = prompt_tokens or 0
+        max_tokens = max_tokens or Config.MAX_TOKENS
         
-        # Default to general model for all other phases
-        return self.default_model
+        # Drop models whose context window cannot hold the request
+        fitting = []
+        for model in candidates:
+            window = get_context_window(model)
+            if window is None or prompt_tokens + max_tokens <= window:
+                fitting.append(model)
+        candidates = fitting or candidates
+        
+        healthy = [m for m in candidates if not self.stats.get(m).is_degraded()]
+        if not healthy:
+            # Everything is degraded; pick the least failing model
+            best = min(candidates, key=lambda m: self.stats.get(m).error_rate)
+            logger.warning(f"All candidate models degraded for {phase}, using {best}")
+            return best
+        
+        if preferred in healthy and len(healthy) == 1:
+            return preferred
+        
+        scored = []
+        for model in healthy:
+            stats = self.stats.get(model)
+            if stats.samples < Config.ROUTING_MIN_SAMPLES:
+                continue
+            # Expected output length from the model's own history
+            typical = min(stats.typical_completion_tokens(), max_tokens)
+            latency = stats.predict_latency(typical)
+            # Cost of this request, inflated by how often the phase fails on this model
+            cost = estimate_cost(model, prompt_tokens, typical) / max(stats.phase_success_rate(phase), 0.1)
+            scored.append((model, latency, cost))
+        
+        if not scored:
+            return preferred if preferred in healthy else healthy[0]
+        
+        max_latency = max((s[1] or 0) for s in scored) or 1.0
+        max_cost = max(s[2] for s in scored) or 1.0
+        
+        def score(entry):
+            model, latency, cost = entry
+            value = (
+                Config.ROUTING_LATENCY_WEIGHT * ((latency or max_latency) / max_latency)
+                + Config.ROUTING_COST_WEIGHT * (cost / max_cost)
+            )
+            # Tie-break towards the static rule
+            return (value, model != preferred)
+        
+        selected = min(scored, key=score)[0]
+        if selected != preferred:
+            logger.info(f"Routing {phase} request to {selected} instead of {preferred}")
+        return selected
+    
+    def suggest_max_tokens(self, phase: str, tool_names: Optional[List[str]] = None) -> int:
+        """
+        Pick a max_tokens budget from observed output lengths.
+        
+        Uses the p95 completion length for the phase, and for the tools the
+        model is currently working with (e.g. file_write in BUILD), plus
+        headroom. Falls back to Config.MAX_TOKENS until enough samples exist.
+        
+        Args:
+            phase: Current task phase
+            tool_names: Tools called on the previous turn, if any
+        
+        Returns:
+            max_tokens for the next request
+        """
+        if not Config.ADAPTIVE_MAX_TOKENS:
+            return Config.MAX_TOKENS
+        
+        observed = [self.stats.output_percentile(phase=phase, percentile=95)]
+        for name in tool_names or []:
+            observed.append(self.stats.output_percentile(tool=name, percentile=95))
+        observed = [value for value in observed if value is not None]
+        if not observed:
+            return Config.MAX_TOKENS
+        
+        budget = int(max(observed) * Config.MAX_TOKENS_HEADROOM)
+        return max(Config.MIN_MAX_TOKENS, min(budget, Config.MAX_OUTPUT_TOKENS))
+    
+    def record_phase_outcome(self, phase: str, success: bool):
+        """
+        Attribute the cost accumulated during a phase to the models that served it.
+        
+        Args:
+            phase: Phase that just finished
+            success: Whether the phase completed successfully
+        """
+        for model, cost in self._phase_costs.pop(phase, {}).items():
+            self.stats.record_phase(model, phase, cost, success)
     
     def chat_completion(
         self,
@@ -43,11 +179,17 @@ class ModelRouter:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         tools: Optional[List[Dict]] = None,
-        tool_choice: Optional[Union[str, Dict]] = None
+        tool_choice: Optional[Union[str, Dict]] = None,
+        phase: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Make a chat completion request.
         
+        Responses cut off by max_tokens are continued automatically: text is
+        resumed with a follow-up turn, while truncated tool calls or JSON are
+        re-requested with a doubled budget (up to MAX_OUTPUT_TOKENS).
+        
         Args:
             messages: List of message dicts with 'role' and 'content'
             model: Model to use (defaults to default_model)
@@ -55,13 +197,84 @@ class ModelRouter:
             max_tokens: Maximum tokens to generate
             tools: Optional list of tool definitions
             tool_choice: Optional tool choice strategy
-            
+            phase: Optional phase the request belongs to, for cost attribution
+            response_format: Optional structured-output format (json_object/json_schema)
+        
         Returns:
             Response dict from OpenAI API
         """
         model = model or self.default_model
-        temperature = temperature if temperature is not None else Config.TEMPERATURE
         max_tokens = max_tokens or Config.MAX_TOKENS
+        request = {
+            "model": model,
+            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "phase": phase,
+            "response_format": response_format
+        }
+        
+        response = self._send_completion(messages, max_tokens=max_tokens, **request)
+        
+        # Continue output that was cut off by max_tokens instead of failing
+        continuations = 0
+        while (
+            response["finish_reason"] == "length"
+            and Config.AUTO_CONTINUE
+            and continuations < Config.MAX_CONTINUATIONS
+        ):
+            continuations += 1
+            
+            if response.get("tool_calls") or response_format:
+                # Partial tool arguments or JSON can't be resumed mid-value;
+                # re-issue with a larger budget instead
+                ceiling = Config.MAX_OUTPUT_TOKENS
+                window = get_context_window(model)
+                if window:
+                    ceiling = min(ceiling, window - estimate_prompt_tokens(messages, tools, model))
+                if max_tokens >= ceiling:
+                    break
+                max_tokens = min(max_tokens * 2, ceiling)
+                logger.info(f"Output truncated, retrying with max_tokens={max_tokens}")
+                response = self._send_completion(messages, max_tokens=max_tokens, **request)
+                continue
+            
+            logger.info(f"Output truncated, requesting continuation {continuations}")
+            partial = response
+            continued = self._send_completion(
+                messages + [
+                    {"role": "assistant", "content": partial["content"] or ""},
+                    {"role": "user", "content": CONTINUE_PROMPT}
+                ],
+                max_tokens=max_tokens,
+                **request
+            )
+            response = {
+                **continued,
+                "content": (partial["content"] or "") + (continued["content"] or ""),
+                "latency": partial["latency"] + continued["latency"],
+                "usage": {
+                    key: partial["usage"][key] + continued["usage"][key]
+                    for key in partial["usage"]
+                }
+            }
+        
+        response["continuations"] = continuations
+        return response
+    
+    def _send_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        temperature: Optional[float] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[Union[str, Dict]] = None,
+        phase: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Send a single chat completion request and record its statistics."""
+        temperature = temperature if temperature is not None else Config.TEMPERATURE
         
         try:
             kwargs = {
@@ -76,23 +289,281 @@ class ModelRouter:
                 if tool_choice:
                     kwargs["tool_choice"] = tool_choice
             
-            response = self.client.chat.completions.create(**kwargs)
+            if response_format:
+                kwargs["response_format"] = response_format
             
-            return {
-                "content": response.choices[0].message.content,
-                "tool_calls": getattr(response.choices[0].message, "tool_calls", None),
-                "finish_reason": response.choices[0].finish_reason,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
+            def send():
+                return self.pool.chat_completion(
+                    kwargs,
+                    estimated_tokens=estimate_prompt_tokens(messages, tools, model) + max_tokens
+                )
+            
+            started = time.monotonic()
+            key = self._single_flight_key(kwargs)
+            if key:
+                response, coalesced = _single_flight.do(key, send)
+            else:
+                response, coalesced = send(), False
+            latency = time.monotonic() - started
+            
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+                "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
             }
+            
+            # Only the caller that made the upstream request pays for it
+            if coalesced:
+                logger.info(f"Coalesced identical in-flight request to {model}")
+                return self._build_response(response, model, latency, usage, coalesced=True)
+            
+            result = self._build_response(response, model, latency, usage)
+            
+            self.stats.record_request(model, latency, usage["completion_tokens"], success=True)
+            cost = estimate_cost(model, usage["prompt_tokens"], usage["completion_tokens"])
+            if self.usage_callback:
+                try:
+                    self.usage_callback({
+                        "model": model,
+                        "phase": phase,
+                        "prompt_tokens": usage["prompt_tokens"],
+                        "completion_tokens": usage["completion_tokens"],
+                        "cached_tokens": usage["cached_tokens"],
+                        "total_tokens": usage["total_tokens"],
+                        "latency_ms": int(latency * 1000),
+                        "finish_reason": result["finish_reason"],
+                        "cost_usd": cost
+                    })
+                except Exception as e:
+                    logger.error(f"Usage callback failed: {e}")
+            if phase:
+                phase_costs = self._phase_costs.setdefault(phase, {})
+                phase_costs[model] = phase_costs.get(model, 0.0) + cost
+                self.stats.record_output(
+                    phase,
+                    usage["completion_tokens"],
+                    [call["function"]["name"] for call in result["tool_calls"] or []]
+                )
+            
+            return result
         
         except Exception as e:
+            self.stats.record_request(model, 0.0, success=False)
             logger.error(f"LLM request failed: {str(e)}")
             raise
 
+    def _single_flight_key(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        """
+        Identity of a request for single-flight coalescing.
+        
+        Only deterministic requests (temperature at or below
+        SINGLE_FLIGHT_MAX_TEMPERATURE) are coalesced; sampling requests are
+        expected to differ, so sharing one answer would change behaviour.
+        """
+        if not Config.SINGLE_FLIGHT_ENABLED:
+            return None
+        if kwargs.get("temperature", Config.TEMPERATURE) > Config.SINGLE_FLIGHT_MAX_TEMPERATURE:
+            return None
+        payload = json.dumps(kwargs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _build_response(
+        self,
+        response: Any,
+        model: str,
+        latency: float,
+        usage: Dict[str, int],
+        coalesced: bool = False
+    ) -> Dict[str, Any]:
+        """Convert an OpenAI response into the router's response dict."""
+        message = response.choices[0].message
+        # Plain dicts, so tool calls can be replayed into the conversation history
+        tool_calls = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {
+                    "name": call.function.name,
+                    "arguments": call.function.arguments
+                }
+            }
+            for call in (getattr(message, "tool_calls", None) or [])
+        ]
+        return {
+            "content": message.content,
+            "tool_calls": tool_calls or None,
+            "finish_reason": response.choices[0].finish_reason,
+            "model": model,
+            "latency": latency,
+            "usage": usage,
+            "coalesced": coalesced
+        }
+
+    def should_cascade(self, phase: str) -> bool:
+        """Whether requests in a phase go to the cheap cascade model first."""
+        return bool(Config.CASCADE_MODEL) and phase in Config.CASCADE_PHASES
+    
+    def check_escalation(
+        self,
+        response: Dict[str, Any],
+        tools: Optional[List[Dict]] = None
+    ) -> Optional[str]:
+        """
+        Decide whether a cheap-model response must be retried on a stronger model.
+        
+        Args:
+            response: Response dict from chat_completion
+            tools: Tool schemas that were offered with the request
+        
+        Returns:
+            Escalation reason, or None if the response is acceptable
+        """
+        tool_schemas = {
+            schema["function"]["name"]: schema["function"].get("parameters", {})
+            for schema in (tools or [])
+        }
+        
+        for call in response.get("tool_calls") or []:
+            name = call["function"]["name"]
+            if name not in tool_schemas:
+                return "invalid_tool_call"
+            try:
+                arguments = repair_json(
+                    call["function"]["arguments"],
+                    allow_truncated=response.get("finish_reason") != "length"
+                )
+            except ValueError:
+                return "parse_failure"
+            if not isinstance(arguments, dict):
+                return "parse_failure"
+            required = tool_schemas[name].get("required", [])
+            if any(arg not in arguments for arg in required):
+                return "invalid_tool_call"
+        
+        content = (response.get("content") or "").lower()
+        if not content and not response.get("tool_calls"):
+            return "empty_response"
+        if any(marker in content for marker in Config.CASCADE_LOW_CONFIDENCE_MARKERS):
+            return "low_confidence"
+        
+        return None
+    
+    def cascade_completion(
+        self,
+        messages: List[Dict[str, str]],
+        phase: str,
+        model: Optional[str] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[Union[str, Dict]] = None,
+        max_tokens: Optional[int] = None,
+        escalate: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Try the cheap cascade model first and escalate to the stronger model on failure.
+        
+        Args:
+            messages: Chat messages
+            phase: Current task phase
+            model: Stronger model to escalate to (defaults to select_model)
+            tools: Optional list of tool definitions
+            tool_choice: Optional tool choice strategy
+            max_tokens: Maximum tokens to generate
+            escalate: Skip the cheap model (e.g. the caller detected stagnation)
+        
+        Returns:
+            Response dict, with 'escalated' and 'escalation_reason' set
+        """
+        strong_model = model or self.select_model(phase, max_tokens=max_tokens)
+        cheap_model = Config.CASCADE_MODEL
+        
+        if cheap_model == strong_model:
+            return self.chat_completion(
+                messages=messages, model=strong_model, max_tokens=max_tokens,
+                tools=tools, tool_choice=tool_choice, phase=phase
+            )
+        
+        reason = "stagnation" if escalate else None
+        if not reason:
+            try:
+                response = self.chat_completion(
+                    messages=messages, model=cheap_model, max_tokens=max_tokens,
+                    tools=tools, tool_choice=tool_choice, phase=phase
+                )
+                reason = self.check_escalation(response, tools)
+            except Exception:
+                reason = "error"
+            
+            if not reason:
+                self.stats.record_cascade(phase, escalated=False)
+                response["escalated"] = False
+                response["escalation_reason"] = None
+                return response
+        
+        logger.info(f"Escalating {phase} request from {cheap_model} to {strong_model}: {reason}")
+        self.stats.record_cascade(phase, escalated=True, reason=reason)
+        response = self.chat_completion(
+            messages=messages, model=strong_model, max_tokens=max_tokens,
+            tools=tools, tool_choice=tool_choice, phase=phase
+        )
+        response["escalated"] = True
+        response["escalation_reason"] = reason
+        return response
+    
+    
+    def complete_json(
+        self,
+        instructions: str,
+        content: str,
+        schema: Optional[Dict[str, Any]] = None,
+        name: str = "result",
+        model: Optional[str] = None
+    ) -> Any:
+        """
+        Ask a model for a JSON value in strict structured-output mode.
+        
+        Uses JSON-schema mode when a schema is given and falls back to plain
+        JSON mode for models that reject it.
+        
+        Args:
+            instructions: System instructions describing the expected value
+            content: Input to convert
+            schema: Optional JSON schema the value must follow
+            name: Schema name
+            model: Model to use (defaults to CASCADE_MODEL or default_model)
+        
+        Returns:
+            Parsed JSON value
+        
+        Raises:
+            ValueError: If no valid JSON was produced
+        """
+        model = model or Config.CASCADE_MODEL or self.default_model
+        messages = [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": content}
+        ]
+        formats = [{"type": "json_object"}]
+        if schema:
+            formats.insert(0, {"type": "json_schema", "json_schema": {"name": name, "schema": schema}})
+        
+        last_error: Optional[Exception] = None
+        for response_format in formats:
+            try:
+                response = self.chat_completion(
+                    messages=messages,
+                    model=model,
+                    temperature=0,
+                    response_format=response_format
+                )
+                return json.loads(response["content"] or "")
+            except Exception as e:
+                last_error = e
+                continue
+        
+        raise ValueError(f"Structured output failed: {last_error}")
+
 
 class LLMOrchestrator:
     """Main LLM orchestrator for Morgus agent."""
@@ -100,6 +571,8 @@ class LLMOrchestrator:
     def __init__(self):
         self.router = ModelRouter()
         self.conversation_history: List[Dict[str, str]] = []
+        # Tools called on the previous turn, used to size the next max_tokens
+        self.last_tool_names: List[str] = []
         self.system_prompt = self._build_system_prompt()
     
     def _build_system_prompt(self) -> str:
@@ -134,7 +607,8 @@ Available tools:
 - git_commit(message): Commit changes
 - git_push(remote, branch): Push to remote
 - search_web(query): Search the web for information
-- fetch_url(url): Fetch and parse a webpage
+- fetch_url(url, question): Fetch and parse a webpage (long pages may come back as a digest)
+- read_page(handle, offset): Read the full text of a digested page
 - cloudflare_deploy(project_path): Deploy to Cloudflare Pages
 - notify_user(message): Send a progress update to the user
 - ask_user(question, options): Ask the user for input
@@ -155,10 +629,11 @@ Best practices:
 - Clean up temporary files and resources
 
 When you receive a task, analyze it carefully, devise a plan, and execute it autonomously. Use tools as needed and provide clear updates on your progress."""
-    
+
     def reset_conversation(self):
         """Reset conversation history."""
         self.conversation_history = []
+        self.last_tool_names = []
     
     def add_message(self, role: str, content: str):
         """Add a message to conversation history."""
@@ -169,7 +644,8 @@ When you receive a task, analyze it carefully, devise a plan, and execute it aut
         user_message: str,
         phase: str,
         tools: Optional[List[Dict]] = None,
-        include_history: bool = True
+        include_history: bool = True,
+        escalate: bool = False
     ) -> Dict[str, Any]:
         """
         Get a completion from the LLM.
@@ -179,7 +655,8 @@ When you receive a task, analyze it carefully, devise a plan, and execute it aut
             phase: Current task phase
             tools: Optional list of available tools
             include_history: Whether to include conversation history
-            
+            escalate: Skip the cheap cascade model for this turn
+        
         Returns:
             Response dict from the model
         """
@@ -191,52 +668,148 @@ When you receive a task, analyze it carefully, devise a plan, and execute it aut
         
         messages.append({"role": "user", "content": user_message})
         
-        # Select appropriate model
-        model = self.router.select_model(phase)
+        # Size the output budget from what this phase and these tools usually need
+        max_tokens = self.router.suggest_max_tokens(phase, self.last_tool_names)
         
-        # Get completion
-        response = self.router.chat_completion(
-            messages=messages,
-            model=model,
-            tools=tools,
-            tool_choice="auto" if tools else None
+        # Select appropriate model for this phase and request size
+        model = self.router.select_model(
+            phase,
+            prompt_tokens=estimate_prompt_tokens(messages, tools),
+            max_tokens=max_tokens
         )
         
-        # Update history
+        # Get completion, through the cheap-model cascade where configured
+        if self.router.should_cascade(phase):
+            response = self.router.cascade_completion(
+                messages=messages,
+                phase=phase,
+                model=model,
+                tools=tools,
+                tool_choice="auto" if tools else None,
+                max_tokens=max_tokens,
+                escalate=escalate
+            )
+        else:
+            response = self.router.chat_completion(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                tools=tools,
+                tool_choice="auto" if tools else None,
+                phase=phase
+            )
+        
+        # Update history; tool calls must be recorded so tool results can follow them
         self.add_message("user", user_message)
-        if response["content"]:
+        if response.get("tool_calls"):
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": response["content"],
+                "tool_calls": response["tool_calls"]
+            })
+        elif response["content"]:
             self.add_message("assistant", response["content"])
+        self.last_tool_names = [call["function"]["name"] for call in response.get("tool_calls") or []]
         
         return response
     
-    def parse_tool_calls(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def parse_tool_calls(
+        self,
+        response: Dict[str, Any],
+        tools: Optional[List[Dict]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Parse tool calls from LLM response.
         
+        Malformed arguments are repaired locally where possible, then re-derived
+        in structured-output mode against the tool's schema. Calls that still
+        cannot be parsed are returned with an 'error' so the caller can send it
+        back to the model as the tool result instead of dropping the call.
+        
         Args:
             response: Response dict from get_completion
-            
+            tools: Tool schemas offered with the request; calls to other tools
+                are returned with an 'error'
+        
         Returns:
-            List of tool call dicts with 'name' and 'arguments'
+            List of tool call dicts with 'id', 'name', 'arguments' and,
+            for unusable calls, 'error'
         """
         tool_calls = response.get("tool_calls")
         if not tool_calls:
             return []
         
+        schemas = {
+            schema["function"]["name"]: schema["function"].get("parameters")
+            for schema in (tools or [])
+        }
+        truncated = response.get("finish_reason") == "length"
+        
         parsed_calls = []
         for call in tool_calls:
-            try:
-                parsed_calls.append({
-                    "id": call.id,
-                    "name": call.function.name,
-                    "arguments": json.loads(call.function.arguments)
-                })
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse tool arguments: {e}")
+            name = call["function"]["name"]
+            raw_arguments = call["function"]["arguments"]
+            parsed = {"id": call["id"], "name": name, "arguments": {}}
+            
+            # Tools left out of this phase's subset are refused, not executed
+            if tools is not None and name not in schemas:
+                parsed["error"] = (
+                    f"Error: tool {name} is not available in this phase. "
+                    f"Available tools: {', '.join(schemas) or 'none'}."
+                )
+                parsed_calls.append(parsed)
                 continue
+            
+            try:
+                parsed["arguments"] = repair_json(raw_arguments, allow_truncated=not truncated)
+            except ValueError as e:
+                logger.warning(f"Failed to parse arguments for {name}: {e}")
+                if truncated:
+                    parsed["error"] = (
+                        f"Error: the arguments for {name} were cut off because the response hit the "
+                        "output token limit. Retry with smaller content, e.g. split a large file "
+                        "into several smaller files."
+                    )
+                else:
+                    parsed["arguments"] = self._structured_arguments(name, raw_arguments, schemas.get(name))
+                    if parsed["arguments"] is None:
+                        parsed["error"] = (
+                            f"Error: the arguments for {name} were not valid JSON and could not be "
+                            f"repaired ({e}). Call the tool again with a valid JSON object."
+                        )
+            
+            if "error" not in parsed and not isinstance(parsed["arguments"], dict):
+                parsed["error"] = f"Error: the arguments for {name} must be a JSON object."
+            
+            parsed_calls.append(parsed)
         
         return parsed_calls
     
+    def _structured_arguments(
+        self,
+        name: str,
+        raw_arguments: str,
+        schema: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Re-derive malformed tool arguments in structured-output mode."""
+        if not Config.TOOL_ARGS_STRUCTURED_REPAIR:
+            return None
+        try:
+            arguments = self.router.complete_json(
+                instructions=(
+                    f"Convert the malformed arguments of a `{name}` tool call into a valid JSON object. "
+                    "Preserve every value exactly; only fix the JSON syntax."
+                ),
+                content=raw_arguments,
+                schema=schema,
+                name=name
+            )
+            logger.info(f"Recovered arguments for {name} with structured output")
+            return arguments if isinstance(arguments, dict) else None
+        except ValueError as e:
+            logger.error(f"Structured repair failed for {name}: {e}")
+            return None
+    
     def add_tool_result(self, tool_call_id: str, result: str):
         """Add a tool execution result to conversation history."""
         self.conversation_history.append({
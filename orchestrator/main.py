@@ -6,7 +6,12 @@ import time
 from typing import Dict, Any, Optional
 from config import Config
 from llm import LLMOrchestrator
-from database import DatabaseClient
+from database import get_database_client
+from usage_ledger import UsageLedger
+from condenser import PageCondenser
+from step_writer import StepWriter
+from embeddings import KnowledgeIngester
+from step_archive import StepArchiver
 from sandbox import SandboxManager
 from tools import ToolRegistry, FileTools, ShellTools, GitTools, WebTools, DeployTools, UserTools
 
@@ -32,11 +37,18 @@ class TaskOrchestrator:
     
     def __init__(self):
         self.llm = LLMOrchestrator()
-        self.db = DatabaseClient()
+        self.db = get_database_client()
         self.sandbox_manager = SandboxManager()
         self.current_task_id: Optional[str] = None
         self.current_container = None
         self.tool_registry = ToolRegistry()
+        # Task steps are written behind the agent loop in batches
+        self.steps = StepWriter(self.db)
+        # Every LLM request made by this orchestrator lands in the usage ledger
+        self.usage_ledger = UsageLedger(self.db)
+        self.llm.router.usage_callback = self.usage_ledger.record
+        # Digests long fetched pages so their raw text stays out of the history
+        self.condenser = PageCondenser(self.llm.router) if Config.CONDENSE_FETCHED_PAGES else None
     
     def execute_task(self, task_id: str) -> bool:
         """
@@ -70,6 +82,8 @@ class TaskOrchestrator:
             
             # Reset LLM conversation
             self.llm.reset_conversation()
+            if self.condenser:
+                self.condenser.reset(f"{task['title']}\n{task['description']}")
             
             # Execute phases
             phases = [
@@ -85,6 +99,11 @@ class TaskOrchestrator:
                 self.db.update_task(task_id, {"phase": phase})
                 
                 success = self._execute_phase(task, phase)
+                self.llm.router.record_phase_outcome(phase, success)
+                if success and phase == TaskPhase.RESEARCH:
+                    self._ingest_research(task_id)
+                self.usage_ledger.flush()
+                self.steps.flush()
                 
                 if not success:
                     logger.error(f"Phase {phase} failed")
@@ -106,10 +125,30 @@ class TaskOrchestrator:
             return False
         
         finally:
+            self.usage_ledger.flush()
+            self.steps.flush()
+            
             # Cleanup sandbox
             if self.current_container:
                 self.sandbox_manager.cleanup_sandbox(self.current_container)
     
+    def _ingest_research(self, task_id: str):
+        """Add the pages read during research to the knowledge base."""
+        if not (Config.KNOWLEDGE_INGEST_RESEARCH and self.condenser and self.condenser.pages):
+            return
+        
+        try:
+            documents = [
+                {
+                    "content": text,
+                    "metadata": {"task_id": task_id, "source": self.condenser.sources.get(handle, handle)}
+                }
+                for handle, text in list(self.condenser.pages.items())
+            ]
+            KnowledgeIngester(self.db).ingest(documents)
+        except Exception as e:
+            logger.error(f"Failed to ingest research for task {task_id}: {e}")
+    
     def _register_tools(self):
         """Register all available tools."""
         # File tools
@@ -125,7 +164,7 @@ class TaskOrchestrator:
             self.tool_registry.register(tool)
         
         # Web tools
-        for tool in WebTools.create_tools():
+        for tool in WebTools.create_tools(self.condenser):
             self.tool_registry.register(tool)
         
         # Deploy tools
@@ -133,7 +172,7 @@ class TaskOrchestrator:
             self.tool_registry.register(tool)
         
         # User tools
-        for tool in UserTools.create_tools(self.db, self.current_task_id):
+        for tool in UserTools.create_tools(self.db, self.current_task_id, steps=self.steps):
             self.tool_registry.register(tool)
     
     def _execute_phase(self, task: Dict[str, Any], phase: str) -> bool:
@@ -151,7 +190,7 @@ class TaskOrchestrator:
         prompt = self._build_phase_prompt(task, phase)
         
         # Log phase start
-        self.db.add_task_step(
+        self.steps.add_task_step(
             task_id=self.current_task_id,
             phase=phase,
             step_type="PHASE_START",
@@ -161,21 +200,27 @@ class TaskOrchestrator:
         # Execute agent loop for this phase
         iteration = 0
         max_iterations = Config.MAX_ITERATIONS
+        # Consecutive turns that produced neither tool calls nor phase completion
+        stalled_turns = 0
+        last_content = None
         
         while iteration < max_iterations:
             iteration += 1
             logger.info(f"Phase {phase}, iteration {iteration}")
+            self.usage_ledger.set_context(self.current_task_id, phase, iteration)
             
-            # Get LLM response
+            # Get LLM response, skipping the cheap cascade model once the phase stalls
+            tools = self.tool_registry.get_schemas(phase)
             response = self.llm.get_completion(
                 user_message=prompt if iteration == 1 else "Continue with the task.",
                 phase=phase,
-                tools=self.tool_registry.get_all_schemas()
+                tools=tools,
+                escalate=stalled_turns >= Config.CASCADE_STAGNATION_TURNS
             )
             
             # Log LLM response
             if response.get("content"):
-                self.db.add_task_step(
+                self.steps.add_task_step(
                     task_id=self.current_task_id,
                     phase=phase,
                     step_type="LLM_RESPONSE",
@@ -183,13 +228,13 @@ class TaskOrchestrator:
                 )
             
             # Check for tool calls
-            tool_calls = self.llm.parse_tool_calls(response)
+            tool_calls = self.llm.parse_tool_calls(response, tools)
             
             if not tool_calls:
                 # No tool calls, check if phase is complete
                 if self._is_phase_complete(response, phase):
                     logger.info(f"Phase {phase} completed")
-                    self.db.add_task_step(
+                    self.steps.add_task_step(
                         task_id=self.current_task_id,
                         phase=phase,
                         step_type="PHASE_COMPLETE",
@@ -198,36 +243,68 @@ class TaskOrchestrator:
                     return True
                 
                 # Continue iteration
+                stalled_turns += 1
                 continue
             
+            # Repeating the same reply verbatim is also a stall
+            if response.get("content") and response.get("content") == last_content:
+                stalled_turns += 1
+            else:
+                stalled_turns = 0
+            last_content = response.get("content")
+            
             # Execute tool calls
+            runnable = []
             for tool_call in tool_calls:
                 tool_name = tool_call["name"]
                 tool_args = tool_call["arguments"]
                 
+                # Unusable arguments go back to the model as the tool's result
+                if tool_call.get("error"):
+                    self.steps.add_task_step(
+                        task_id=self.current_task_id,
+                        phase=phase,
+                        step_type="TOOL_ERROR",
+                        content=tool_call["error"],
+                        metadata={"tool": tool_name}
+                    )
+                    continue
+                
                 logger.info(f"Executing tool: {tool_name}")
                 
                 # Log tool call
-                self.db.add_task_step(
+                self.steps.add_task_step(
                     task_id=self.current_task_id,
                     phase=phase,
                     step_type="TOOL_CALL",
                     content=f"Tool: {tool_name}",
                     metadata={"arguments": tool_args}
                 )
+                runnable.append(tool_call)
+                
+            # Execute tools; independent read-only calls run concurrently
+            results = self.tool_registry.execute_tools(
+                [(tool_call["name"], tool_call["arguments"]) for tool_call in runnable]
+            )
+            results_by_id = {tool_call["id"]: result for tool_call, result in zip(runnable, results)}
+            
+            # Add results to LLM context in the order the calls were made
+            for tool_call in tool_calls:
+                if tool_call.get("error"):
+                    self.llm.add_tool_result(tool_call["id"], tool_call["error"])
+                    continue
                 
-                # Execute tool
-                result = self.tool_registry.execute_tool(tool_name, tool_args)
+                result = results_by_id[tool_call["id"]]
                 
                 # Log tool result
-                self.db.add_task_step(
+                self.steps.add_task_step(
                     task_id=self.current_task_id,
                     phase=phase,
                     step_type="TOOL_RESULT",
-                    content=result[:1000]  # Truncate for DB
+                    content=result,  # Oversized output goes to the blob store
+                    metadata={"tool": tool_call["name"]}
                 )
                 
-                # Add result to LLM context
                 self.llm.add_tool_result(tool_call["id"], result)
         
         # Max iterations reached
@@ -343,8 +420,10 @@ class OrchestratorService:
     """Service that polls for pending tasks and executes them."""
     
     def __init__(self):
-        self.db = DatabaseClient()
+        self.db = get_database_client()
         self.orchestrator = TaskOrchestrator()
+        self.archiver = StepArchiver(self.db) if Config.STEP_ARCHIVE_AFTER_DAYS > 0 else None
+        self._last_archive_run = 0.0
     
     def run(self):
         """Main service loop."""
@@ -362,6 +441,11 @@ class OrchestratorService:
                     # Execute task
                     self.orchestrator.execute_task(task_id)
                 
+                # Retention runs between polls, never during a task
+                if self.archiver and time.time() - self._last_archive_run >= Config.STEP_ARCHIVE_INTERVAL:
+                    self._last_archive_run = time.time()
+                    self.archiver.run()
+                
                 # Sleep before next poll
                 time.sleep(5)
             
@@ -0,0 +1,295 @@
+"""
+Rolling per-model performance statistics used by the model router.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# USD per 1K tokens as (prompt, completion)
+DEFAULT_PRICING: Dict[str, List[float]] = {
+    "gpt-4": [0.03, 0.06],
+    "gpt-4-turbo": [0.01, 0.03],
+    "gpt-4o": [0.0025, 0.01],
+    "gpt-4o-mini": [0.00015, 0.0006],
+    "gpt-4.1": [0.002, 0.008],
+    "gpt-4.1-mini": [0.0004, 0.0016],
+    "gpt-3.5-turbo": [0.0005, 0.0015],
+}
+
+DEFAULT_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-3.5-turbo": 16385,
+}
+
+
+def get_pricing(model: str) -> List[float]:
+    """Get [prompt, completion] USD-per-1K-token pricing for a model."""
+    pricing = {**DEFAULT_PRICING, **Config.MODEL_PRICING}
+    return pricing.get(model, [0.0, 0.0])
+
+
+def get_context_window(model: str) -> Optional[int]:
+    """Get the context window for a model, if known."""
+    windows = {**DEFAULT_CONTEXT_WINDOWS, **Config.MODEL_CONTEXT_WINDOWS}
+    return windows.get(model)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a request."""
+    prompt_price, completion_price = get_pricing(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ModelStats:
+    """Rolling window of request and phase outcomes for a single model."""
+    
+    def __init__(self, model: str, window: Optional[int] = None):
+        self.model = model
+        window = window or Config.ROUTING_STATS_WINDOW
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.tokens_per_second: Deque[float] = deque(maxlen=window)
+        self.completion_tokens: Deque[int] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.phase_costs: Dict[str, Deque[float]] = {}
+        self.phase_outcomes: Dict[str, Deque[bool]] = {}
+        self._window = window
+        self.last_request_at: Optional[float] = None
+    
+    def record_request(
+        self,
+        latency: float,
+        completion_tokens: int = 0,
+        success: bool = True
+    ):
+        """
+        Record a single request.
+        
+        Args:
+            latency: Wall-clock latency in seconds
+            completion_tokens: Tokens generated by the model
+            success: Whether the request succeeded
+        """
+        self.last_request_at = time.monotonic()
+        self.outcomes.append(success)
+        if not success:
+            return
+        
+        self.latencies.append(latency)
+        self.completion_tokens.append(completion_tokens)
+        if latency > 0 and completion_tokens:
+            self.tokens_per_second.append(completion_tokens / latency)
+    
+    def record_phase(self, phase: str, cost: float, success: bool):
+        """
+        Record the outcome and accumulated cost of a phase run by this model.
+        
+        Args:
+            phase: Phase name
+            cost: Total USD cost of this model's requests in the phase
+            success: Whether the phase completed successfully
+        """
+        self.phase_outcomes.setdefault(phase, deque(maxlen=self._window)).append(success)
+        if success:
+            self.phase_costs.setdefault(phase, deque(maxlen=self._window)).append(cost)
+    
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+    
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+    
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency percentile (seconds) over successful requests."""
+        return _percentile(list(self.latencies), percentile)
+    
+    @property
+    def avg_tokens_per_second(self) -> Optional[float]:
+        if not self.tokens_per_second:
+            return None
+        return sum(self.tokens_per_second) / len(self.tokens_per_second)
+    
+    def cost_per_successful_phase(self, phase: Optional[str] = None) -> Optional[float]:
+        """Average cost of a successful phase, for one phase or across all."""
+        if phase:
+            costs = list(self.phase_costs.get(phase, []))
+        else:
+            costs = [c for values in self.phase_costs.values() for c in values]
+        if not costs:
+            return None
+        return sum(costs) / len(costs)
+    
+    def phase_success_rate(self, phase: str) -> float:
+        """Fraction of recorded phases that completed successfully (1.0 if unknown)."""
+        outcomes = self.phase_outcomes.get(phase)
+        if not outcomes:
+            return 1.0
+        return sum(outcomes) / len(outcomes)
+    
+    def typical_completion_tokens(self) -> int:
+        """Median completion length of successful requests."""
+        if not self.completion_tokens:
+            return 0
+        return sorted(self.completion_tokens)[len(self.completion_tokens) // 2]
+    
+    def is_degraded(self) -> bool:
+        """Whether the model currently misses the error-rate or latency objectives."""
+        if self.samples < Config.ROUTING_MIN_SAMPLES:
+            return False
+        # Let a degraded model take a probe request once it has been idle long enough
+        if self.last_request_at and time.monotonic() - self.last_request_at > Config.ROUTING_DEGRADED_COOLDOWN:
+            return False
+        if self.error_rate > Config.ROUTING_MAX_ERROR_RATE:
+            return True
+        p95 = self.latency_percentile(95)
+        return p95 is not None and p95 > Config.ROUTING_MAX_P95_LATENCY
+    
+    def predict_latency(self, expected_completion_tokens: int) -> Optional[float]:
+        """
+        Predict latency for a request producing a given number of tokens.
+        
+        Uses the median latency of observed requests, adjusted by throughput for
+        the difference between the expected and the typical completion length.
+        """
+        p50 = self.latency_percentile(50)
+        if p50 is None:
+            return None
+        
+        tps = self.avg_tokens_per_second
+        if not tps or not self.completion_tokens:
+            return p50
+        
+        return max(0.0, p50 + (expected_completion_tokens - self.typical_completion_tokens()) / tps)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the statistics for logging or API responses."""
+        return {
+            "model": self.model,
+            "samples": self.samples,
+            "error_rate": round(self.error_rate, 4),
+            "latency_p50": self.latency_percentile(50),
+            "latency_p95": self.latency_percentile(95),
+            "latency_p99": self.latency_percentile(99),
+            "tokens_per_second": self.avg_tokens_per_second,
+            "cost_per_successful_phase": {
+                phase: self.cost_per_successful_phase(phase)
+                for phase in self.phase_costs
+            },
+            "degraded": self.is_degraded()
+        }
+
+
+class ModelStatsTracker:
+    """Thread-safe registry of ModelStats shared by all routers in a process."""
+    
+    def __init__(self):
+        self._stats: Dict[str, ModelStats] = {}
+        # Per-phase cascade counters: requests, escalations and reasons
+        self._cascades: Dict[str, Dict[str, Any]] = {}
+        # Completion lengths keyed by phase and by tool called
+        self._phase_outputs: Dict[str, Deque[int]] = {}
+        self._tool_outputs: Dict[str, Deque[int]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, model: str) -> ModelStats:
+        """Get (or create) the statistics for a model."""
+        with self._lock:
+            if model not in self._stats:
+                self._stats[model] = ModelStats(model)
+            return self._stats[model]
+    
+    def record_request(self, model: str, latency: float, completion_tokens: int = 0, success: bool = True):
+        """Record a request outcome for a model."""
+        stats = self.get(model)
+        with self._lock:
+            stats.record_request(latency, completion_tokens, success)
+    
+    def record_phase(self, model: str, phase: str, cost: float, success: bool):
+        """Record a phase outcome for a model."""
+        stats = self.get(model)
+        with self._lock:
+            stats.record_phase(phase, cost, success)
+    
+    def record_output(self, phase: str, completion_tokens: int, tool_names: Optional[List[str]] = None):
+        """Record the completion length of a response in a phase and for the tools it called."""
+        with self._lock:
+            window = Config.ROUTING_STATS_WINDOW
+            self._phase_outputs.setdefault(phase, deque(maxlen=window)).append(completion_tokens)
+            for name in set(tool_names or []):
+                self._tool_outputs.setdefault(name, deque(maxlen=window)).append(completion_tokens)
+    
+    def output_percentile(
+        self,
+        phase: Optional[str] = None,
+        tool: Optional[str] = None,
+        percentile: float = 95
+    ) -> Optional[int]:
+        """
+        Completion-length percentile for a phase or a tool.
+        
+        Returns None until ROUTING_MIN_SAMPLES lengths have been recorded.
+        """
+        with self._lock:
+            values = list(self._tool_outputs.get(tool, []) if tool else self._phase_outputs.get(phase, []))
+        if len(values) < Config.ROUTING_MIN_SAMPLES:
+            return None
+        return _percentile(values, percentile)
+    
+    def record_cascade(self, phase: str, escalated: bool, reason: Optional[str] = None):
+        """Record whether a cascaded request in a phase had to escalate."""
+        with self._lock:
+            entry = self._cascades.setdefault(phase, {"requests": 0, "escalations": 0, "reasons": {}})
+            entry["requests"] += 1
+            if escalated:
+                entry["escalations"] += 1
+                reason = reason or "unknown"
+                entry["reasons"][reason] = entry["reasons"].get(reason, 0) + 1
+    
+    def escalation_rates(self) -> Dict[str, Dict[str, Any]]:
+        """Per-phase cascade escalation rates and reasons."""
+        with self._lock:
+            return {
+                phase: {
+                    "requests": entry["requests"],
+                    "escalations": entry["escalations"],
+                    "escalation_rate": entry["escalations"] / entry["requests"] if entry["requests"] else 0.0,
+                    "reasons": dict(entry["reasons"])
+                }
+                for phase, entry in self._cascades.items()
+            }
+    
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Snapshot of statistics for every tracked model."""
+        with self._lock:
+            return [stats.to_dict() for stats in self._stats.values()]
+
+
+_tracker = ModelStatsTracker()
+
+
+def get_stats_tracker() -> ModelStatsTracker:
+    """Get the process-wide statistics tracker."""
+    return _tracker
@@ -0,0 +1,251 @@
+"""
+Token-bucket rate limiting of LLM requests per minute (RPM) and tokens per minute (TPM).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class LocalBucketStore:
+    """Bucket state shared by the threads of one process."""
+    
+    def __init__(self):
+        self._state: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+    
+    def transact(self, fn: Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], Any]]) -> Any:
+        """Apply fn to the current state atomically and store the new state."""
+        with self._lock:
+            self._state, result = fn(self._state)
+            return result
+
+
+class FileBucketStore:
+    """
+    Bucket state shared across processes on one host through a locked JSON file.
+    """
+    
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("FileBucketStore requires fcntl (POSIX)")
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def transact(self, fn: Callable[[Optional[Dict[str, Any]]], Tuple[Dict[str, Any], Any]]) -> Any:
+        """Apply fn to the current state under an exclusive file lock."""
+        with self._lock, open(self.path, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                raw = handle.read()
+                state = json.loads(raw) if raw.strip() else None
+                state, result = fn(state)
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                handle.flush()
+                return result
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    RPM and TPM token buckets with first-come-first-served admission.
+    
+    Both buckets refill continuously at RATE_LIMIT_HEADROOM of the limit, so
+    sustained throughput stays just under the provider limit instead of
+    bursting into 429s. A request larger than the burst size is admitted once
+    the bucket is full and leaves it in debt, which later requests wait out.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        store: Optional[Any] = None
+    ):
+        """
+        Args:
+            name: Limiter name (usually the endpoint name)
+            rpm: Requests-per-minute limit (None or 0 disables)
+            tpm: Tokens-per-minute limit (None or 0 disables)
+            store: Bucket state store; LocalBucketStore by default
+        """
+        self.name = name
+        self.rpm = rpm or 0
+        self.tpm = tpm or 0
+        self.store = store or LocalBucketStore()
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+    
+    def update_limits(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """Update limits, e.g. from x-ratelimit-limit-* response headers."""
+        if rpm:
+            self.rpm = rpm
+        if tpm:
+            self.tpm = tpm
+    
+    def _capacity(self, limit: int) -> Tuple[float, float]:
+        """(burst size, refill per second) for a per-minute limit."""
+        rate = limit * Config.RATE_LIMIT_HEADROOM / 60
+        return rate * Config.RATE_LIMIT_BURST_SECONDS, rate
+    
+    def _refill(self, state: Optional[Dict[str, Any]], now: float) -> Dict[str, Any]:
+        """Bring bucket levels up to date."""
+        request_burst, request_rate = self._capacity(self.rpm)
+        token_burst, token_rate = self._capacity(self.tpm)
+        if not state:
+            return {"requests": request_burst, "tokens": token_burst, "updated_at": now, "paused_until": 0.0}
+        
+        elapsed = max(0.0, now - state["updated_at"])
+        state["requests"] = min(request_burst, state["requests"] + elapsed * request_rate)
+        state["tokens"] = min(token_burst, state["tokens"] + elapsed * token_rate)
+        state["updated_at"] = now
+        return state
+    
+    def _try_take(self, tokens: int) -> float:
+        """
+        Take one request and `tokens` tokens if available.
+        
+        Returns:
+            0 if admitted, otherwise seconds to wait before retrying
+        """
+        def take(state):
+            now = time.time()
+            state = self._refill(state, now)
+            if state["paused_until"] > now:
+                return state, state["paused_until"] - now
+            
+            waits = []
+            if self.rpm:
+                burst, rate = self._capacity(self.rpm)
+                if state["requests"] < min(1, burst):
+                    waits.append((min(1, burst) - state["requests"]) / rate)
+            if self.tpm:
+                burst, rate = self._capacity(self.tpm)
+                needed = min(tokens, burst)
+                if state["tokens"] < needed:
+                    waits.append((needed - state["tokens"]) / rate)
+            if waits:
+                return state, max(waits)
+            
+            if self.rpm:
+                state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= tokens
+            return state, 0.0
+        
+        return self.store.transact(take)
+    
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a request of `tokens` tokens may be sent.
+        
+        Waiters are admitted in arrival order, so a large request is not
+        starved by a stream of small ones.
+        
+        Args:
+            tokens: Estimated prompt + completion tokens
+            timeout: Maximum seconds to wait (None waits indefinitely)
+        
+        Returns:
+            True if admitted, False on timeout
+        """
+        if not self.rpm and not self.tpm:
+            return True
+        
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+        
+        try:
+            while True:
+                with self._cond:
+                    while self._queue[0] is not ticket:
+                        remaining = deadline - time.monotonic() if deadline else None
+                        if remaining is not None and remaining <= 0:
+                            return False
+                        self._cond.wait(remaining)
+                
+                wait = self._try_take(tokens)
+                if wait <= 0:
+                    return True
+                
+                if deadline and time.monotonic() + wait > deadline:
+                    return False
+                logger.debug(f"Rate limiter {self.name} waiting {wait:.2f}s for {tokens} tokens")
+                time.sleep(wait)
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+    
+    def reconcile(self, reserved_tokens: int, actual_tokens: int):
+        """Charge the difference when a request used more tokens than reserved."""
+        extra = actual_tokens - reserved_tokens
+        if extra <= 0 or not self.tpm:
+            return
+        
+        def charge(state):
+            state = self._refill(state, time.time())
+            state["tokens"] -= extra
+            return state, None
+        
+        self.store.transact(charge)
+    
+    def pause(self, seconds: float):
+        """Stop admitting requests for a while after a 429 and drain the buckets."""
+        def drain(state):
+            now = time.time()
+            state = self._refill(state, now)
+            state["paused_until"] = max(state["paused_until"], now + seconds)
+            state["requests"] = min(state["requests"], 0.0)
+            state["tokens"] = min(state["tokens"], 0.0)
+            return state, None
+        
+        self.store.transact(drain)
+        logger.warning(f"Rate limiter {self.name} paused for {seconds:.1f}s")
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> RateLimiter:
+    """
+    Get the process-wide limiter for a name (usually an endpoint).
+    
+    Limiters share state across processes when RATE_LIMIT_SHARED_DIR is set.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            store = None
+            if Config.RATE_LIMIT_SHARED_DIR:
+                store = FileBucketStore(os.path.join(Config.RATE_LIMIT_SHARED_DIR, f"{name}.json"))
+            limiter = RateLimiter(
+                name,
+                rpm=rpm or Config.RATE_LIMIT_RPM,
+                tpm=tpm or Config.RATE_LIMIT_TPM,
+                store=store
+            )
+            _limiters[name] = limiter
+        else:
+            limiter.update_limits(rpm, tpm)
+        return limiter
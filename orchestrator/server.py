@@ -2,15 +2,20 @@
 Morgus Agent API Server
 FastAPI server for the Morgus autonomous agent system
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import uvicorn
 import os
 from dotenv import load_dotenv
 
-from database import DatabaseClient
+from config import Config
+from database import get_database_client, encode_step_cursor
+from async_database import get_async_database_client, close_async_database_client
+from blob_store import get_blob_store
 from sandbox_e2b import E2BSandboxManager
 from llm import ModelRouter as LLMClient
 
@@ -28,8 +33,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize clients
-db = DatabaseClient()
+# Initialize clients; request handlers use the pooled async client
+db = get_database_client()
+adb = get_async_database_client()
 sandbox_manager = E2BSandboxManager()
 llm = LLMClient()
 
@@ -43,6 +49,10 @@ class CodeExecute(BaseModel):
     code: str
     language: str = "python"
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_async_database_client()
+
 @app.get("/")
 async def root():
     return {
@@ -59,20 +69,46 @@ async def health():
 async def create_task(task: TaskCreate):
     """Create a new task"""
     try:
-        task_data = db.create_task(
+        task_data = await adb.create_task(
             title=task.title,
-            description=task.description
+            description=task.description,
+            user_id=task.user_id
         )
         return task_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tasks")
-async def list_tasks(user_id: str = "default", limit: int = 50):
-    """List all tasks for a user"""
+async def list_tasks(
+    user_id: str = "default",
+    limit: int = 50,
+    status: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = None,
+    summary: bool = False
+):
+    """
+    List a user's tasks, newest first.
+    
+    Pass the returned next_cursor as `before` for the next (older) page; it
+    is null on the last page. `status` and `fields` are comma-separated;
+    `summary` adds each task's step, tool, iteration and token counters.
+    """
+    if not 1 <= limit <= 200:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 200")
     try:
-        tasks = db.get_tasks(user_id=user_id, limit=limit)
-        return {"tasks": tasks}
+        tasks = await adb.get_tasks(
+            user_id,
+            status=[s.strip() for s in status.split(",") if s.strip()] if status else None,
+            limit=limit,
+            before=before,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            summary=summary
+        )
+        next_cursor = encode_step_cursor(tasks[-1]) if len(tasks) == limit else None
+        return {"tasks": tasks, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -80,7 +116,7 @@ async def list_tasks(user_id: str = "default", limit: int = 50):
 async def get_task(task_id: str):
     """Get a specific task"""
     try:
-        task = db.get_task(task_id)
+        task = await adb.get_task(task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         return task
@@ -89,12 +125,100 @@ async def get_task(task_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tasks/{task_id}/summary")
+async def get_task_summary(task_id: str):
+    """Get a task's step count, last activity, iteration and token/tool totals"""
+    try:
+        summary = await adb.get_task_summary(task_id)
+        if not summary:
+            raise HTTPException(status_code=404, detail="No summary for task")
+        return summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/hooks/task-changes")
+async def task_changed(payload: Dict[str, Any], x_webhook_secret: Optional[str] = Header(None)):
+    """
+    Database webhook for changes to the tasks table.
+    
+    Drops the changed task from this process's task caches so the next read
+    sees the new row instead of waiting for the TTL.
+    """
+    if Config.TASK_WEBHOOK_SECRET and x_webhook_secret != Config.TASK_WEBHOOK_SECRET:
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+    db.handle_task_change(payload)
+    adb.handle_task_change(payload)
+    return {"ok": True}
+
 @app.get("/tasks/{task_id}/steps")
-async def get_task_steps(task_id: str):
-    """Get all steps for a task"""
+async def get_task_steps(
+    task_id: str,
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None
+):
+    """
+    Get steps for a task, oldest first.
+    
+    Pass the returned next_cursor as `since` to fetch only newer steps;
+    `fields` is a comma-separated column projection.
+    """
+    if limit is not None and not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
     try:
-        steps = db.get_task_steps(task_id)
-        return {"steps": steps}
+        steps = await adb.get_task_steps(
+            task_id,
+            since=since,
+            limit=limit,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        )
+        # Without new steps the client keeps polling from the same position
+        next_cursor = encode_step_cursor(steps[-1]) if steps else since
+        return {"steps": steps, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/blobs/{digest}", response_class=PlainTextResponse)
+async def get_blob(digest: str):
+    """
+    Get the full text of a step payload stored in the blob store.
+    
+    Steps reference these by metadata.content_blob / metadata.arguments_blob.
+    """
+    store = get_blob_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Blob store is disabled")
+    try:
+        text = await run_in_threadpool(store.get_text, digest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if text is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return text
+
+@app.get("/tasks/{task_id}/usage")
+async def get_task_usage(task_id: str):
+    """Get per-phase LLM usage for a task"""
+    try:
+        usage = await adb.get_task_usage(task_id)
+        return {"usage": usage}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/usage/models")
+async def get_model_usage(since: Optional[str] = None):
+    """Get per-model daily LLM usage and cost per successful task"""
+    try:
+        return {
+            "models": await adb.get_model_usage(since=since),
+            "per_successful_task": await adb.get_cost_per_successful_task()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -120,6 +244,15 @@ async def cleanup_sandbox(task_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/models/stats")
+async def model_stats():
+    """Get rolling per-model routing statistics"""
+    return {
+        "models": llm.stats.snapshot(),
+        "cascades": llm.stats.escalation_rates(),
+        "endpoints": llm.pool.status()
+    }
+
 @app.post("/chat")
 async def chat(message: str, task_id: Optional[str] = None):
     """Send a message to the LLM"""
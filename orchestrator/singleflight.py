@@ -0,0 +1,76 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call that other callers can wait on."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same
+    key wait for that call and share its result (or its exception).
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn for a key, or wait for the identical call already in flight.
+        
+        Args:
+            key: Identity of the call
+            fn: Function performing the call
+        
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            reused another caller's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.info(f"Single-flight call shared with {call.waiters} waiting caller(s)")
+            call.done.set()
+        
+        return call.result, False
+    
+    def in_flight(self) -> int:
+        """Number of distinct calls currently in flight."""
+        with self._lock:
+            return len(self._calls)
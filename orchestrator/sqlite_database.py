@@ -0,0 +1,879 @@
+"""
+Embedded SQLite storage backend for Morgus (single node / offline).
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import Config
+from database import (
+    EXPORT_TABLES,
+    step_columns,
+    task_columns,
+    decode_step_cursor,
+    read_archived_steps,
+    merge_steps
+)
+from vector_index import get_vector_index
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL DEFAULT 'default',
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    phase TEXT DEFAULT 'RESEARCH',
+    model TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    completed_at TEXT,
+    error_message TEXT,
+    steps_archived_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS task_steps (
+    id TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    path TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id TEXT PRIMARY KEY,
+    task_id TEXT REFERENCES tasks(id) ON DELETE CASCADE,
+    phase TEXT,
+    iteration INTEGER,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms INTEGER,
+    finish_reason TEXT,
+    cost_usd REAL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS knowledge (
+    id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    embedding BLOB,  -- float32 array
+    metadata TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS task_step_archives (
+    task_id TEXT PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+    blob_digest TEXT NOT NULL,
+    step_count INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    first_step_at TEXT,
+    last_step_at TEXT,
+    archived_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS task_summaries (
+    task_id TEXT PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+    step_count INTEGER NOT NULL DEFAULT 0,
+    tool_calls INTEGER NOT NULL DEFAULT 0,
+    tool_errors INTEGER NOT NULL DEFAULT 0,
+    last_phase TEXT,
+    last_step_type TEXT,
+    last_activity_at TEXT,
+    iteration INTEGER,
+    llm_requests INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_created_id ON tasks(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created_id ON tasks(user_id, status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_unarchived_updated ON tasks(updated_at)
+    WHERE steps_archived_at IS NULL AND status IN ('completed', 'error');
+CREATE INDEX IF NOT EXISTS idx_task_steps_task_created_id ON task_steps(task_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_task_id ON artifacts(task_id);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_task ON llm_usage(task_id, phase);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_model_created ON llm_usage(model, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_id ON tasks(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_task_steps_created_id ON task_steps(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created_id ON artifacts(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created_id ON llm_usage(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_task_step_archives_archived ON task_step_archives(archived_at, task_id);
+CREATE INDEX IF NOT EXISTS idx_knowledge_content_hash ON knowledge(json_extract(metadata, '$.content_hash'));
+
+CREATE TRIGGER IF NOT EXISTS task_steps_summary AFTER INSERT ON task_steps
+BEGIN
+    INSERT INTO task_summaries (
+        task_id, step_count, tool_calls, tool_errors,
+        last_phase, last_step_type, last_activity_at, updated_at
+    )
+    VALUES (
+        NEW.task_id, 1, NEW.type = 'TOOL_CALL', NEW.type = 'TOOL_ERROR',
+        NEW.phase, NEW.type, NEW.created_at, NEW.created_at
+    )
+    ON CONFLICT (task_id) DO UPDATE SET
+        step_count = step_count + 1,
+        tool_calls = tool_calls + excluded.tool_calls,
+        tool_errors = tool_errors + excluded.tool_errors,
+        last_phase = CASE WHEN excluded.last_activity_at >= IFNULL(last_activity_at, '')
+            THEN excluded.last_phase ELSE last_phase END,
+        last_step_type = CASE WHEN excluded.last_activity_at >= IFNULL(last_activity_at, '')
+            THEN excluded.last_step_type ELSE last_step_type END,
+        last_activity_at = MAX(IFNULL(last_activity_at, ''), excluded.last_activity_at),
+        updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS llm_usage_summary AFTER INSERT ON llm_usage
+WHEN NEW.task_id IS NOT NULL
+BEGIN
+    INSERT INTO task_summaries (task_id, iteration, llm_requests, total_tokens, cost_usd, updated_at)
+    VALUES (NEW.task_id, NEW.iteration, 1, NEW.total_tokens, NEW.cost_usd, NEW.created_at)
+    ON CONFLICT (task_id) DO UPDATE SET
+        iteration = excluded.iteration,
+        llm_requests = llm_requests + 1,
+        total_tokens = total_tokens + excluded.total_tokens,
+        cost_usd = cost_usd + excluded.cost_usd,
+        updated_at = excluded.updated_at;
+END;
+
+CREATE VIEW IF NOT EXISTS task_dashboard AS
+SELECT
+    t.*,
+    IFNULL(s.step_count, 0) AS step_count,
+    IFNULL(s.tool_calls, 0) AS tool_calls,
+    IFNULL(s.tool_errors, 0) AS tool_errors,
+    s.last_phase,
+    s.last_step_type,
+    s.last_activity_at,
+    s.iteration,
+    IFNULL(s.llm_requests, 0) AS llm_requests,
+    IFNULL(s.total_tokens, 0) AS total_tokens,
+    IFNULL(s.cost_usd, 0) AS cost_usd
+FROM tasks t
+LEFT JOIN task_summaries s ON s.task_id = t.id;
+"""
+
+# Summaries for tasks whose steps or usage predate the summary triggers
+BACKFILL_SUMMARIES = """
+INSERT OR IGNORE INTO task_summaries (
+    task_id, step_count, tool_calls, tool_errors, last_phase, last_step_type,
+    last_activity_at, iteration, llm_requests, total_tokens, cost_usd, updated_at
+)
+SELECT
+    t.id,
+    (SELECT COUNT(*) FROM task_steps WHERE task_id = t.id),
+    (SELECT COUNT(*) FROM task_steps WHERE task_id = t.id AND type = 'TOOL_CALL'),
+    (SELECT COUNT(*) FROM task_steps WHERE task_id = t.id AND type = 'TOOL_ERROR'),
+    (SELECT phase FROM task_steps WHERE task_id = t.id ORDER BY created_at DESC, id DESC LIMIT 1),
+    (SELECT type FROM task_steps WHERE task_id = t.id ORDER BY created_at DESC, id DESC LIMIT 1),
+    (SELECT MAX(created_at) FROM task_steps WHERE task_id = t.id),
+    (SELECT iteration FROM llm_usage WHERE task_id = t.id ORDER BY created_at DESC LIMIT 1),
+    (SELECT COUNT(*) FROM llm_usage WHERE task_id = t.id),
+    (SELECT IFNULL(SUM(total_tokens), 0) FROM llm_usage WHERE task_id = t.id),
+    (SELECT IFNULL(SUM(cost_usd), 0) FROM llm_usage WHERE task_id = t.id),
+    t.updated_at
+FROM tasks t
+WHERE EXISTS (SELECT 1 FROM task_steps WHERE task_id = t.id)
+    OR EXISTS (SELECT 1 FROM llm_usage WHERE task_id = t.id)
+"""
+
+# Columns update_task may set; keys are interpolated into SQL, so they are checked
+TASK_COLUMNS = {
+    "user_id", "title", "description", "status", "phase", "model",
+    "updated_at", "completed_at", "error_message", "steps_archived_at"
+}
+
+# Task columns added after the first release, added to older files on open
+ADDED_TASK_COLUMNS = {
+    "user_id": "TEXT NOT NULL DEFAULT 'default'",
+    "steps_archived_at": "TEXT"
+}
+
+LLM_USAGE_COLUMNS = [
+    "id", "task_id", "phase", "iteration", "model", "prompt_tokens", "completion_tokens",
+    "cached_tokens", "total_tokens", "latency_ms", "finish_reason", "cost_usd", "created_at"
+]
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Linearly interpolated percentile, like Postgres PERCENTILE_CONT."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class SQLiteDatabaseClient:
+    """
+    DatabaseClient backed by a local SQLite file in WAL mode.
+    
+    Same task, step, artifact, usage and knowledge API as the Supabase
+    client, for single-node deployments and offline tests and benchmarks.
+    Each thread gets its own connection; WAL lets readers proceed while a
+    writer commits, and busy_timeout makes concurrent writers (including
+    other processes on the same file) wait instead of failing.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Database file (SQLITE_PATH by default; ":memory:" is not
+                shared between threads)
+        """
+        self.path = path or Config.SQLITE_PATH
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if columns:
+                for column, definition in ADDED_TASK_COLUMNS.items():
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            had_summaries = bool(list(conn.execute("PRAGMA table_info(task_summaries)")))
+            conn.executescript(SCHEMA)
+            if columns and not had_summaries:
+                conn.execute(BACKFILL_SUMMARIES)
+        self._vector_index_checked = False
+        self._vector_index_lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=Config.DB_TIMEOUT)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Run a SELECT and return rows as dicts with JSON columns decoded."""
+        rows = [dict(row) for row in self._connect().execute(sql, params)]
+        for row in rows:
+            if isinstance(row.get("metadata"), str):
+                row["metadata"] = json.loads(row["metadata"])
+        return rows
+    
+    def _insert(self, table: str, rows: List[Dict[str, Any]], ignore_duplicates: bool = False) -> int:
+        """Insert rows (all with the same keys) in one transaction; returns the number inserted."""
+        columns = list(rows[0].keys())
+        verb = "INSERT OR IGNORE" if ignore_duplicates else "INSERT"
+        sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        values = [
+            tuple(
+                json.dumps(row[column], default=str) if column == "metadata" else row[column]
+                for column in columns
+            )
+            for row in rows
+        ]
+        with self._connect() as conn:
+            return conn.executemany(sql, values).rowcount
+    
+    # Task operations
+    
+    def create_task(
+        self,
+        title: str,
+        description: str,
+        model: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create a new task."""
+        try:
+            now = datetime.utcnow().isoformat()
+            data = {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id or "default",
+                "title": title,
+                "description": description,
+                "status": "pending",
+                "phase": "RESEARCH",
+                "model": model or Config.DEFAULT_MODEL,
+                "created_at": now,
+                "updated_at": now
+            }
+            self._insert("tasks", [data])
+            return self.get_task(data["id"])
+        except Exception as e:
+            logger.error(f"Failed to create task: {e}")
+            raise
+    
+    def add_tasks_batch(self, tasks: List[Dict[str, Any]]) -> int:
+        """Insert a batch of complete task rows, skipping ones already stored; returns the number inserted."""
+        if not tasks:
+            return 0
+        
+        try:
+            return self._insert("tasks", tasks, ignore_duplicates=True)
+        except Exception as e:
+            logger.error(f"Failed to add {len(tasks)} tasks: {e}")
+            raise
+    
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task by ID."""
+        try:
+            rows = self._query("SELECT * FROM tasks WHERE id = ?", (task_id,))
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get task {task_id}: {e}")
+            return None
+    
+    def update_task(
+        self,
+        task_id: str,
+        updates: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update a task.
+        
+        Raises:
+            ValueError: On a column the tasks table does not have
+        """
+        updates["updated_at"] = datetime.utcnow().isoformat()
+        unknown = set(updates) - TASK_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+        try:
+            assignments = ", ".join(f"{column} = ?" for column in updates)
+            with self._connect() as conn:
+                conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", (*updates.values(), task_id))
+            return self.get_task(task_id)
+        except Exception as e:
+            logger.error(f"Failed to update task {task_id}: {e}")
+            raise
+    
+    def handle_task_change(self, payload: Dict[str, Any]):
+        """No-op: reads go to the file, so there is no task cache to invalidate."""
+    
+    def get_pending_tasks(self) -> List[Dict[str, Any]]:
+        """Get all pending tasks."""
+        try:
+            return self._query("SELECT * FROM tasks WHERE status = 'pending' ORDER BY created_at")
+        except Exception as e:
+            logger.error(f"Failed to get pending tasks: {e}")
+            return []
+    
+    def get_tasks(
+        self,
+        user_id: str,
+        status: Optional[List[str]] = None,
+        limit: int = 50,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        summary: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        List a user's tasks, newest first, one keyset page at a time.
+        
+        With summary, rows come from task_dashboard and include the task's
+        summary counters.
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        columns = task_columns(fields, summary)
+        table = "task_dashboard" if summary else "tasks"
+        sql = f"SELECT {columns} FROM {table} WHERE user_id = ?"
+        params: tuple = (user_id,)
+        if status:
+            sql += f" AND status IN ({', '.join('?' for _ in status)})"
+            params += tuple(status)
+        if before:
+            created_at, task_id = decode_step_cursor(before)
+            sql += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += (created_at, created_at, task_id)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params += (limit,)
+        try:
+            return self._query(sql, params)
+        except Exception as e:
+            logger.error(f"Failed to list tasks for {user_id}: {e}")
+            return []
+    
+    def get_task_summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's summary counters, or None before it has any steps."""
+        try:
+            rows = self._query("SELECT * FROM task_summaries WHERE task_id = ?", (task_id,))
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get summary for {task_id}: {e}")
+            return None
+    
+    # Task step operations
+    
+    def add_task_step(
+        self,
+        task_id: str,
+        phase: str,
+        step_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Add a step to a task's execution log."""
+        try:
+            data = {
+                "id": str(uuid.uuid4()),
+                "task_id": task_id,
+                "phase": phase,
+                "type": step_type,
+                "content": content,
+                "metadata": metadata or {},
+                "created_at": datetime.utcnow().isoformat()
+            }
+            self._insert("task_steps", [data])
+            return data
+        except Exception as e:
+            logger.error(f"Failed to add task step: {e}")
+            raise
+    
+    def add_task_steps_batch(self, steps: List[Dict[str, Any]]) -> int:
+        """Insert a batch of task steps with client ids, skipping ones already stored; returns the number inserted."""
+        if not steps:
+            return 0
+        
+        try:
+            return self._insert("task_steps", steps, ignore_duplicates=True)
+        except Exception as e:
+            logger.error(f"Failed to add {len(steps)} task steps: {e}")
+            raise
+    
+    def get_task_steps(
+        self,
+        task_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get steps for a task in (created_at, id) order.
+        
+        Raises:
+            ValueError: On a malformed cursor or unknown field
+        """
+        # step_columns validates names, so they are safe to interpolate
+        columns = step_columns(fields)
+        sql = f"SELECT {columns} FROM task_steps WHERE task_id = ?"
+        params: tuple = (task_id,)
+        if since:
+            created_at, step_id = decode_step_cursor(since)
+            sql += " AND (created_at > ? OR (created_at = ? AND id > ?))"
+            params += (created_at, created_at, step_id)
+        sql += " ORDER BY created_at, id"
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        try:
+            steps = self._query(sql, params)
+            archive = self.get_step_archive(task_id)
+            if archive:
+                archived = read_archived_steps(archive["blob_digest"], since, limit, fields)
+                steps = merge_steps(archived, steps, limit)
+            return steps
+        except Exception as e:
+            logger.error(f"Failed to get task steps for {task_id}: {e}")
+            return []
+    
+    # Step archive operations
+    
+    def get_steps_to_archive(
+        self,
+        task_id: str,
+        since: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a task's steps for the retention job, raising on errors (see DatabaseClient).
+        
+        Raises:
+            ValueError: On a malformed cursor
+            LookupError: If an earlier archive is missing from the blob store
+        """
+        sql = f"SELECT {step_columns()} FROM task_steps WHERE task_id = ?"
+        params: tuple = (task_id,)
+        if since:
+            created_at, step_id = decode_step_cursor(since)
+            sql += " AND (created_at > ? OR (created_at = ? AND id > ?))"
+            params += (created_at, created_at, step_id)
+        sql += " ORDER BY created_at, id"
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        try:
+            steps = self._query(sql, params)
+            archive = self._query("SELECT blob_digest FROM task_step_archives WHERE task_id = ?", (task_id,))
+            if archive:
+                archived = read_archived_steps(archive[0]["blob_digest"], since, limit, missing_ok=False)
+                steps = merge_steps(archived, steps, limit)
+            return steps
+        except Exception as e:
+            logger.error(f"Failed to read steps to archive for {task_id}: {e}")
+            raise
+    
+    def get_tasks_to_archive(self, finished_before: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get finished tasks last updated before a time whose steps are still in task_steps."""
+        try:
+            return self._query("""
+                SELECT id, status, updated_at FROM tasks
+                WHERE steps_archived_at IS NULL AND status IN ('completed', 'error') AND updated_at < ?
+                ORDER BY updated_at LIMIT ?
+            """, (finished_before, limit))
+        except Exception as e:
+            logger.error(f"Failed to get tasks to archive: {e}")
+            return []
+    
+    def add_step_archive(self, archive: Dict[str, Any]):
+        """Record where a task's steps were archived (replacing an earlier record)."""
+        try:
+            columns = list(archive.keys())
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO task_step_archives ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    tuple(archive.values())
+                )
+        except Exception as e:
+            logger.error(f"Failed to record step archive for {archive.get('task_id')}: {e}")
+            raise
+    
+    def get_step_archive(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task's step archive record, if its steps were archived."""
+        try:
+            rows = self._query("SELECT * FROM task_step_archives WHERE task_id = ?", (task_id,))
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get step archive for {task_id}: {e}")
+            return None
+    
+    def get_step_archives_after(
+        self,
+        after: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Step archive records in (archived_at, task_id) order, for bulk export."""
+        sql = "SELECT task_id, blob_digest, archived_at FROM task_step_archives WHERE 1 = 1"
+        params: tuple = ()
+        if after:
+            archived_at, task_id = decode_step_cursor(after)
+            sql += " AND (archived_at > ? OR (archived_at = ? AND task_id > ?))"
+            params += (archived_at, archived_at, task_id)
+        if until:
+            sql += " AND archived_at < ?"
+            params += (until,)
+        sql += " ORDER BY archived_at, task_id LIMIT ?"
+        params += (limit,)
+        return self._query(sql, params)
+    
+    def delete_task_steps(self, task_id: str, through: Optional[str] = None):
+        """Delete a task's rows from task_steps, up to and including the `through` cursor."""
+        sql = "DELETE FROM task_steps WHERE task_id = ?"
+        params: tuple = (task_id,)
+        if through:
+            created_at, step_id = decode_step_cursor(through)
+            sql += " AND (created_at < ? OR (created_at = ? AND id <= ?))"
+            params += (created_at, created_at, step_id)
+        try:
+            with self._connect() as conn:
+                conn.execute(sql, params)
+        except Exception as e:
+            logger.error(f"Failed to delete task steps for {task_id}: {e}")
+            raise
+    
+    # Artifact operations
+    
+    def add_artifact(
+        self,
+        task_id: str,
+        artifact_type: str,
+        name: str,
+        url: Optional[str] = None,
+        path: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Add an artifact (output) for a task."""
+        try:
+            data = {
+                "id": str(uuid.uuid4()),
+                "task_id": task_id,
+                "type": artifact_type,
+                "name": name,
+                "url": url,
+                "path": path,
+                "metadata": metadata or {},
+                "created_at": datetime.utcnow().isoformat()
+            }
+            self._insert("artifacts", [data])
+            return data
+        except Exception as e:
+            logger.error(f"Failed to add artifact: {e}")
+            raise
+    
+    def get_task_artifacts(self, task_id: str) -> List[Dict[str, Any]]:
+        """Get all artifacts for a task."""
+        try:
+            return self._query("SELECT * FROM artifacts WHERE task_id = ? ORDER BY created_at", (task_id,))
+        except Exception as e:
+            logger.error(f"Failed to get artifacts for {task_id}: {e}")
+            return []
+    
+    # LLM usage operations
+    
+    def add_llm_usage_batch(self, records: List[Dict[str, Any]]) -> int:
+        """Insert a batch of LLM usage records in one transaction."""
+        if not records:
+            return 0
+        
+        try:
+            rows = []
+            for record in records:
+                row = {column: record.get(column) for column in LLM_USAGE_COLUMNS}
+                row["id"] = row["id"] or str(uuid.uuid4())
+                row["created_at"] = row["created_at"] or datetime.utcnow().isoformat()
+                for column in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "cost_usd"):
+                    row[column] = row[column] or 0
+                rows.append(row)
+            self._insert("llm_usage", rows)
+            return len(records)
+        except Exception as e:
+            logger.error(f"Failed to add LLM usage records: {e}")
+            raise
+    
+    def get_task_usage(self, task_id: str) -> List[Dict[str, Any]]:
+        """Get per-phase LLM usage rollups for a task (as llm_usage_task_rollup)."""
+        try:
+            return self._query("""
+                SELECT task_id, phase,
+                    COUNT(*) AS requests,
+                    SUM(prompt_tokens) AS prompt_tokens,
+                    SUM(completion_tokens) AS completion_tokens,
+                    SUM(cached_tokens) AS cached_tokens,
+                    SUM(total_tokens) AS total_tokens,
+                    MAX(prompt_tokens) AS max_prompt_tokens,
+                    MAX(iteration) AS iterations,
+                    ROUND(AVG(latency_ms)) AS avg_latency_ms,
+                    SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) AS truncated_responses,
+                    SUM(cost_usd) AS cost_usd
+                FROM llm_usage WHERE task_id = ? GROUP BY task_id, phase
+            """, (task_id,))
+        except Exception as e:
+            logger.error(f"Failed to get LLM usage for {task_id}: {e}")
+            return []
+    
+    def get_model_usage(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get per-model daily LLM usage rollups (as llm_usage_model_rollup), most recent day first."""
+        try:
+            rows = self._query("""
+                SELECT model, substr(created_at, 1, 10) AS day,
+                    COUNT(*) AS requests,
+                    SUM(prompt_tokens) AS prompt_tokens,
+                    SUM(completion_tokens) AS completion_tokens,
+                    SUM(cached_tokens) AS cached_tokens,
+                    SUM(total_tokens) AS total_tokens,
+                    ROUND(AVG(latency_ms)) AS avg_latency_ms,
+                    group_concat(latency_ms) AS latencies,
+                    SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) AS truncated_responses,
+                    SUM(cost_usd) AS cost_usd
+                FROM llm_usage
+                WHERE substr(created_at, 1, 10) >= ?
+                GROUP BY model, day
+                ORDER BY day DESC
+            """, (since or "",))
+            # SQLite has no PERCENTILE_CONT
+            for row in rows:
+                latencies = [float(value) for value in (row.pop("latencies") or "").split(",") if value]
+                row["p95_latency_ms"] = _percentile(latencies, 0.95)
+            return rows
+        except Exception as e:
+            logger.error(f"Failed to get model usage: {e}")
+            return []
+    
+    def get_cost_per_successful_task(self) -> Optional[Dict[str, Any]]:
+        """Get average LLM tokens and cost per completed task (as llm_usage_success_cost)."""
+        try:
+            rows = self._query("""
+                SELECT COUNT(*) AS completed_tasks,
+                    ROUND(AVG(total_tokens)) AS avg_tokens_per_task,
+                    AVG(cost_usd) AS avg_cost_per_task
+                FROM (
+                    SELECT SUM(u.total_tokens) AS total_tokens, SUM(u.cost_usd) AS cost_usd
+                    FROM llm_usage u JOIN tasks t ON t.id = u.task_id
+                    WHERE t.status = 'completed'
+                    GROUP BY u.task_id
+                )
+            """)
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Failed to get cost per successful task: {e}")
+            return None
+    
+    # Knowledge base operations
+    
+    def store_knowledge(
+        self,
+        content: str,
+        embedding: List[float],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Store knowledge with vector embedding."""
+        row = {
+            "id": str(uuid.uuid4()),
+            "content": content,
+            "embedding": embedding,
+            "metadata": metadata or {},
+            "created_at": datetime.utcnow().isoformat()
+        }
+        self.store_knowledge_batch([row])
+        return row
+    
+    def store_knowledge_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Store many knowledge rows in one transaction and add them to the vector index."""
+        if not rows:
+            return 0
+        
+        try:
+            self._insert("knowledge", [
+                {**row, "embedding": np.asarray(row["embedding"], dtype=np.float32).tobytes()}
+                for row in rows
+            ])
+            get_vector_index().add(rows)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Failed to store {len(rows)} knowledge rows: {e}")
+            raise
+    
+    def get_knowledge_hashes(self, hashes: List[str]) -> set:
+        """Which of these chunk content hashes (metadata.content_hash) are already stored."""
+        found = set()
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            rows = self._connect().execute(
+                "SELECT json_extract(metadata, '$.content_hash') AS content_hash FROM knowledge "
+                f"WHERE json_extract(metadata, '$.content_hash') IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            found.update(row["content_hash"] for row in rows)
+        return found
+    
+    def search_knowledge(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Search the knowledge base with the local vector index."""
+        threshold = Config.KNOWLEDGE_MATCH_THRESHOLD if threshold is None else threshold
+        try:
+            self._ensure_vector_index()
+            return get_vector_index().search(
+                query_embedding,
+                limit=limit,
+                metadata_filter=metadata_filter,
+                threshold=threshold
+            )
+        except Exception as e:
+            logger.error(f"Failed to search knowledge: {e}")
+            return []
+    
+    def _ensure_vector_index(self):
+        """On the first search, rebuild the index if it holds fewer rows than the table."""
+        with self._vector_index_lock:
+            if self._vector_index_checked:
+                return
+            stored = self._connect().execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
+            if len(get_vector_index()) < stored:
+                logger.info(f"Vector index holds {len(get_vector_index())} of {stored} knowledge rows; rebuilding")
+                self.rebuild_vector_index()
+            self._vector_index_checked = True
+    
+    def rebuild_vector_index(self, page_size: int = 500) -> int:
+        """Load every knowledge row into the local vector index."""
+        index = get_vector_index()
+        indexed = 0
+        last_id = ""
+        while True:
+            rows = self._query(
+                "SELECT id, content, embedding, metadata FROM knowledge WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, page_size)
+            )
+            if not rows:
+                break
+            for row in rows:
+                row["embedding"] = np.frombuffer(row["embedding"], dtype=np.float32) if row["embedding"] else None
+            index.add([row for row in rows if row["embedding"] is not None])
+            indexed += len(rows)
+            last_id = rows[-1]["id"]
+        if len(index) >= Config.VECTOR_INDEX_TRAIN_MIN:
+            index.train()
+        else:
+            index.save()
+        logger.info(f"Rebuilt vector index with {indexed} knowledge rows")
+        return indexed
+
+    # Bulk export operations
+    
+    def get_rows_after(
+        self,
+        table: str,
+        columns: List[str],
+        after: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 5000
+    ) -> List[Dict[str, Any]]:
+        """
+        Read one keyset chunk of a table for bulk export, ordered by (EXPORT_TABLES[table], id).
+        
+        Raises:
+            ValueError: On a table not in EXPORT_TABLES, an unknown column or a malformed cursor
+        """
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Table {table} cannot be exported")
+        known = {row["name"] for row in self._connect().execute(f"PRAGMA table_info({table})")}
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+        
+        column = EXPORT_TABLES[table]
+        sql = f"SELECT {', '.join(columns)} FROM {table} WHERE 1 = 1"
+        params: tuple = ()
+        if after:
+            position, row_id = decode_step_cursor(after)
+            sql += f" AND ({column} > ? OR ({column} = ? AND id > ?))"
+            params += (position, position, row_id)
+        if until:
+            sql += f" AND {column} < ?"
+            params += (until,)
+        sql += f" ORDER BY {column}, id LIMIT ?"
+        params += (limit,)
+        return self._query(sql, params)
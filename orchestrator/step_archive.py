@@ -0,0 +1,144 @@
+"""
+Retention job that moves task steps of long-finished tasks into compressed archives.
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from config import Config
+from blob_store import get_blob_store
+from database import get_database_client, encode_step_cursor
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StepArchiver:
+    """
+    Archives the steps of tasks that finished more than N days ago.
+    
+    A task's steps are written as one JSON Lines document, in (created_at, id)
+    order, to the blob store (zstd-compressed, content-addressed). A row in
+    task_step_archives records the digest, and the task is marked with
+    steps_archived_at. The rows are then deleted from task_steps.
+    get_task_steps reads archived history back transparently.
+    
+    Each step is safe to repeat: a run interrupted after writing the archive
+    simply archives the task again, and duplicate rows are merged on read.
+    A task is only marked once its steps were read in full and deleted, so
+    a failed read or delete leaves it for the next run.
+    """
+    
+    def __init__(self, db_client=None, store=None, page_size: int = 1000):
+        """
+        Args:
+            db_client: Database client (get_database_client() by default)
+            store: Blob store for archives (get_blob_store() by default)
+            page_size: Steps read per request while archiving a task
+        """
+        self.db_client = db_client or get_database_client()
+        self.store = store or get_blob_store()
+        self.page_size = page_size
+    
+    def _read_steps(self, task_id: str) -> List[Dict[str, Any]]:
+        """
+        All of a task's steps, oldest first, with any earlier archive of it.
+        
+        Raises:
+            Exception: If a page cannot be read (a partial read must not be archived)
+        """
+        steps: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            page = self.db_client.get_steps_to_archive(task_id, since=cursor, limit=self.page_size)
+            steps.extend(page)
+            if len(page) < self.page_size:
+                return steps
+            cursor = encode_step_cursor(page[-1])
+    
+    def archive_task(self, task_id: str) -> int:
+        """
+        Archive one task's steps.
+        
+        Returns:
+            Number of steps archived
+        """
+        steps = self._read_steps(task_id)
+        if steps:
+            document = "".join(json.dumps(step, default=str) + "\n" for step in steps)
+            digest = self.store.put_text(document)
+            self.db_client.add_step_archive({
+                "task_id": task_id,
+                "blob_digest": digest,
+                "step_count": len(steps),
+                "bytes": len(document.encode("utf-8")),
+                "first_step_at": steps[0]["created_at"],
+                "last_step_at": steps[-1]["created_at"],
+                "archived_at": datetime.utcnow().isoformat()
+            })
+            # Only rows now in the archive; anything later stays in the table
+            self.db_client.delete_task_steps(task_id, through=encode_step_cursor(steps[-1]))
+        self.db_client.update_task(task_id, {"steps_archived_at": datetime.utcnow().isoformat()})
+        return len(steps)
+    
+    def run(self, older_than_days: Optional[float] = None, max_tasks: Optional[int] = None) -> int:
+        """
+        Archive every eligible task.
+        
+        Args:
+            older_than_days: Minimum days since the task finished
+                (STEP_ARCHIVE_AFTER_DAYS by default)
+            max_tasks: Stop after this many tasks (all when None)
+        
+        Returns:
+            Number of tasks archived
+        
+        Raises:
+            ValueError: If the retention period is not positive (0 means
+                archiving is disabled, not "archive everything now")
+        """
+        days = Config.STEP_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        if days <= 0:
+            raise ValueError("Step archiving needs a retention period of more than 0 days")
+        if self.store is None:
+            logger.warning("Step archiving needs a blob store; BLOB_STORE_BACKEND is none")
+            return 0
+        
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        archived_tasks = 0
+        archived_steps = 0
+        while max_tasks is None or archived_tasks < max_tasks:
+            limit = 100 if max_tasks is None else min(100, max_tasks - archived_tasks)
+            batch = self.db_client.get_tasks_to_archive(cutoff, limit=limit)
+            if not batch:
+                break
+            for task in batch:
+                try:
+                    archived_steps += self.archive_task(task["id"])
+                    archived_tasks += 1
+                except Exception as e:
+                    # Leave the task for the next run rather than retry it now
+                    logger.error(f"Failed to archive steps of task {task['id']}: {e}")
+                    return archived_tasks
+        
+        if archived_tasks:
+            logger.info(f"Archived {archived_steps} steps from {archived_tasks} tasks")
+        return archived_tasks
+
+
+def main():
+    """Run the retention job once (e.g. from cron)."""
+    parser = argparse.ArgumentParser(description="Archive task steps of long-finished tasks")
+    parser.add_argument("--days", type=float, default=None, help="Archive tasks finished more than this many days ago")
+    parser.add_argument("--max-tasks", type=int, default=None, help="Stop after this many tasks")
+    args = parser.parse_args()
+    days = Config.STEP_ARCHIVE_AFTER_DAYS if args.days is None else args.days
+    if days <= 0:
+        parser.error("a retention period of more than 0 days is required (--days or STEP_ARCHIVE_AFTER_DAYS)")
+    
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    StepArchiver().run(older_than_days=args.days, max_tasks=args.max_tasks)
+
+
+if __name__ == "__main__":
+    main()
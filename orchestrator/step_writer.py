@@ -0,0 +1,377 @@
+"""
+Write-behind task step logging with batched inserts and a local spool.
+"""
+import glob
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config import Config
+from blob_store import get_blob_store, offload_step_payload
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    """
+    Whether an insert failed because of the rows themselves, so retrying cannot help.
+    
+    Covers SQLite integrity/data errors, PostgreSQL data, integrity and
+    schema errors (SQLSTATE classes 22, 23, 42), PostgREST request errors
+    and 4xx responses other than timeouts and rate limits. Anything else
+    (connection errors, 5xx, locked databases) is treated as an outage.
+    """
+    if isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.ProgrammingError, TypeError, ValueError)):
+        return True
+    code = str(getattr(error, "code", "") or "")
+    if len(code) == 5 and code[:2] in ("22", "23", "42"):
+        return True
+    if code.startswith("PGRST") and not code.startswith("PGRST0"):
+        return True
+    if len(code) == 3 and code.startswith("4") and code not in ("408", "429"):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+class StepWriter:
+    """
+    Buffers task steps and inserts them in batches off the agent's critical path.
+    
+    Steps are flushed by a background thread when the buffer reaches
+    STEP_WRITER_BATCH_SIZE or STEP_WRITER_FLUSH_INTERVAL seconds pass, and
+    synchronously on flush() (phase boundaries). When an insert fails the
+    batch goes to an append-only JSON Lines spool; while the spool holds rows,
+    new batches are appended behind them, and the spool is replayed in order
+    once the database accepts writes again. Each step gets a client-side id
+    so a replay of a batch that was in fact written does not duplicate it.
+    
+    A batch the database rejects for its data (e.g. a step for a task that
+    does not exist) is retried row by row, and rows that are still rejected
+    go to a dead-letter file next to the spool (`<spool>.dead.jsonl`), so
+    one bad row never holds up the steps behind it.
+    
+    Each writer spools to its own file, `<spool>.<pid>-<id>.jsonl`, locked
+    with fcntl for the writer's lifetime, so processes sharing a host never
+    write to (or rewrite) the same file. On startup a writer adopts the
+    spools of writers that are gone (their lock is free) and replays them.
+    
+    Content and tool arguments larger than BLOB_INLINE_LIMIT are moved to the
+    blob store at flush time, leaving a preview and a digest in the row.
+    """
+    
+    def __init__(
+        self,
+        db_client,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        spool_path: Optional[str] = None,
+        blob_store=None
+    ):
+        """
+        Args:
+            db_client: DatabaseClient used for batch inserts
+            batch_size: Steps buffered before a flush
+            flush_interval: Maximum seconds a step waits in the buffer
+            spool_path: Base name of spool files (STEP_WRITER_SPOOL_PATH)
+            blob_store: Store for oversized payloads (get_blob_store() by default)
+        """
+        self.db_client = db_client
+        self.batch_size = batch_size or Config.STEP_WRITER_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.STEP_WRITER_FLUSH_INTERVAL
+        base_path = spool_path or Config.STEP_WRITER_SPOOL_PATH
+        self._spool_root, self._spool_ext = os.path.splitext(base_path)
+        self._spool_ext = self._spool_ext or ".jsonl"
+        self._legacy_spool_path = base_path
+        self.spool_path = f"{self._spool_root}.{os.getpid()}-{uuid.uuid4().hex[:8]}{self._spool_ext}"
+        self.dead_letter_path = f"{self._spool_root}.dead{self._spool_ext}"
+        self.blob_store = blob_store or get_blob_store()
+        self._lock_handle = None
+        self._claim_spool()
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        # Serializes flushes so batches reach the database (or spool) in order
+        self._flush_lock = threading.Lock()
+        self._replay_failing = False
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="step-writer", daemon=True)
+        self._thread.start()
+    
+    def add_task_step(
+        self,
+        task_id: str,
+        phase: str,
+        step_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a step for the task's execution log.
+        
+        Same arguments as DatabaseClient.add_task_step; returns the queued row.
+        """
+        row = {
+            "id": str(uuid.uuid4()),
+            "task_id": task_id,
+            "phase": phase,
+            "type": step_type,
+            "content": content,
+            "metadata": metadata or {},
+            "created_at": datetime.utcnow().isoformat()
+        }
+        
+        with self._buffer_lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        
+        if full:
+            self._wakeup.set()
+        return row
+    
+    def _run(self):
+        """Background loop flushing on size or interval."""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the writer alive; the next flush retries
+                logger.error(f"Task step writer flush failed: {e}")
+    
+    def flush(self) -> int:
+        """
+        Write buffered steps, replaying the spool first.
+        
+        Never raises; steps that cannot be written are spooled.
+        
+        Returns:
+            Number of steps written to the database
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+            
+            try:
+                written = self._replay_spool()
+            except Exception as e:
+                logger.error(f"Task step spool replay failed: {e}")
+                written = 0
+            if not batch:
+                return written
+            
+            try:
+                for row in batch:
+                    offload_step_payload(row, self.blob_store)
+            
+                # Keep order: nothing overtakes rows still waiting in the spool
+                if self._spool_has_rows():
+                    self._spool(batch)
+                    return written
+            
+                return written + self._write(batch)
+            except Exception as e:
+                logger.warning(f"Spooling {len(batch)} task steps after failed insert: {e}")
+                self._spool(batch)
+                return written
+    
+    def _write(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert rows, setting aside rows the database rejects.
+        
+        An outage raises so the caller keeps the rows. When the batch is
+        rejected for its data, rows are inserted one at a time and the ones
+        still rejected go to the dead-letter file.
+        
+        Returns:
+            Number of rows written
+        """
+        try:
+            self.db_client.add_task_steps_batch(rows)
+            return len(rows)
+        except Exception as e:
+            if not _is_permanent_error(e):
+                raise
+        
+        written = 0
+        rejected = []
+        for row in rows:
+            try:
+                self.db_client.add_task_steps_batch([row])
+                written += 1
+            except Exception as e:
+                if not _is_permanent_error(e):
+                    # Rows already written are skipped on retry (client ids)
+                    raise
+                rejected.append({"error": str(e), "row": row})
+        self._dead_letter(rejected)
+        return written
+    
+    def _dead_letter(self, entries: List[Dict[str, Any]]):
+        """Append rejected rows (or unreadable spool lines) to the dead-letter file."""
+        if not entries:
+            return
+        path = self.dead_letter_path
+        logger.error(
+            f"Moving {len(entries)} task steps the database will not accept to {path}: {entries[0]['error']}"
+        )
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a") as handle:
+                handle.write("".join(json.dumps(entry, default=str) + "\n" for entry in entries))
+                handle.flush()
+                os.fsync(handle.fileno())
+        except OSError as e:
+            logger.error(f"Failed to write dead-letter file, dropping {len(entries)} task steps: {e}")
+    
+    def _spool_lock(self):
+        """Open and exclusively lock the lock file shared by all spools (claiming and adoption)."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        handle = open(f"{self._spool_root}.lock", "a")
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+    
+    def _claim_spool(self):
+        """Lock this writer's spool for its lifetime, then adopt spools of writers that are gone."""
+        if fcntl is None:
+            logger.debug("fcntl unavailable; spools of stopped processes are not replayed")
+            return
+        
+        try:
+            with self._spool_lock():
+                self._lock_handle = open(self.spool_path + ".lock", "a")
+                fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+                self._adopt_spools()
+        except OSError as e:
+            logger.error(f"Failed to set up task step spool {self.spool_path}: {e}")
+    
+    def _adopt_spools(self):
+        """Move rows of unlocked (orphaned) spool files into this writer's spool."""
+        pattern = f"{glob.escape(self._spool_root)}.*{self._spool_ext}"
+        candidates = [
+            path for path in glob.glob(pattern)
+            if path not in (self.spool_path, self.dead_letter_path)
+        ]
+        for path in candidates + [self._legacy_spool_path]:
+            if not os.path.exists(path):
+                continue
+            lock_path = path + ".lock"
+            with open(lock_path, "a") as lock_handle:
+                try:
+                    fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Its writer is still running
+                with open(path) as handle:
+                    data = handle.read()
+                if data.strip():
+                    if not data.endswith("\n"):
+                        # Keep a partial last line on its own line; replay quarantines it
+                        data += "\n"
+                    with open(self.spool_path, "a") as handle:
+                        handle.write(data)
+                        handle.flush()
+                        os.fsync(handle.fileno())
+                    lines = data.count("\n")
+                    logger.info(f"Adopted {lines} spooled task steps from {path}")
+                os.remove(path)
+                os.remove(lock_path)
+    
+    def _release_spool(self):
+        """Remove this writer's spool if empty and release its lock."""
+        if self._lock_handle is None:
+            return
+        if not self._spool_has_rows() and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+        if not os.path.exists(self.spool_path):
+            os.remove(self.spool_path + ".lock")
+        self._lock_handle.close()
+        self._lock_handle = None
+    
+    def _spool_has_rows(self) -> bool:
+        """Whether steps are waiting in the spool."""
+        return os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+    
+    def _spool(self, rows: List[Dict[str, Any]]):
+        """Append rows to the spool file."""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(self.spool_path, "a") as handle:
+                for row in rows:
+                    handle.write(json.dumps(row, default=str) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+        except OSError as e:
+            logger.error(f"Failed to spool {len(rows)} task steps, dropping them: {e}")
+    
+    def _replay_spool(self) -> int:
+        """
+        Write spooled rows in order, removing each batch once it is stored.
+        
+        Lines that do not parse (e.g. a partial line left by a crash while
+        appending) are moved to the dead-letter file.
+        
+        Returns:
+            Number of rows written
+        """
+        if not self._spool_has_rows():
+            return 0
+        
+        rows = []
+        unreadable = []
+        with open(self.spool_path) as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    unreadable.append({"error": f"Unreadable spool line: {e}", "line": line.rstrip("\n")})
+        self._dead_letter(unreadable)
+        
+        replayed = 0
+        written = 0
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                written += self._write(chunk)
+                replayed = start + len(chunk)
+            self._replay_failing = False
+        except Exception as e:
+            # Warn once per outage rather than on every flush
+            log = logger.debug if self._replay_failing else logger.warning
+            log(f"Task step spool replay paused with {len(rows) - replayed} steps waiting: {e}")
+            self._replay_failing = True
+        
+        if replayed or unreadable:
+            if written:
+                logger.info(f"Replayed {written} spooled task steps")
+            remaining = rows[replayed:]
+            # Rewrite atomically so a crash never loses or repeats the tail
+            temp_path = self.spool_path + ".tmp"
+            with open(temp_path, "w") as handle:
+                for row in remaining:
+                    handle.write(json.dumps(row, default=str) + "\n")
+            os.replace(temp_path, self.spool_path)
+        return written
+    
+    def close(self):
+        """Flush remaining steps and stop the background thread."""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        try:
+            self._release_spool()
+        except OSError as e:
+            logger.warning(f"Failed to release task step spool {self.spool_path}: {e}")
@@ -0,0 +1,313 @@
+"""
+Streaming NDJSON bulk export and import of tasks with their steps.
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, List, Optional
+from config import Config
+from blob_store import get_blob_store, inline_step_payload, offload_step_payload
+from database import TASK_LIST_COLUMNS, TASK_STEP_COLUMNS, get_database_client, encode_step_cursor
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Task columns carried by an export; steps_archived_at is dropped because
+# imported steps always land in task_steps
+TRANSFER_TASK_COLUMNS = [column for column in TASK_LIST_COLUMNS if column != "steps_archived_at"]
+
+
+@contextmanager
+def open_stream(path: str, mode: str) -> Iterator[IO[str]]:
+    """
+    Open an NDJSON file for "r" or "w"; *.gz is gzip-compressed.
+    
+    "-" is stdin/stdout, which is left open on exit.
+    """
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+        return
+    if path.endswith(".gz"):
+        handle = gzip.open(path, mode + "t", encoding="utf-8")
+    else:
+        handle = open(path, mode, encoding="utf-8")
+    with handle:
+        yield handle
+
+
+class _Progress:
+    """Counts transferred rows and logs them at most every `interval` seconds."""
+    
+    def __init__(self, verb: str, interval: float = 5.0):
+        self.verb = verb
+        self.interval = interval
+        self.counts = {"tasks": 0, "steps": 0, "existing_rows": 0, "skipped_steps": 0}
+        self.started = time.monotonic()
+        self.logged = self.started
+    
+    def add(self, key: str, count: int = 1):
+        self.counts[key] += count
+        now = time.monotonic()
+        if now - self.logged >= self.interval:
+            self.logged = now
+            self.log()
+    
+    def log(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        logger.info(
+            f"{self.verb} {self.counts['tasks']} tasks, {self.counts['steps']} steps "
+            f"({self.counts['steps'] / elapsed:.0f} steps/s)"
+        )
+
+
+class TaskTransfer:
+    """
+    Moves tasks and their steps between databases as NDJSON.
+    
+    A stream is one JSON object per line: `{"task": {...}}` followed by a
+    `{"step": {...}}` line for each of that task's steps, oldest first.
+    Both directions stream: export pages through tasks and steps with
+    keyset cursors, and import buffers at most `batch_size` tasks and steps
+    before writing them with multi-row inserts (tasks before their steps).
+    
+    Steps are exported with their full content (blob references are
+    resolved against the blob store, archived steps are included) and are
+    offloaded again on import. By default import assigns new task and step
+    ids, so a stream can be loaded repeatedly (e.g. to seed load tests);
+    with keep_ids, rows keep their ids and re-importing skips rows already
+    present. Imported tasks keep their status, so pending tasks will be
+    picked up by an orchestrator running against the target database.
+    """
+    
+    def __init__(self, db_client=None, store=None, batch_size: int = 1000, progress_interval: float = 5.0):
+        """
+        Args:
+            db_client: Database client (get_database_client() by default)
+            store: Blob store for step payloads (get_blob_store() by default)
+            batch_size: Rows per read and per insert
+            progress_interval: Seconds between progress log lines
+        """
+        self.db_client = db_client or get_database_client()
+        self.store = store or get_blob_store()
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+    
+    # Export
+    
+    def _iter_tasks(self, user_id: Optional[str], status: Optional[List[str]]) -> Iterator[Dict[str, Any]]:
+        """Tasks to export, one page at a time."""
+        cursor = None
+        while True:
+            if user_id:
+                page = self.db_client.get_tasks(
+                    user_id, status=status, limit=self.batch_size, before=cursor, fields=TRANSFER_TASK_COLUMNS
+                )
+            else:
+                page = self.db_client.get_rows_after("tasks", TRANSFER_TASK_COLUMNS, after=cursor, limit=self.batch_size)
+            for task in page:
+                if not status or task["status"] in status:
+                    yield task
+            if len(page) < self.batch_size:
+                return
+            last = page[-1]
+            position = last["created_at"] if user_id else last["updated_at"]
+            cursor = encode_step_cursor({"created_at": position, "id": last["id"]})
+    
+    def _iter_steps(self, task_id: str) -> Iterator[Dict[str, Any]]:
+        """A task's steps (archived ones included), oldest first."""
+        cursor = None
+        while True:
+            page = self.db_client.get_task_steps(task_id, since=cursor, limit=self.batch_size)
+            yield from page
+            if len(page) < self.batch_size:
+                return
+            cursor = encode_step_cursor(page[-1])
+    
+    def export_tasks(
+        self,
+        output: IO[str],
+        user_id: Optional[str] = None,
+        status: Optional[List[str]] = None,
+        task_ids: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Write tasks and their steps to an NDJSON stream.
+        
+        Args:
+            output: Text stream to write to
+            user_id: Only this user's tasks
+            status: Only tasks with one of these statuses
+            task_ids: Only these tasks (other filters are ignored)
+        
+        Returns:
+            Counts of exported tasks and steps
+        """
+        progress = _Progress("Exported", self.progress_interval)
+        if task_ids:
+            tasks = (task for task in map(self.db_client.get_task, task_ids) if task)
+        else:
+            tasks = self._iter_tasks(user_id, status)
+        
+        for task in tasks:
+            row = {column: task.get(column) for column in TRANSFER_TASK_COLUMNS}
+            output.write(json.dumps({"task": row}, default=str) + "\n")
+            progress.add("tasks")
+            for step in self._iter_steps(task["id"]):
+                inline_step_payload(step, self.store)
+                output.write(json.dumps({"step": step}, default=str) + "\n")
+                progress.add("steps")
+        
+        output.flush()
+        progress.log()
+        return progress.counts
+    
+    # Import
+    
+    def _task_row(self, task: Dict[str, Any], user_id: Optional[str], line_number: int) -> Dict[str, Any]:
+        """Complete task row with every transfer column, so a batch shares one shape."""
+        missing = [column for column in ("id", "title", "description") if not task.get(column)]
+        if missing:
+            raise ValueError(f"Line {line_number}: task is missing {', '.join(missing)}")
+        now = datetime.utcnow().isoformat()
+        row = {column: task.get(column) for column in TRANSFER_TASK_COLUMNS}
+        row["user_id"] = user_id or row["user_id"] or "default"
+        row["status"] = row["status"] or "pending"
+        row["phase"] = row["phase"] or "RESEARCH"
+        row["model"] = row["model"] or Config.DEFAULT_MODEL
+        row["created_at"] = row["created_at"] or now
+        row["updated_at"] = row["updated_at"] or row["created_at"]
+        return row
+    
+    def _step_row(self, step: Dict[str, Any], line_number: int) -> Dict[str, Any]:
+        """Complete step row with every step column."""
+        missing = [column for column in ("id", "task_id", "phase", "type") if not step.get(column)]
+        if missing:
+            raise ValueError(f"Line {line_number}: step is missing {', '.join(missing)}")
+        row = {column: step.get(column) for column in TASK_STEP_COLUMNS}
+        row["content"] = row["content"] or ""
+        row["metadata"] = row["metadata"] or {}
+        row["created_at"] = row["created_at"] or datetime.utcnow().isoformat()
+        return row
+    
+    def import_tasks(
+        self,
+        source: IO[str],
+        keep_ids: bool = False,
+        user_id: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Load tasks and steps from an NDJSON stream.
+        
+        Steps whose task did not appear earlier in the stream are skipped.
+        Only the task id mapping is kept in memory.
+        
+        Args:
+            source: Text stream to read from
+            keep_ids: Keep exported ids instead of assigning new ones
+            user_id: Assign every task to this user
+        
+        Returns:
+            Counts of inserted tasks and steps, of rows already present
+            (keep_ids re-imports) and of skipped steps
+        
+        Raises:
+            ValueError: On a malformed line
+        """
+        progress = _Progress("Imported", self.progress_interval)
+        task_ids: Dict[str, str] = {}
+        tasks: List[Dict[str, Any]] = []
+        steps: List[Dict[str, Any]] = []
+        
+        def flush_tasks():
+            if tasks:
+                inserted = self.db_client.add_tasks_batch(tasks)
+                progress.add("existing_rows", len(tasks) - inserted)
+                progress.add("tasks", inserted)
+                tasks.clear()
+        
+        def flush_steps():
+            # Steps reference their tasks, which must be stored first
+            flush_tasks()
+            if steps:
+                inserted = self.db_client.add_task_steps_batch(steps)
+                progress.add("existing_rows", len(steps) - inserted)
+                progress.add("steps", inserted)
+                steps.clear()
+        
+        for line_number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number}: invalid JSON ({e})")
+            
+            if "task" in record:
+                task = self._task_row(record["task"], user_id, line_number)
+                new_id = task["id"] if keep_ids else str(uuid.uuid4())
+                task_ids[task["id"]] = new_id
+                task["id"] = new_id
+                tasks.append(task)
+                if len(tasks) >= self.batch_size:
+                    flush_tasks()
+            elif "step" in record:
+                step = self._step_row(record["step"], line_number)
+                task_id = task_ids.get(step["task_id"])
+                if task_id is None:
+                    progress.add("skipped_steps")
+                    continue
+                step["task_id"] = task_id
+                if not keep_ids:
+                    step["id"] = str(uuid.uuid4())
+                steps.append(offload_step_payload(step, self.store))
+                if len(steps) >= self.batch_size:
+                    flush_steps()
+            else:
+                raise ValueError(f"Line {line_number}: expected a task or step record")
+        
+        flush_steps()
+        progress.log()
+        if progress.counts["existing_rows"]:
+            logger.info(f"{progress.counts['existing_rows']} rows were already present and left unchanged")
+        if progress.counts["skipped_steps"]:
+            logger.warning(f"Skipped {progress.counts['skipped_steps']} steps of tasks not in the stream")
+        return progress.counts
+
+
+def main():
+    """Export or import tasks from the command line."""
+    parser = argparse.ArgumentParser(description="Bulk export/import of tasks and steps as NDJSON")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per read and per insert")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    export_parser = commands.add_parser("export", help="Write tasks and steps to NDJSON")
+    export_parser.add_argument("path", help="Output file (.gz to compress, - for stdout)")
+    export_parser.add_argument("--user-id", default=None, help="Only this user's tasks")
+    export_parser.add_argument("--status", nargs="*", default=None, help="Only tasks with these statuses")
+    export_parser.add_argument("--task-id", nargs="*", default=None, help="Only these tasks")
+    
+    import_parser = commands.add_parser("import", help="Load tasks and steps from NDJSON")
+    import_parser.add_argument("path", help="Input file (.gz if compressed, - for stdin)")
+    import_parser.add_argument("--keep-ids", action="store_true", help="Keep exported ids; skip rows already present")
+    import_parser.add_argument("--user-id", default=None, help="Assign every task to this user")
+    args = parser.parse_args()
+    
+    # Progress goes to stderr so stdout can carry the export
+    logging.basicConfig(level=Config.LOG_LEVEL, stream=sys.stderr)
+    transfer = TaskTransfer(batch_size=args.batch_size)
+    if args.command == "export":
+        with open_stream(args.path, "w") as output:
+            transfer.export_tasks(output, user_id=args.user_id, status=args.status, task_ids=args.task_id)
+    else:
+        with open_stream(args.path, "r") as source:
+            transfer.import_tasks(source, keep_ids=args.keep_ids, user_id=args.user_id)
+
+
+if __name__ == "__main__":
+    main()
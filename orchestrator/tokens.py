@@ -0,0 +1,89 @@
+"""
+Token estimation helpers for Morgus.
+"""
+import json
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional at runtime
+    tiktoken = None
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# Per-message framing overhead used by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encodings: Dict[str, Any] = {}
+
+
+def _get_encoding(model: Optional[str]):
+    """Get (and cache) a tiktoken encoding for a model."""
+    if tiktoken is None:
+        return None
+    
+    key = model or "default"
+    if key not in _encodings:
+        try:
+            _encodings[key] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encodings[key] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[key]
+
+
+def count_text_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+    
+    Args:
+        text: Text to measure
+        model: Optional model name used to pick the tokenizer
+    
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_prompt_tokens(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict]] = None,
+    model: Optional[str] = None
+) -> int:
+    """
+    Estimate prompt tokens for a chat completion request.
+    
+    Args:
+        messages: Chat messages
+        tools: Optional tool schemas sent with the request
+        model: Optional model name used to pick the tokenizer
+    
+    Returns:
+        Estimated prompt token count
+    """
+    total = 0
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS
+        content = message.get("content")
+        if isinstance(content, str):
+            total += count_text_tokens(content, model)
+        elif content:
+            total += count_text_tokens(json.dumps(content, default=str), model)
+        if message.get("tool_calls"):
+            total += count_text_tokens(json.dumps(message["tool_calls"], default=str), model)
+    
+    if tools:
+        total += count_text_tokens(json.dumps(tools), model)
+    
+    return total
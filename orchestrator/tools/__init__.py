@@ -1,7 +1,7 @@
 """
 Tool system for Morgus agent.
 """
-from .base import Tool, ToolRegistry
+from .base import Tool, ToolRegistry, READ_ONLY, SANDBOX, EXTERNAL
 from .file_tools import FileTools
 from .shell_tools import ShellTools
 from .git_tools import GitTools
@@ -12,6 +12,9 @@ from .user_tools import UserTools
 __all__ = [
     "Tool",
     "ToolRegistry",
+    "READ_ONLY",
+    "SANDBOX",
+    "EXTERNAL",
     "FileTools",
     "ShellTools",
     "GitTools",
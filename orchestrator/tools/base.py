@@ -2,15 +2,29 @@
 Base classes for Morgus tools.
 """
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tool access classes
+READ_ONLY = "read_only"  # no side effects; safe to run concurrently
+SANDBOX = "sandbox"      # mutates the sandbox workspace
+EXTERNAL = "external"    # side effects outside the sandbox (deploys, pushes, the user)
+
 
 class Tool(ABC):
     """Base class for all Morgus tools."""
     
+    # Phases the tool is offered in; None offers it in every phase
+    phases: Optional[List[str]] = None
+    # Capability tags (e.g. "filesystem", "shell", "vcs", "network")
+    capabilities: List[str] = []
+    # Access class; anything but READ_ONLY runs alone, in order
+    access: str = SANDBOX
+    
     @property
     @abstractmethod
     def name(self) -> str:
@@ -52,19 +66,91 @@ class ToolRegistry:
     
     def __init__(self):
         self.tools: Dict[str, Tool] = {}
+        # Per-tool phase and capability tags
+        self.phases: Dict[str, Optional[List[str]]] = {}
+        self.capabilities: Dict[str, List[str]] = {}
+        self.access: Dict[str, str] = {}
+        # Schema lists keyed by (phase, capabilities), rebuilt after registration
+        self._schema_cache: Dict[Any, List[Dict[str, Any]]] = {}
     
-    def register(self, tool: Tool):
-        """Register a tool."""
+    def register(
+        self,
+        tool: Tool,
+        phases: Optional[List[str]] = None,
+        capabilities: Optional[List[str]] = None,
+        access: Optional[str] = None
+    ):
+        """
+        Register a tool.
+        
+        Args:
+            tool: Tool to register
+            phases: Phases to offer the tool in; defaults to TOOL_PHASES, then
+                the tool's own tags (None means every phase)
+            capabilities: Capability tags; defaults to the tool's own tags
+            access: Access class (READ_ONLY, SANDBOX or EXTERNAL); defaults
+                to the tool's own
+        """
         self.tools[tool.name] = tool
+        if phases is None:
+            phases = Config.TOOL_PHASES.get(tool.name, tool.phases)
+        self.phases[tool.name] = list(phases) if phases is not None else None
+        self.capabilities[tool.name] = list(capabilities if capabilities is not None else tool.capabilities)
+        self.access[tool.name] = access or tool.access
+        self._schema_cache.clear()
         logger.info(f"Registered tool: {tool.name}")
     
+    def get_tool_names(
+        self,
+        phase: Optional[str] = None,
+        capabilities: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Names of tools offered in a phase, optionally limited to tools with any
+        of the given capabilities.
+        """
+        names = []
+        for name in self.tools:
+            phases = self.phases.get(name)
+            if phase and phases is not None and phase not in phases:
+                continue
+            if capabilities and not set(capabilities) & set(self.capabilities.get(name, [])):
+                continue
+            names.append(name)
+        return names
+    
+    def get_schemas(
+        self,
+        phase: Optional[str] = None,
+        capabilities: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get OpenAI schemas for the tools offered in a phase.
+        
+        Schema lists are built once per (phase, capabilities) and reused until
+        another tool is registered, so each turn sends the same small list.
+        
+        Args:
+            phase: Task phase; None returns every tool
+            capabilities: Optional capability filter
+        
+        Returns:
+            List of tool schemas
+        """
+        key = (phase, tuple(sorted(capabilities)) if capabilities else None)
+        schemas = self._schema_cache.get(key)
+        if schemas is None:
+            schemas = [self.tools[name].get_schema() for name in self.get_tool_names(phase, capabilities)]
+            self._schema_cache[key] = schemas
+        return schemas
+    
     def get_tool(self, name: str) -> Optional[Tool]:
         """Get a tool by name."""
         return self.tools.get(name)
     
     def get_all_schemas(self) -> List[Dict[str, Any]]:
         """Get OpenAI schemas for all registered tools."""
-        return [tool.get_schema() for tool in self.tools.values()]
+        return self.get_schemas()
     
     def execute_tool(self, name: str, arguments: Dict[str, Any]) -> str:
         """
@@ -89,3 +175,49 @@ class ToolRegistry:
             error_msg = f"Error executing tool {name}: {str(e)}"
             logger.error(error_msg)
             return error_msg
+
+    def execute_tools(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]],
+        max_parallel: Optional[int] = None
+    ) -> List[str]:
+        """
+        Execute several tool calls, running independent ones concurrently.
+        
+        Consecutive read-only calls run together on up to max_parallel
+        threads. Sandbox-mutating and external calls run alone, after
+        everything before them and before anything after them, so they see
+        (and cause) the same effects as sequential execution.
+        
+        Args:
+            calls: (name, arguments) pairs in the order the model issued them
+            max_parallel: Concurrency limit; defaults to TOOL_MAX_PARALLEL
+        
+        Returns:
+            Results in the same order as calls
+        """
+        max_parallel = max_parallel or Config.TOOL_MAX_PARALLEL
+        results: List[Optional[str]] = [None] * len(calls)
+        batch: List[int] = []
+        
+        def run_batch():
+            if len(batch) == 1 or max_parallel <= 1:
+                for index in batch:
+                    results[index] = self.execute_tool(*calls[index])
+            elif batch:
+                logger.info(f"Executing {len(batch)} read-only tool calls concurrently")
+                with ThreadPoolExecutor(max_workers=min(max_parallel, len(batch))) as executor:
+                    futures = {index: executor.submit(self.execute_tool, *calls[index]) for index in batch}
+                    for index, future in futures.items():
+                        results[index] = future.result()
+            batch.clear()
+        
+        for index, (name, _) in enumerate(calls):
+            if self.access.get(name) == READ_ONLY:
+                batch.append(index)
+                continue
+            run_batch()
+            results[index] = self.execute_tool(*calls[index])
+        run_batch()
+        
+        return results
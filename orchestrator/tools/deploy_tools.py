@@ -2,7 +2,7 @@
 Deployment tools for Morgus (Cloudflare Pages/Workers).
 """
 from typing import Any, Dict
-from .base import Tool
+from .base import Tool, EXTERNAL
 from docker.models.containers import Container
 import logging
 
@@ -12,6 +12,10 @@ logger = logging.getLogger(__name__)
 class CloudflareDeployTool(Tool):
     """Tool for deploying to Cloudflare Pages."""
     
+    phases = ["EXECUTE", "FINALIZE"]
+    capabilities = ["deploy", "network"]
+    access = EXTERNAL
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -2,7 +2,7 @@
 File operation tools for Morgus.
 """
 from typing import Any, Dict
-from .base import Tool
+from .base import Tool, READ_ONLY
 from docker.models.containers import Container
 import logging
 
@@ -12,6 +12,9 @@ logger = logging.getLogger(__name__)
 class FileReadTool(Tool):
     """Tool for reading file contents."""
     
+    capabilities = ["filesystem"]
+    access = READ_ONLY
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -58,6 +61,9 @@ class FileReadTool(Tool):
 class FileWriteTool(Tool):
     """Tool for writing file contents."""
     
+    phases = ["PLAN", "BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["filesystem"]
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -104,6 +110,9 @@ class FileWriteTool(Tool):
 class FileListTool(Tool):
     """Tool for listing files in a directory."""
     
+    capabilities = ["filesystem"]
+    access = READ_ONLY
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -2,7 +2,7 @@
 Git operation tools for Morgus.
 """
 from typing import Any, Dict
-from .base import Tool
+from .base import Tool, EXTERNAL
 from docker.models.containers import Container
 import logging
 
@@ -12,6 +12,9 @@ logger = logging.getLogger(__name__)
 class GitInitTool(Tool):
     """Tool for initializing a git repository."""
     
+    phases = ["BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["vcs"]
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -53,6 +56,9 @@ class GitInitTool(Tool):
 class GitAddTool(Tool):
     """Tool for staging files."""
     
+    phases = ["BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["vcs"]
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -94,6 +100,9 @@ class GitAddTool(Tool):
 class GitCommitTool(Tool):
     """Tool for committing changes."""
     
+    phases = ["BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["vcs"]
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -143,6 +152,10 @@ class GitCommitTool(Tool):
 class GitPushTool(Tool):
     """Tool for pushing to remote."""
     
+    phases = ["BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["vcs", "network"]
+    access = EXTERNAL
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -12,6 +12,9 @@ logger = logging.getLogger(__name__)
 class ShellExecTool(Tool):
     """Tool for executing shell commands."""
     
+    phases = ["BUILD", "EXECUTE", "FINALIZE"]
+    capabilities = ["shell"]
+    
     def __init__(self, sandbox_manager, container: Container):
         self.sandbox_manager = sandbox_manager
         self.container = container
@@ -2,7 +2,7 @@
 User interaction tools for Morgus.
 """
 from typing import Any, Dict
-from .base import Tool
+from .base import Tool, EXTERNAL
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,8 +11,11 @@ logger = logging.getLogger(__name__)
 class NotifyUserTool(Tool):
     """Tool for sending notifications to the user."""
     
-    def __init__(self, db_client, task_id: str):
-        self.db_client = db_client
+    capabilities = ["user"]
+    access = EXTERNAL
+    
+    def __init__(self, steps, task_id: str):
+        self.steps = steps
         self.task_id = task_id
     
     @property
@@ -45,7 +48,7 @@ class NotifyUserTool(Tool):
     def execute(self, message: str) -> str:
         try:
             # Log as a task step
-            self.db_client.add_task_step(
+            self.steps.add_task_step(
                 task_id=self.task_id,
                 phase="NOTIFICATION",
                 step_type="USER_NOTIFICATION",
@@ -63,8 +66,12 @@ class NotifyUserTool(Tool):
 class AskUserTool(Tool):
     """Tool for asking the user a question."""
     
-    def __init__(self, db_client, task_id: str):
+    capabilities = ["user"]
+    access = EXTERNAL
+    
+    def __init__(self, db_client, steps, task_id: str):
         self.db_client = db_client
+        self.steps = steps
         self.task_id = task_id
     
     @property
@@ -101,15 +108,9 @@ class AskUserTool(Tool):
     
     def execute(self, question: str, options: list = None) -> str:
         try:
-            # Update task status to waiting for input
-            self.db_client.update_task(
-                task_id=self.task_id,
-                updates={"status": "waiting_for_input"}
-            )
-            
             # Log the question as a task step
             metadata = {"options": options} if options else {}
-            self.db_client.add_task_step(
+            self.steps.add_task_step(
                 task_id=self.task_id,
                 phase="USER_INPUT",
                 step_type="USER_QUESTION",
@@ -117,6 +118,17 @@ class AskUserTool(Tool):
                 metadata=metadata
             )
             
+            # Write buffered steps first, so the question is visible once the status is
+            flush = getattr(self.steps, "flush", None)
+            if flush:
+                flush()
+            
+            # Update task status to waiting for input
+            self.db_client.update_task(
+                task_id=self.task_id,
+                updates={"status": "waiting_for_input"}
+            )
+            
             logger.info(f"Waiting for user input: {question}")
             
             # In a real implementation, this would pause execution
@@ -133,9 +145,17 @@ class UserTools:
     """Collection of user interaction tools."""
     
     @staticmethod
-    def create_tools(db_client, task_id: str) -> list:
-        """Create all user interaction tools."""
+    def create_tools(db_client, task_id: str, steps=None) -> list:
+        """
+        Create all user interaction tools.
+        
+        Args:
+            db_client: DatabaseClient
+            task_id: Current task
+            steps: StepWriter for task steps (db_client writes them directly if not given)
+        """
+        steps = steps or db_client
         return [
-            NotifyUserTool(db_client, task_id),
-            AskUserTool(db_client, task_id)
+            NotifyUserTool(steps, task_id),
+            AskUserTool(db_client, steps, task_id)
         ]
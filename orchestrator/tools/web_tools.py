@@ -1,8 +1,8 @@
 """
 Web search and fetch tools for Morgus.
 """
-from typing import Any, Dict
-from .base import Tool
+from typing import Any, Dict, Optional
+from .base import Tool, READ_ONLY
 import requests
 from bs4 import BeautifulSoup
 import logging
@@ -14,6 +14,10 @@ logger = logging.getLogger(__name__)
 class SearchWebTool(Tool):
     """Tool for searching the web."""
     
+    phases = ["RESEARCH", "PLAN", "BUILD"]
+    capabilities = ["web", "network"]
+    access = READ_ONLY
+    
     @property
     def name(self) -> str:
         return "search_web"
@@ -103,6 +107,14 @@ class SearchWebTool(Tool):
 class FetchURLTool(Tool):
     """Tool for fetching and parsing web pages."""
     
+    phases = ["RESEARCH", "PLAN", "BUILD"]
+    capabilities = ["web", "network"]
+    access = READ_ONLY
+    
+    def __init__(self, condenser=None):
+        # Optional PageCondenser; long pages are then returned as a digest
+        self.condenser = condenser
+    
     @property
     def name(self) -> str:
         return "fetch_url"
@@ -123,6 +135,10 @@ class FetchURLTool(Tool):
                         "url": {
                             "type": "string",
                             "description": "URL to fetch"
+                        },
+                        "question": {
+                            "type": "string",
+                            "description": "What you want to learn from the page (focuses the digest of long pages)"
                         }
                     },
                     "required": ["url"]
@@ -130,7 +146,7 @@ class FetchURLTool(Tool):
             }
         }
     
-    def execute(self, url: str) -> str:
+    def execute(self, url: str, question: Optional[str] = None) -> str:
         try:
             # Validate URL domain if needed
             # TODO: Add domain whitelist check
@@ -156,6 +172,18 @@ class FetchURLTool(Tool):
             lines = [line.strip() for line in text.splitlines() if line.strip()]
             text = "\n".join(lines)
             
+            # Condense long pages, keeping the full text behind a handle
+            if self.condenser and len(text) > Config.CONDENSE_MIN_CHARS:
+                try:
+                    digest = self.condenser.condense(text, question)
+                    handle = self.condenser.store(text, source=url)
+                    return (
+                        f"Digest of {url} ({len(text)} chars):\n{digest}\n\n"
+                        f"Full text: call read_page with handle \"{handle}\""
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to condense {url}, returning raw text: {e}")
+            
             # Truncate if too long
             if len(text) > 8000:
                 text = text[:8000] + f"\n\n... (truncated, total {len(text)} chars)"
@@ -167,13 +195,70 @@ class FetchURLTool(Tool):
             return f"Error: Failed to fetch URL - {str(e)}"
 
 
+class ReadPageTool(Tool):
+    """Tool for reading the full text of a condensed page."""
+    
+    phases = ["RESEARCH", "PLAN", "BUILD"]
+    capabilities = ["web"]
+    access = READ_ONLY
+    
+    def __init__(self, condenser):
+        self.condenser = condenser
+    
+    @property
+    def name(self) -> str:
+        return "read_page"
+    
+    @property
+    def description(self) -> str:
+        return "Read the full text of a page previously condensed by fetch_url, in sections"
+    
+    def get_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "handle": {
+                            "type": "string",
+                            "description": "Page handle returned by fetch_url"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "Character offset to start reading at (default: 0)",
+                            "default": 0
+                        }
+                    },
+                    "required": ["handle"]
+                }
+            }
+        }
+    
+    def execute(self, handle: str, offset: int = 0) -> str:
+        text = self.condenser.get_page(handle)
+        if text is None:
+            return f"Error: No page stored under handle {handle}"
+        
+        section = text[offset:offset + 8000]
+        end = offset + len(section)
+        if end < len(text):
+            section += f"\n\n... (chars {offset}-{end} of {len(text)}, continue with offset {end})"
+        return section
+
+
 class WebTools:
     """Collection of web-related tools."""
     
     @staticmethod
-    def create_tools() -> list:
+    def create_tools(condenser=None) -> list:
         """Create all web tools."""
-        return [
+        tools = [
             SearchWebTool(),
-            FetchURLTool()
+            FetchURLTool(condenser)
         ]
+        if condenser:
+            tools.append(ReadPageTool(condenser))
+        return tools
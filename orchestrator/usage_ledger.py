@@ -0,0 +1,101 @@
+"""
+Per-task LLM usage ledger with batched writes.
+"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UsageLedger:
+    """
+    Collects one record per LLM request and writes them to the llm_usage
+    table in batches.
+    
+    The orchestrator sets the task context (task, phase, iteration) as it
+    goes; ModelRouter reports each upstream request through record().
+    """
+    
+    def __init__(self, db_client, batch_size: Optional[int] = None):
+        """
+        Args:
+            db_client: DatabaseClient used for batch inserts
+            batch_size: Records buffered before an automatic flush
+        """
+        self.db_client = db_client
+        self.batch_size = batch_size or Config.USAGE_LEDGER_BATCH_SIZE
+        self.context: Dict[str, Any] = {}
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+    
+    def set_context(
+        self,
+        task_id: Optional[str] = None,
+        phase: Optional[str] = None,
+        iteration: Optional[int] = None
+    ):
+        """Set the task, phase and iteration that subsequent requests belong to."""
+        self.context = {"task_id": task_id, "phase": phase, "iteration": iteration}
+    
+    def record(self, usage: Dict[str, Any]):
+        """
+        Buffer a usage record for one LLM request.
+        
+        Args:
+            usage: Dict with model, prompt/completion/cached/total tokens,
+                latency_ms, finish_reason and cost_usd
+        """
+        record = {
+            "task_id": self.context.get("task_id"),
+            "phase": usage.get("phase") or self.context.get("phase"),
+            "iteration": self.context.get("iteration"),
+            "model": usage["model"],
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": usage.get("cached_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+            "latency_ms": usage.get("latency_ms"),
+            "finish_reason": usage.get("finish_reason"),
+            "cost_usd": usage.get("cost_usd", 0.0),
+            "created_at": datetime.utcnow().isoformat()
+        }
+        
+        with self._lock:
+            self._buffer.append(record)
+            should_flush = len(self._buffer) >= self.batch_size
+        
+        if should_flush:
+            self.flush()
+    
+    def flush(self) -> int:
+        """
+        Write buffered records.
+        
+        A failed write keeps the records buffered for the next flush; usage
+        accounting never fails the task.
+        
+        Returns:
+            Number of records written
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        
+        if not batch:
+            return 0
+        
+        try:
+            self.db_client.add_llm_usage_batch(batch)
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} usage records: {e}")
+            with self._lock:
+                self._buffer = batch + self._buffer
+                # Don't grow without bound while the database is down
+                overflow = len(self._buffer) - self.batch_size * 10
+                if overflow > 0:
+                    logger.warning(f"Dropping {overflow} oldest usage records")
+                    self._buffer = self._buffer[overflow:]
+            return 0
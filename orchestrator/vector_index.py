@@ -0,0 +1,332 @@
+"""
+In-process approximate nearest-neighbour index for the knowledge base.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so inner product equals cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _matches(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """Whether metadata satisfies an equality filter; list values match any member."""
+    if not metadata_filter:
+        return True
+    for key, expected in metadata_filter.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class VectorIndex:
+    """
+    IVF (inverted file) cosine-similarity index over knowledge embeddings.
+    
+    Vectors are clustered with k-means into lists; a query scores only the
+    members of the VECTOR_INDEX_PROBES closest lists. Until the index holds
+    enough vectors to train, queries compare against every vector, which is
+    still fast at that size.
+    
+    The index persists as a NumPy snapshot plus an append-only log of later
+    additions; the log is folded into the snapshot when it grows large or the
+    lists are retrained.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: File prefix for the snapshot (.npz, .json) and log (.log)
+        """
+        self.path = path or Config.VECTOR_INDEX_PATH
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._vectors: Optional[np.ndarray] = None  # capacity-doubling buffer
+        self._size = 0
+        self._positions: Dict[str, int] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self._trained_size = 0
+        self._log_entries = 0
+        self._lock = threading.RLock()
+        self._load()
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        """Stored unit vectors, one row per entry."""
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self._size]
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    # Persistence
+    
+    def _load(self):
+        """Load the snapshot and replay the log."""
+        snapshot = self.path + ".npz"
+        if os.path.exists(snapshot):
+            data = np.load(snapshot)
+            with open(self.path + ".json") as handle:
+                info = json.load(handle)
+            self.ids = info["ids"]
+            self.contents = info["contents"]
+            self.metadata = info["metadata"]
+            self._vectors = data["vectors"].astype(np.float32)
+            self._size = len(self.ids)
+            if "centroids" in data and len(data["centroids"]):
+                self.centroids = data["centroids"]
+                self.lists = [list(members) for members in info["lists"]]
+                self._trained_size = info.get("trained_size", self._size)
+            self._positions = {entry_id: i for i, entry_id in enumerate(self.ids)}
+        
+        log = self.path + ".log"
+        if os.path.exists(log):
+            with open(log) as handle:
+                for line in handle:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._append(entry["id"], np.asarray(entry["vector"], dtype=np.float32), entry["content"], entry["metadata"])
+                        self._log_entries += 1
+        
+        if self._size:
+            logger.info(f"Loaded vector index with {self._size} entries from {self.path}")
+    
+    def save(self):
+        """Write a full snapshot and clear the log."""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            arrays = {"vectors": self.vectors}
+            if self.centroids is not None:
+                arrays["centroids"] = self.centroids
+            temp = self.path + ".tmp.npz"
+            np.savez(temp, **arrays)
+            with open(self.path + ".json.tmp", "w") as handle:
+                json.dump({
+                    "ids": self.ids,
+                    "contents": self.contents,
+                    "metadata": self.metadata,
+                    "lists": self.lists,
+                    "trained_size": self._trained_size
+                }, handle, default=str)
+            os.replace(temp, self.path + ".npz")
+            os.replace(self.path + ".json.tmp", self.path + ".json")
+            if os.path.exists(self.path + ".log"):
+                os.remove(self.path + ".log")
+            self._log_entries = 0
+    
+    # Building
+    
+    def _append(self, entry_id: str, vector: np.ndarray, content: str, metadata: Dict[str, Any]) -> int:
+        """Add a vector to the in-memory arrays; returns its row."""
+        vector = _normalize(vector.astype(np.float32))
+        if entry_id in self._positions:
+            row = self._positions[entry_id]
+            if self.centroids is not None:
+                self._reassign(row, vector)
+            self._vectors[row] = vector
+            self.contents[row] = content
+            self.metadata[row] = metadata
+            return row
+        
+        if self._vectors is None:
+            self._vectors = np.zeros((16, vector.shape[0]), dtype=np.float32)
+        elif self._size == len(self._vectors):
+            grown = np.zeros((len(self._vectors) * 2, self._vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        
+        row = self._size
+        self._vectors[row] = vector
+        self._size += 1
+        self.ids.append(entry_id)
+        self.contents.append(content)
+        self.metadata.append(metadata)
+        self._positions[entry_id] = row
+        
+        if self.centroids is not None:
+            self.lists[int(np.argmax(self.centroids @ vector))].append(row)
+        return row
+    
+    def _reassign(self, row: int, vector: np.ndarray):
+        """Move a row whose vector is being replaced to the list of its new nearest centroid."""
+        old_list = int(np.argmax(self.centroids @ self._vectors[row]))
+        new_list = int(np.argmax(self.centroids @ vector))
+        if old_list == new_list:
+            return
+        if row in self.lists[old_list]:
+            self.lists[old_list].remove(row)
+        else:
+            # Assigned under a near-tie; find it
+            for members in self.lists:
+                if row in members:
+                    members.remove(row)
+                    break
+        self.lists[new_list].append(row)
+    
+    def add(self, entries: List[Dict[str, Any]]):
+        """
+        Add or replace entries and persist them to the log.
+        
+        Args:
+            entries: Dicts with id, embedding, content and metadata
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".log", "a") as handle:
+                for entry in entries:
+                    vector = np.asarray(entry["embedding"], dtype=np.float32)
+                    self._append(str(entry["id"]), vector, entry.get("content", ""), entry.get("metadata") or {})
+                    handle.write(json.dumps({
+                        "id": str(entry["id"]),
+                        "vector": vector.tolist(),
+                        "content": entry.get("content", ""),
+                        "metadata": entry.get("metadata") or {}
+                    }, default=str) + "\n")
+                    self._log_entries += 1
+            
+            if self._needs_training():
+                self.train()
+            elif self._log_entries >= Config.VECTOR_INDEX_LOG_LIMIT:
+                self.save()
+    
+    def _needs_training(self) -> bool:
+        """Train once there is enough data, and retrain after the index doubles."""
+        if self._size < Config.VECTOR_INDEX_TRAIN_MIN:
+            return False
+        return self.centroids is None or self._size >= 2 * self._trained_size
+    
+    def train(self, iterations: int = 10):
+        """Cluster the stored vectors into IVF lists with k-means and snapshot."""
+        with self._lock:
+            vectors = self.vectors
+            n_lists = Config.VECTOR_INDEX_LISTS or max(1, int(np.sqrt(self._size)))
+            n_lists = min(n_lists, self._size)
+            rng = np.random.default_rng(0)
+            
+            # Train on a sample; assignment below covers every vector
+            sample = vectors[rng.choice(self._size, size=min(self._size, n_lists * 64), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                for list_id in range(n_lists):
+                    members = sample[assignment == list_id]
+                    if len(members):
+                        centroids[list_id] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+            
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            self.centroids = centroids
+            self.lists = [[] for _ in range(n_lists)]
+            for row, list_id in enumerate(assignment):
+                self.lists[int(list_id)].append(row)
+            self._trained_size = self._size
+            logger.info(f"Trained vector index: {self._size} vectors in {n_lists} lists")
+            self.save()
+    
+    # Querying
+    
+    def search(
+        self,
+        query: List[float],
+        limit: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the entries most similar to a query embedding.
+        
+        Args:
+            query: Query embedding
+            limit: Maximum results
+            metadata_filter: Equality filter on metadata keys (list values
+                match any member)
+            threshold: Minimum cosine similarity
+        
+        Returns:
+            Dicts with id, content, similarity and metadata, best first
+        """
+        with self._lock:
+            if not self._size:
+                return []
+            
+            vector = _normalize(np.asarray(query, dtype=np.float32))
+            if self.centroids is not None:
+                probes = min(Config.VECTOR_INDEX_PROBES, len(self.centroids))
+                nearest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+                candidates = np.fromiter(
+                    (row for list_id in nearest for row in self.lists[list_id]),
+                    dtype=np.int64
+                )
+            else:
+                candidates = np.arange(self._size)
+            
+            if metadata_filter:
+                candidates = np.fromiter(
+                    (row for row in candidates if _matches(self.metadata[row], metadata_filter)),
+                    dtype=np.int64
+                )
+            if not len(candidates):
+                return []
+            
+            scores = self._vectors[candidates] @ vector
+            if threshold is not None:
+                keep = scores >= threshold
+                candidates, scores = candidates[keep], scores[keep]
+            if not len(candidates):
+                return []
+            
+            top = min(limit, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            return [
+                {
+                    "id": self.ids[candidates[i]],
+                    "content": self.contents[candidates[i]],
+                    "similarity": float(scores[i]),
+                    "metadata": self.metadata[candidates[i]]
+                }
+                for i in best
+            ]
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Get the process-wide knowledge index, loading it from disk on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex()
+        return _index
+
+
+def main():
+    """Rebuild the local index from the knowledge table (e.g. on a new host)."""
+    # Imported here; database imports this module
+    from database import get_database_client
+    
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    count = get_database_client().rebuild_vector_index()
+    print(f"Indexed {count} knowledge rows into {Config.VECTOR_INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()